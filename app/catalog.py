@@ -0,0 +1,198 @@
+import threading
+from array import array
+from typing import Dict, Iterable, Tuple
+
+from .inventory import Inventory
+
+
+class Catalog:
+    # Struct of arrays: row `i` is `names[i]`, `prices[i]` and the stock slot `slots[i]` in the
+    # catalog's inventory. A product's id is its row. `index` maps names to rows and shares the name
+    # strings with `names`, which interns them per catalog without an entry in the interpreter's table.
+    # Products handed out are views over a row; rows of removed products are reused.
+    def __init__(self, inventory: Inventory = None):
+        self.inventory = inventory if inventory is not None else Inventory()
+        self.names = []
+        self.prices = array('d')
+        self.slots = array('q')
+        self.index: Dict[str, int] = {}
+        self.free_rows = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return (Product.view(self, row) for row in list(self.index.values()))
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def product_id(self, row: int) -> int:
+        return row
+
+    def insert(self, name: str, price: float, available_amount: int) -> int:
+        with self.lock:
+            if name in self.index:
+                raise ValueError(f"Product {name} is already in the catalog")
+            row = self._allocate(name, price, available_amount)
+            self.index[name] = row
+        return row
+
+    def _allocate(self, name, price, available_amount):
+        slot = self.inventory.register(available_amount)
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.names[row] = name
+            self.prices[row] = price
+            self.slots[row] = slot
+            return row
+        self.names.append(name)
+        self.prices.append(price)
+        self.slots.append(slot)
+        return len(self.names) - 1
+
+    def release(self, row: int):
+        with self.lock:
+            name = self.names[row]
+            if self.index.get(name) == row:
+                del self.index[name]
+            self._free(row)
+
+    def _free(self, row):
+        self.inventory.unregister(self.slots[row])
+        self.names[row] = None
+        self.free_rows.append(row)
+
+    def add(self, name: str, price: float, available_amount: int) -> 'Product':
+        return Product(name, price, available_amount, self)
+
+    def remove(self, name: str):
+        row = self.index.get(name)
+        if row is None:
+            raise KeyError(name)
+        self.release(row)
+
+    def load(self, rows: Iterable[Tuple[str, float, int]]):
+        for name, price, available_amount in rows:
+            self.insert(name, price, available_amount)
+        return len(self.index)
+
+    def get(self, product_id: int) -> 'Product':
+        if not 0 <= product_id < len(self.names) or self.names[product_id] is None:
+            raise KeyError(product_id)
+        return Product.view(self, product_id)
+
+    def lookup(self, name: str) -> 'Product':
+        row = self.index.get(name)
+        return None if row is None else Product.view(self, row)
+
+
+class StandaloneCatalog(Catalog):
+    # Rows of products built without a catalog. Names may repeat: products with the same name share an
+    # id (and are equal) but keep their own price and stock. Ids come from a counter, so an id stays
+    # unique while any product still holds it.
+    def __init__(self, inventory: Inventory = None):
+        super().__init__(inventory)
+        self.ids = array('q')
+        self.next_id = 0
+        # Only names with more than one live row.
+        self.duplicates: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.names) - len(self.free_rows)
+
+    def product_id(self, row: int) -> int:
+        return self.ids[row]
+
+    def insert(self, name: str, price: float, available_amount: int) -> int:
+        with self.lock:
+            product_id = self.index.get(name)
+            if product_id is None:
+                product_id = self.index[name] = self.next_id
+                self.next_id += 1
+            else:
+                self.duplicates[name] = self.duplicates.get(name, 1) + 1
+            row = self._allocate(name, price, available_amount)
+            if row < len(self.ids):
+                self.ids[row] = product_id
+            else:
+                self.ids.append(product_id)
+        return row
+
+    def release(self, row: int):
+        with self.lock:
+            name = self.names[row]
+            count = self.duplicates.pop(name, 1) - 1
+            if count > 1:
+                self.duplicates[name] = count
+            elif not count:
+                del self.index[name]
+            self._free(row)
+
+    def get(self, product_id: int) -> 'Product':
+        raise KeyError(product_id)
+
+    def lookup(self, name: str) -> 'Product':
+        return None
+
+
+# Owns the stock of products created without a catalog; release_product gives their rows back.
+default_catalog = StandaloneCatalog()
+
+
+class Product:
+    # A view over one catalog row; all product data lives in the catalog's columns.
+    __slots__ = ('catalog', 'row', 'product_id')
+    catalog: Catalog
+    row: int
+    product_id: int
+    def __init__(self, name, price, available_amount, catalog: Catalog = None):
+        self.catalog = catalog if catalog is not None else default_catalog
+        self.row = self.catalog.insert(name, price, available_amount)
+        self.product_id = self.catalog.product_id(self.row)
+    @classmethod
+    def view(cls, catalog: Catalog, row: int) -> 'Product':
+        product = cls.__new__(cls)
+        product.catalog = catalog
+        product.row = row
+        product.product_id = catalog.product_id(row)
+        return product
+    @property
+    def name(self) -> str:
+        return self.catalog.names[self.row]
+    @property
+    def price(self) -> float:
+        return self.catalog.prices[self.row]
+    @price.setter
+    def price(self, price: float):
+        self.catalog.prices[self.row] = price
+    @property
+    def inventory(self) -> Inventory:
+        return self.catalog.inventory
+    @property
+    def stock_slot(self) -> int:
+        return self.catalog.slots[self.row]
+    @property
+    def available_amount(self) -> int:
+        return self.catalog.inventory.available_amount(self.catalog.slots[self.row])
+    @available_amount.setter
+    def available_amount(self, amount: int):
+        self.catalog.inventory.set_available(self.catalog.slots[self.row], amount)
+    def is_available(self, requested_amount):
+        return self.available_amount >= requested_amount
+    def buy(self, requested_amount):
+        self.catalog.inventory.take({self.catalog.slots[self.row]: requested_amount})
+    def __eq__(self, other):
+        return self.product_id == other.product_id and self.catalog is other.catalog
+    def __ne__(self, other):
+        return not self == other
+    def __hash__(self):
+        return self.product_id
+    def __str__(self):
+        return self.name
+
+
+def release_product(product: Product):
+    # Gives the product's row and stock slot back; the product must not be used afterwards.
+    product.catalog.release(product.row)
@@ -0,0 +1,110 @@
+import math
+from array import array
+from operator import mul
+
+from .eshop import Product, ShoppingCart
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is optional
+    numpy = None
+
+
+class ColumnarShoppingCart(ShoppingCart):
+    # Cart lines are stored column-wise: `lines[row]` holds the product, `quantities[row]` and
+    # `prices[row]` the amount and unit price, `rows` maps products (hashed by id) to rows.
+    # New lines are added to the running total in O(1). Replacing or removing a line would
+    # subtract from it and let the float drift, so those edits drop the total (None) and
+    # calculate_total() rebuilds it with one exact sum.
+    def __init__(self):  # pylint: disable=super-init-not-called
+        self.rows = {}
+        self.lines = []
+        self.quantities = array('q')
+        self.prices = array('d')
+        self.total = 0.0
+
+    @property
+    def products(self):
+        return dict(zip(self.lines, self.quantities))
+
+    def __len__(self):
+        return len(self.lines)
+
+    def contains_product(self, product):
+        return product in self.rows
+
+    def calculate_total(self):
+        if self.total is None:
+            return self.recalculate_total()
+        return self.total
+
+    def recalculate_total(self):
+        if numpy is not None and self.lines:
+            self.total = float(numpy.dot(numpy.frombuffer(self.prices, dtype=numpy.float64),
+                                         numpy.frombuffer(self.quantities, dtype=numpy.int64)))
+        else:
+            self.total = math.fsum(map(mul, self.prices, self.quantities))
+        return self.total
+
+    def reprice(self):
+        for row, product in enumerate(self.lines):
+            self.prices[row] = product.price
+        return self.recalculate_total()
+
+    def _set_line(self, product: Product, amount: int):
+        row = self.rows.get(product)
+        if row is None:
+            self.rows[product] = len(self.lines)
+            self.lines.append(product)
+            self.quantities.append(amount)
+            self.prices.append(product.price)
+            if self.total is not None:
+                self.total += product.price * amount
+        else:
+            self.total = None
+            self.quantities[row] = amount
+            self.prices[row] = product.price
+
+    def add_product(self, product: Product, amount: int):
+        if not product.is_available(amount):
+            raise ValueError(f"Product {product} has only {product.available_amount} items")
+        self._set_line(product, amount)
+
+    def add_products(self, pairs):
+        pairs = list(pairs)
+        for product, amount in pairs:
+            if not product.is_available(amount):
+                raise ValueError(f"Product {product} has only {product.available_amount} items")
+        for product, amount in pairs:
+            self._set_line(product, amount)
+
+    def remove_product(self, product):
+        row = self.rows.pop(product, None)
+        if row is None:
+            return
+        self.total = None
+        last = len(self.lines) - 1
+        if row != last:
+            moved = self.lines[last]
+            self.lines[row] = moved
+            self.quantities[row] = self.quantities[last]
+            self.prices[row] = self.prices[last]
+            self.rows[moved] = row
+        self.lines.pop()
+        self.quantities.pop()
+        self.prices.pop()
+
+    def clear(self):
+        self.rows.clear()
+        self.lines.clear()
+        del self.quantities[:]
+        del self.prices[:]
+        self.total = 0.0
+
+    def submit_cart_order(self):
+        for inventory, reservation_id in self.reserve_products():
+            inventory.commit(reservation_id)
+        product_ids = [str(product) for product in self.lines]
+        self.clear()
+
+        return product_ids
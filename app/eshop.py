@@ -1,29 +1,11 @@
 import uuid
 from typing import Dict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from services import ShippingService
+from services.codec import now_millis
+from .catalog import Product, release_product  # pylint: disable=unused-import
 
-class Product:
-    available_amount: int
-    name: str
-    price: float
-    def __init__(self, name, price, available_amount):
-        self.name = name
-        self.price = price
-        self.available_amount = available_amount
-    def is_available(self, requested_amount):
-        return self.available_amount >= requested_amount
-    def buy(self, requested_amount):
-        self.available_amount -= requested_amount
-    def __eq__(self, other):
-        return self.name == other.name
-    def __ne__(self, other):
-        return self.name != other.name
-    def __hash__(self):
-        return hash(self.name)
-    def __str__(self):
-        return self.name
 class ShoppingCart:
     products: Dict[Product, int]
     def __init__(self):
@@ -31,20 +13,41 @@ class ShoppingCart:
     def contains_product(self, product):
         return product in self.products
     def calculate_total(self):
-        return sum([p.price * count for p, count in self.products.items()])
+        return sum(p.price * count for p, count in self.products.items())
     def add_product(self, product: Product, amount: int):
         if not product.is_available(amount):
             raise ValueError(f"Product {product} has only {product.available_amount} items")
         self.products[product] = amount
+    def add_products(self, pairs):
+        pairs = list(pairs)
+        for product, amount in pairs:
+            if not product.is_available(amount):
+                raise ValueError(f"Product {product} has only {product.available_amount} items")
+        self.products.update(pairs)
     def remove_product(self, product):
         if product in self.products:
             del self.products[product]
-    def submit_cart_order(self):
-        product_ids = []
+    def reserve_products(self, ttl: float = None):
+        by_inventory = {}
         for product, count in self.products.items():
-            product.buy(count)
-            product_ids.append(str(product))
+            items = by_inventory.setdefault(id(product.inventory), (product.inventory, {}))[1]
+            items[product.stock_slot] = items.get(product.stock_slot, 0) + count
+        reservations = []
+        try:
+            for inventory, items in by_inventory.values():
+                reservations.append((inventory, inventory.reserve(items, ttl)))
+        except ValueError:
+            for inventory, reservation_id in reservations:
+                inventory.release(reservation_id)
+            raise
+        return reservations
+    def clear(self):
         self.products.clear()
+    def submit_cart_order(self):
+        for inventory, reservation_id in self.reserve_products():
+            inventory.commit(reservation_id)
+        product_ids = [str(product) for product in self.products]
+        self.clear()
 
         return product_ids
 
@@ -52,20 +55,53 @@ class ShoppingCart:
 class Order:
     cart: ShoppingCart
     shipping_service: ShippingService
-    order_id: str = str(uuid.uuid4())
+    order_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    transactional: bool = False
+    # Part of the transaction payload: a retry of this order resends it under the same token.
+    created_at: int = field(default_factory=now_millis)
 
     def place_order(self, shipping_type, due_date: datetime = None):
         if not due_date:
             due_date = datetime.now(timezone.utc) + timedelta(seconds=3)
+        if self.transactional:
+            return self.place_order_transaction(shipping_type, due_date)
         product_ids = self.cart.submit_cart_order()
-        print(due_date)
         return self.shipping_service.create_shipping(shipping_type, product_ids,
                                                      self.order_id, due_date)
 
+    def place_order_transaction(self, shipping_type, due_date: datetime):
+        product_counts = {str(product): count for product, count in self.cart.products.items()}
+        reservations = self.cart.reserve_products()
+        try:
+            shipping_id = self.shipping_service.place_order_transaction(
+                shipping_type, product_counts, self.order_id, due_date, self.created_at)
+        except Exception:
+            for inventory, reservation_id in reservations:
+                inventory.release(reservation_id)
+            raise
+        for inventory, reservation_id in reservations:
+            inventory.commit(reservation_id)
+        self.cart.clear()
+        return shipping_id
+
 @dataclass()
 class Shipment:
     shipping_id: str
     shipping_service: ShippingService
 
     def check_shipping_status(self):
-        return self.shipping_service.check_status(self.shipping_id)
\ No newline at end of file
+        return self.shipping_service.check_status(self.shipping_id)
+
+    def wait_for_status(self, statuses, timeout=None):
+        return self.shipping_service.wait_for_status(self.shipping_id, statuses, timeout)
+
+    @staticmethod
+    def check_shipping_statuses(shipments):
+        by_service = {}
+        for shipment in shipments:
+            by_service.setdefault(id(shipment.shipping_service), (shipment.shipping_service, []))[1].append(
+                shipment.shipping_id)
+        statuses = {}
+        for shipping_service, shipping_ids in by_service.values():
+            statuses.update(shipping_service.check_statuses(shipping_ids))
+        return statuses
\ No newline at end of file
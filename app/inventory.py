@@ -0,0 +1,124 @@
+import itertools
+import threading
+import time
+from array import array
+
+
+class Inventory:
+    # Every product owns a slot in `available` (stock that can still be sold) and `reserved`
+    # (stock held by open reservations). Writers lock the stripe owning a slot, readers only
+    # read `available[slot]` and never block. Unregistered slots are reused.
+    SWEEP_INTERVAL = 1.0
+
+    def __init__(self, stripes: int = 64, reservation_ttl: float = 900.0, clock=time.monotonic):
+        self.available = array('q')
+        self.reserved = array('q')
+        self.stripes = [threading.Lock() for _ in range(stripes)]
+        self.reservation_ttl = reservation_ttl
+        self.clock = clock
+        self.reservations = {}
+        self.reservation_ids = itertools.count(1)
+        self.next_sweep = 0.0
+        self.free_slots = []
+        # Unregistered slots still held by an open reservation; freed when it closes.
+        self.retired = set()
+        self.registry_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.available) - len(self.free_slots) - len(self.retired)
+
+    def register(self, amount: int) -> int:
+        with self.registry_lock:
+            if self.free_slots:
+                slot = self.free_slots.pop()
+                self.available[slot] = amount
+                self.reserved[slot] = 0
+                return slot
+            self.available.append(amount)
+            self.reserved.append(0)
+            return len(self.available) - 1
+
+    def unregister(self, slot: int):
+        # The stripe lock orders this check against a reservation closing on the slot.
+        with self.registry_lock, self.stripes[slot % len(self.stripes)]:
+            if self.reserved[slot]:
+                self.retired.add(slot)
+            else:
+                self.free_slots.append(slot)
+
+    def available_amount(self, slot: int) -> int:
+        return self.available[slot]
+
+    def set_available(self, slot: int, amount: int):
+        with self.stripes[slot % len(self.stripes)]:
+            self.available[slot] = amount
+
+    def _locked(self, slots):
+        return [self.stripes[index] for index in sorted({slot % len(self.stripes) for slot in slots})]
+
+    def reserve(self, items: dict, ttl: float = None) -> int:
+        if self.clock() >= self.next_sweep:
+            self.expire_reservations()
+        locks = self._locked(items)
+        for lock in locks:
+            lock.acquire()
+        try:
+            for slot, amount in items.items():
+                if self.available[slot] < amount:
+                    raise ValueError(f"Only {self.available[slot]} items available")
+            for slot, amount in items.items():
+                self.available[slot] -= amount
+                self.reserved[slot] += amount
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        reservation_id = next(self.reservation_ids)
+        expires_at = self.clock() + (self.reservation_ttl if ttl is None else ttl)
+        with self.registry_lock:
+            self.reservations[reservation_id] = (expires_at, dict(items))
+        return reservation_id
+
+    def _close(self, reservation_id, restock: bool) -> bool:
+        with self.registry_lock:
+            reservation = self.reservations.pop(reservation_id, None)
+        if reservation is None:
+            return False
+        items = reservation[1]
+        locks = self._locked(items)
+        for lock in locks:
+            lock.acquire()
+        try:
+            for slot, amount in items.items():
+                self.reserved[slot] -= amount
+                if restock:
+                    self.available[slot] += amount
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        if self.retired:
+            with self.registry_lock:
+                for slot in items:
+                    if slot in self.retired and not self.reserved[slot]:
+                        self.retired.discard(slot)
+                        self.free_slots.append(slot)
+        return True
+
+    def commit(self, reservation_id: int):
+        if not self._close(reservation_id, restock=False):
+            raise ValueError(f"Reservation {reservation_id} is expired or unknown")
+
+    def release(self, reservation_id: int):
+        self._close(reservation_id, restock=True)
+
+    def take(self, items: dict):
+        self.commit(self.reserve(items))
+
+    def expire_reservations(self, now: float = None):
+        now = self.clock() if now is None else now
+        with self.registry_lock:
+            self.next_sweep = now + self.SWEEP_INTERVAL
+            expired = [reservation_id for reservation_id, (expires_at, _) in self.reservations.items()
+                       if expires_at <= now]
+        for reservation_id in expired:
+            self.release(reservation_id)
+        return expired
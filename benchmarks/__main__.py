@@ -0,0 +1,57 @@
+import argparse
+import sys
+
+from .harness import compare_baseline, format_report, save_baseline
+from .scenarios import BACKENDS, run_all
+from .startup import format_startup, measure_startup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Order-to-shipment pipeline benchmarks on the in-memory AWS fake")
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--products-per-order", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--cart-lines", type=int, default=10000)
+    parser.add_argument("--cart-edits", type=int, default=200)
+    parser.add_argument("--dynamo-latency-ms", type=float, default=0.0)
+    parser.add_argument("--sqs-latency-ms", type=float, default=0.0)
+    parser.add_argument("--backend", choices=BACKENDS, default="fake",
+                        help="storage and queue backend (latency options apply to the fake only)")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results against a baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    parser.add_argument("--startup", action="store_true",
+                        help="measure import and first-order time in fresh interpreters instead")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        print(format_startup(measure_startup()))
+        return 0
+
+    parameters = {
+        "orders": args.orders,
+        "products_per_order": args.products_per_order,
+        "batch_size": args.batch_size,
+        "cart_lines": args.cart_lines,
+        "cart_edits": args.cart_edits,
+        "dynamo_latency": args.dynamo_latency_ms / 1000,
+        "sqs_latency": args.sqs_latency_ms / 1000,
+        "backend": args.backend,
+    }
+    results = run_all(**parameters)
+    print(format_report(results))
+
+    if args.save:
+        save_baseline(args.save, results, parameters)
+    if args.compare:
+        regressions = compare_baseline(args.compare, results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
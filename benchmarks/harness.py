@@ -0,0 +1,64 @@
+import json
+import time
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Timer:
+    def __init__(self, name):
+        self.name = name
+        self.samples = []
+        self.operations = 0
+        self.elapsed = 0.0
+
+    def measure(self, function, *args, operations=1, **kwargs):
+        started = time.perf_counter()
+        result = function(*args, **kwargs)
+        duration = time.perf_counter() - started
+        self.samples.append(duration)
+        self.operations += operations
+        self.elapsed += duration
+        return result
+
+    def report(self):
+        return {
+            "calls": len(self.samples),
+            "operations": self.operations,
+            "p50_ms": percentile(self.samples, 0.50) * 1000,
+            "p99_ms": percentile(self.samples, 0.99) * 1000,
+            "throughput": self.operations / self.elapsed if self.elapsed else 0.0,
+        }
+
+
+def format_report(results):
+    lines = [f"{'benchmark':<34}{'calls':>8}{'p50 ms':>12}{'p99 ms':>12}{'ops/s':>14}"]
+    for name, result in results.items():
+        lines.append(f"{name:<34}{result['calls']:>8}{result['p50_ms']:>12.3f}{result['p99_ms']:>12.3f}"
+                     f"{result['throughput']:>14.1f}")
+    return "\n".join(lines)
+
+
+def save_baseline(path, results, parameters):
+    with open(path, "w", encoding="utf-8") as baseline:
+        json.dump({"parameters": parameters, "results": results}, baseline, indent=2, sort_keys=True)
+
+
+def compare_baseline(path, results, threshold):
+    with open(path, encoding="utf-8") as baseline:
+        previous = json.load(baseline)["results"]
+    regressions = []
+    for name, result in results.items():
+        if name not in previous:
+            continue
+        before = previous[name]
+        if result["p99_ms"] > before["p99_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p99 {before['p99_ms']:.3f} ms -> {result['p99_ms']:.3f} ms")
+        if result["throughput"] < before["throughput"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {before['throughput']:.1f} -> {result['throughput']:.1f} ops/s")
+    return regressions
@@ -0,0 +1,103 @@
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from app.columnar import ColumnarShoppingCart
+from app.eshop import Order, Product, ShoppingCart
+from services.backends import memory_backend, sqlite_backend
+from services.fake import fake_backend
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.service import ShippingService
+
+from .harness import Timer
+
+SHIPPING_TYPE = ShippingService.list_available_shipping_type()[0]
+
+
+BACKENDS = ("fake", "memory", "sqlite")
+
+
+def build_service(dynamo_latency, sqs_latency, backend="fake", directory=None):
+    if backend == "memory":
+        return ShippingService(*memory_backend())
+    if backend == "sqlite":
+        return ShippingService(*sqlite_backend(os.path.join(directory, "shipping.db")))
+    dynamo_resource, sqs_client = fake_backend(dynamo_latency, sqs_latency)
+    return ShippingService(ShippingRepository(dynamo_resource), ShippingPublisher(sqs_client))
+
+
+def due_date():
+    return datetime.now(timezone.utc) + timedelta(minutes=5)
+
+
+def bench_place_order(service, orders, products_per_order):
+    timer = Timer("place_order")
+    products = [Product(name=f"Product_{i}", price=random.random() * 100, available_amount=orders * 10)
+                for i in range(products_per_order)]
+    for _ in range(orders):
+        cart = ShoppingCart()
+        for product in products:
+            cart.add_product(product, 1)
+        timer.measure(Order(cart, service).place_order, SHIPPING_TYPE, due_date())
+    return timer
+
+
+def bench_create_shipping(service, orders):
+    timer = Timer("create_shipping")
+    for i in range(orders):
+        timer.measure(service.create_shipping, SHIPPING_TYPE, ["Product"], f"order_{i}", due_date())
+    return timer
+
+
+def bench_create_shippings_bulk(service, orders, batch_size):
+    timer = Timer("create_shippings_bulk")
+    for start in range(0, orders, batch_size):
+        batch = [(SHIPPING_TYPE, ["Product"], f"order_{i}", due_date())
+                 for i in range(start, min(orders, start + batch_size))]
+        timer.measure(service.create_shippings_bulk, batch, operations=len(batch))
+    return timer
+
+
+def bench_process_shipping_batch(service, expected):
+    timer = Timer("process_shipping_batch")
+    while timer.operations < expected:
+        result = timer.measure(service.process_shipping_batch, operations=0)
+        timer.operations += len(result)
+    return timer
+
+
+def bench_cart(cart_class, lines, edits):
+    timer = Timer(f"cart_edit[{cart_class.__name__}]")
+    products = [Product(name=f"Line_{i}", price=random.random() * 100, available_amount=1000)
+                for i in range(lines)]
+    cart = cart_class()
+    cart.add_products((product, 1) for product in products)
+    for _ in range(edits):
+        product = random.choice(products)
+
+        def edit():
+            cart.remove_product(product)
+            cart.add_product(product, random.randint(1, 10))
+            return cart.calculate_total()
+
+        timer.measure(edit)
+    return timer
+
+
+def run_all(orders=200, products_per_order=3, batch_size=100, cart_lines=10000, cart_edits=200,
+            dynamo_latency=0.0, sqs_latency=0.0, backend="fake"):
+    with tempfile.TemporaryDirectory() as directory:
+        service = build_service(dynamo_latency, sqs_latency, backend, directory)
+        timers = [
+            bench_place_order(service, orders, products_per_order),
+            bench_create_shipping(service, orders),
+            bench_create_shippings_bulk(service, orders, batch_size),
+        ]
+        timers.append(bench_process_shipping_batch(service, orders * 3))
+        if backend == "sqlite":
+            service.repository.database.close()
+    timers.append(bench_cart(ShoppingCart, cart_lines, cart_edits))
+    timers.append(bench_cart(ColumnarShoppingCart, cart_lines, cart_edits))
+    return {timer.name: timer.report() for timer in timers}
@@ -0,0 +1,47 @@
+import json
+import subprocess
+import sys
+
+# Runs in a fresh interpreter so nothing is imported yet. The fake backend imports botocore itself, so the
+# first-order time includes it; against AWS that cost moves to the first client call instead.
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import services.service
+import app.eshop
+imported = time.perf_counter()
+boto3_loaded = "boto3" in sys.modules
+from datetime import datetime, timedelta, timezone
+from app.eshop import Order, Product, ShoppingCart
+from services.fake import fake_backend
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.service import ShippingService
+dynamo_resource, sqs_client = fake_backend()
+service = ShippingService(ShippingRepository(dynamo_resource), ShippingPublisher(sqs_client))
+cart = ShoppingCart()
+cart.add_product(Product(name="Product", price=1.0, available_amount=10), 1)
+Order(cart, service).place_order(ShippingService.list_available_shipping_type()[0],
+                                 datetime.now(timezone.utc) + timedelta(minutes=5))
+done = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "first_order_ms": (done - start) * 1000,
+                  "boto3_on_import": boto3_loaded}))
+"""
+
+
+def measure_startup(runs=5):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE], check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output))
+    return {
+        "import_ms": min(sample["import_ms"] for sample in samples),
+        "first_order_ms": min(sample["first_order_ms"] for sample in samples),
+        "boto3_on_import": any(sample["boto3_on_import"] for sample in samples),
+    }
+
+
+def format_startup(result):
+    return (f"import services + app.eshop: {result['import_ms']:.1f} ms\n"
+            f"first order on the fake:     {result['first_order_ms']:.1f} ms\n"
+            f"boto3 loaded on import:      {result['boto3_on_import']}")
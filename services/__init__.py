@@ -1 +1,2 @@
-from .service import ShippingService
\ No newline at end of file
+from .service import ShippingService
+from .models import ShippingRecord, ShippingRequest
@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import logging
+
+from .config import SHIPPING_POLL_WAIT_SECONDS
+from .events import StatusEventBus
+from .models import ShippingRequest
+from .publisher import ShippingPublisher
+from .repository import ShippingRepository
+from .service import ShippingNotFoundError, ShippingService
+
+logger = logging.getLogger(__name__)
+
+
+class _ExecutorBridge:
+    def __init__(self, executor=None):
+        self.executor = executor
+
+    async def run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+
+class AsyncShippingRepository(_ExecutorBridge):
+    def __init__(self, repository=None, executor=None):
+        super().__init__(executor)
+        self.repository = repository or ShippingRepository()
+
+    async def get_shipping(self, shipping_id):
+        return await self.run(self.repository.get_shipping, shipping_id)
+
+    async def get_shippings(self, shipping_ids):
+        return await self.run(self.repository.get_shippings, shipping_ids)
+
+    async def create_shipping(self, shipping_type, product_ids, order_id, status, due_date):
+        return await self.run(self.repository.create_shipping, shipping_type, product_ids, order_id, status,
+                              due_date)
+
+    async def create_shippings(self, requests, status):
+        return await self.run(self.repository.create_shippings, requests, status)
+
+    async def update_shipping_status(self, shipping_id, status, expected_status=None):
+        return await self.run(self.repository.update_shipping_status, shipping_id, status, expected_status)
+
+
+class AsyncShippingPublisher(_ExecutorBridge):
+    def __init__(self, publisher=None, executor=None):
+        super().__init__(executor)
+        self.publisher = publisher or ShippingPublisher()
+
+    async def send_new_shipping(self, shipping_id):
+        return await self.run(self.publisher.send_new_shipping, shipping_id)
+
+    async def send_new_shippings(self, shipping_ids):
+        return await self.run(self.publisher.send_new_shippings, shipping_ids)
+
+    async def poll_shipping(self, batch_size=10):
+        return await self.run(self.publisher.poll_shipping, batch_size)
+
+    async def receive_shipping_messages(self, batch_size=10, wait_time=SHIPPING_POLL_WAIT_SECONDS,
+                                        visibility_timeout=None):
+        return await self.run(self.publisher.receive_shipping_messages, batch_size, wait_time, visibility_timeout)
+
+    async def delete_shippings(self, receipt_handles):
+        return await self.run(self.publisher.delete_shippings, receipt_handles)
+
+    async def extend_visibility(self, receipt_handles, visibility_timeout):
+        return await self.run(self.publisher.extend_visibility, receipt_handles, visibility_timeout)
+
+
+class AsyncShippingService:
+    SHIPPING_CREATED: str = ShippingService.SHIPPING_CREATED
+    SHIPPING_IN_PROGRESS: str = ShippingService.SHIPPING_IN_PROGRESS
+    SHIPPING_COMPLETED: str = ShippingService.SHIPPING_COMPLETED
+    SHIPPING_FAILED: str = ShippingService.SHIPPING_FAILED
+    ACTIVE_STATUSES = ShippingService.ACTIVE_STATUSES
+
+    list_available_shipping_type = staticmethod(ShippingService.list_available_shipping_type)
+    validate_shipping = staticmethod(ShippingService.validate_shipping)
+    is_overdue = staticmethod(ShippingService.is_overdue)
+
+    def __init__(self, repository, publisher, events=None):
+        self.repository = repository
+        self.publisher = publisher
+        self.events = events or StatusEventBus()
+
+    async def create_shipping(self, shipping_type, product_ids, order_id, due_date):
+        self.validate_shipping(shipping_type, due_date)
+
+        shipping_id = await self.repository.create_shipping(shipping_type, product_ids, order_id,
+                                                            self.SHIPPING_CREATED, due_date)
+
+        await self.publisher.send_new_shipping(shipping_id)
+        if await self.repository.update_shipping_status(shipping_id, self.SHIPPING_IN_PROGRESS,
+                                                        expected_status=self.SHIPPING_CREATED) is not None:
+            self.events.publish(shipping_id, self.SHIPPING_IN_PROGRESS)
+
+        return shipping_id
+
+    async def create_shippings_bulk(self, orders):
+        requests = [ShippingRequest(*order) for order in orders]
+        for request in requests:
+            self.validate_shipping(request.shipping_type, request.due_date)
+
+        shipping_ids = await self.repository.create_shippings(requests, self.SHIPPING_IN_PROGRESS)
+        await self.publisher.send_new_shippings(shipping_ids)
+        for shipping_id in shipping_ids:
+            self.events.publish(shipping_id, self.SHIPPING_IN_PROGRESS)
+
+        return shipping_ids
+
+    async def process_shipping_batch(self):
+        messages = await self.publisher.receive_shipping_messages()
+        shippings = await self.repository.get_shippings([message['Body'] for message in messages]) if messages else {}
+        result = await asyncio.gather(*(self._process_message(message['Body'], shippings.get(message['Body']))
+                                        for message in messages))
+
+        if messages:
+            await self.publisher.delete_shippings([message['ReceiptHandle'] for message in messages])
+
+        return list(result)
+
+    async def _process_message(self, shipping_id, shipping):
+        try:
+            return await self.process_shipping(shipping_id, shipping)
+        except ShippingNotFoundError:
+            logger.warning("Shipping %s does not exist, dropping its message", shipping_id)
+            return None
+
+    async def process_shipping(self, shipping_id, shipping=None):
+        if shipping is None:
+            shipping = await self.repository.get_shipping(shipping_id)
+        if shipping is None:
+            raise ShippingNotFoundError(f"Shipping {shipping_id} does not exist")
+        if shipping['shipping_status'] not in self.ACTIVE_STATUSES:
+            return None
+        if self.is_overdue(shipping):
+            return await self.fail_shipping(shipping_id)
+
+        return await self.complete_shipping(shipping_id)
+
+    async def check_status(self, shipping_id):
+        shipping = await self.repository.get_shipping(shipping_id)
+
+        return shipping['shipping_status']
+
+    async def check_statuses(self, shipping_ids):
+        shippings = await self.repository.get_shippings(shipping_ids)
+
+        return {shipping_id: shipping['shipping_status'] for shipping_id, shipping in shippings.items()}
+
+    async def fail_shipping(self, shipping_id):
+        return await self.finish_shipping(shipping_id, self.SHIPPING_FAILED)
+
+    async def complete_shipping(self, shipping_id):
+        return await self.finish_shipping(shipping_id, self.SHIPPING_COMPLETED)
+
+    async def finish_shipping(self, shipping_id, status):
+        response = await self.repository.update_shipping_status(shipping_id, status,
+                                                                expected_status=self.ACTIVE_STATUSES)
+        if response is None:
+            return None
+        self.events.publish(shipping_id, status)
+        return response['ResponseMetadata']
@@ -0,0 +1,15 @@
+from .base import ShippingQueue, ShippingStore
+from .memory import MemoryShippingQueue, MemoryShippingRepository, memory_backend
+from .sqlite import SqliteDatabase, SqliteShippingQueue, SqliteShippingRepository, sqlite_backend
+
+__all__ = [
+    "ShippingQueue",
+    "ShippingStore",
+    "MemoryShippingQueue",
+    "MemoryShippingRepository",
+    "memory_backend",
+    "SqliteDatabase",
+    "SqliteShippingQueue",
+    "SqliteShippingRepository",
+    "sqlite_backend",
+]
@@ -0,0 +1,86 @@
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Protocol
+
+from ..config import SHIPPING_POLL_WAIT_SECONDS
+
+# The parts of ShippingRepository and ShippingPublisher that the service, the processor, the scheduler,
+# the outbox relay and the export use. Items are the version 2 dicts built by codec.encode.
+
+
+class ShippingStore(Protocol):
+    def warm_up(self): ...
+
+    def get_shipping(self, shipping_id: str) -> Optional[dict]: ...
+
+    def get_record(self, shipping_id: str): ...
+
+    def get_shippings(self, shipping_ids: List[str]) -> Dict[str, dict]: ...
+
+    # `filter` is backend specific: a boto3 condition for DynamoDB, a predicate on the item for the local
+    # backends. `segments` and `page_size` are hints that local backends may ignore.
+    def iter_shipments(self, filter=None, projection: str = None, segments: int = 1,
+                       page_size: int = None) -> Iterator[dict]: ...
+
+    def iter_shippings_by_order(self, order_id: str, page_size: int = None) -> Iterator[dict]: ...
+
+    # Ordered by due_at.
+    def iter_shippings_by_status(self, status: str, due_before: datetime = None, projection: str = None,
+                                 page_size: int = None) -> Iterator[dict]: ...
+
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                        due_date: datetime) -> str: ...
+
+    def create_shippings(self, requests: list, status: str) -> List[str]: ...
+
+    def create_shipping_with_outbox(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                                    due_date: datetime) -> str: ...
+
+    def fetch_outbox(self, limit: int = 100) -> List[dict]: ...
+
+    def delete_outbox(self, event_ids: list): ...
+
+    def set_product_stock(self, stock: dict): ...
+
+    # Idempotent per order id; raises ValueError when a product is out of stock and OrderConflictError
+    # when the order id was already placed with other products.
+    def create_order_transaction(self, shipping_type: str, product_counts: dict, order_id: str, status: str,
+                                 due_date: datetime, with_outbox: bool = False, created_at: int = None) -> str: ...
+
+    # Returns an UpdateItem-shaped response, or None when the shipping is not in one of the expected statuses.
+    def update_shipping_status(self, shipping_id: str, status: str, expected_status=None): ...
+
+
+class ShippingQueue(Protocol):
+    def warm_up(self): ...
+
+    def send_new_shipping(self, shipping_id: str) -> str: ...
+
+    def send_new_shippings(self, shipping_ids: list) -> List[str]: ...
+
+    def poll_shipping(self, batch_size: int = 10) -> List[str]: ...
+
+    # Messages are dicts with MessageId, Body and ReceiptHandle.
+    def receive_shipping_messages(self, batch_size: int = 10, wait_time: int = SHIPPING_POLL_WAIT_SECONDS,
+                                  visibility_timeout: int = None) -> List[dict]: ...
+
+    def queue_backlog(self) -> int: ...
+
+    # Both return the receipt handles that failed.
+    def delete_shippings(self, receipt_handles: list) -> list: ...
+
+    def extend_visibility(self, receipt_handles: list, visibility_timeout: int) -> list: ...
+
+
+OK_RESPONSE = {"ResponseMetadata": {"HTTPStatusCode": 200}}
+
+
+def project(item, projection):
+    if not projection:
+        return item
+    return {name: item[name] for name in (part.strip() for part in projection.split(",")) if name in item}
+
+
+def expected_statuses(expected_status):
+    if expected_status is None:
+        return None
+    return [expected_status] if isinstance(expected_status, str) else list(expected_status)
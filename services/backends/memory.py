@@ -0,0 +1,243 @@
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from uuid import uuid4
+
+from .. import codec
+from ..config import SHIPPING_POLL_WAIT_SECONDS, SHIPPING_VISIBILITY_TIMEOUT
+from ..repository import OrderConflictError, ShippingRepository, same_products
+from .base import OK_RESPONSE, expected_statuses, project
+
+
+def copy_item(item):
+    return dict(item, product_ids=list(item["product_ids"]))
+
+
+class MemoryShippingRepository:
+    # Single-process store for tests, benchmarks and edge nodes. Items are kept as version 2 dicts,
+    # with the order and status indexes maintained on every write. Each status bucket is a list of
+    # (due_at, shipping_id) kept sorted on insert, so a by-status query is a bisect and a slice.
+    build_item = staticmethod(ShippingRepository.build_item)
+    order_shipping_id = staticmethod(ShippingRepository.order_shipping_id)
+
+    def __init__(self):
+        self.items = {}
+        self.by_order = {}
+        self.by_status = {}
+        self.products = {}
+        self.orders = {}
+        self.outbox = {}
+        self.lock = threading.RLock()
+
+    def warm_up(self):
+        return self
+
+    def _put(self, item):
+        previous = self.items.get(item["shipping_id"])
+        if previous is not None:
+            bucket = self.by_status[previous["shipping_status"]]
+            del bucket[bisect.bisect_left(bucket, (previous["due_at"], previous["shipping_id"]))]
+        self.items[item["shipping_id"]] = item
+        self.by_order.setdefault(item["order_id"], {})[item["shipping_id"]] = None
+        bisect.insort(self.by_status.setdefault(item["shipping_status"], []), (item["due_at"], item["shipping_id"]))
+
+    def get_shipping(self, shipping_id):
+        with self.lock:
+            item = self.items.get(shipping_id)
+            return copy_item(item) if item is not None else None
+
+    def get_record(self, shipping_id):
+        with self.lock:
+            item = self.items.get(shipping_id)
+            return codec.decode(item) if item is not None else None
+
+    def get_shippings(self, shipping_ids):
+        with self.lock:
+            return {shipping_id: copy_item(self.items[shipping_id])
+                    for shipping_id in shipping_ids if shipping_id in self.items}
+
+    def iter_shipments(self, filter=None, projection: str = None, segments: int = 1,  # pylint: disable=redefined-builtin
+                       page_size: int = None):
+        with self.lock:
+            items = [copy_item(item) for item in self.items.values()]
+        return (project(item, projection) for item in items if filter is None or filter(item))
+
+    def iter_shippings_by_order(self, order_id: str, page_size: int = None):
+        with self.lock:
+            return iter([copy_item(self.items[shipping_id]) for shipping_id in self.by_order.get(str(order_id), ())])
+
+    def iter_shippings_by_status(self, status: str, due_before: datetime = None, projection: str = None,
+                                 page_size: int = None):
+        limit = codec.to_millis(due_before) if due_before is not None else None
+        with self.lock:
+            bucket = self.by_status.get(status, [])
+            end = len(bucket) if limit is None else bisect.bisect_left(bucket, (limit,))
+            items = [project(copy_item(self.items[shipping_id]), projection) for _, shipping_id in bucket[:end]]
+        return iter(items)
+
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime):
+        item = self.build_item(shipping_type, product_ids, order_id, status, due_date)
+        with self.lock:
+            self._put(item)
+        return item["shipping_id"]
+
+    def create_shippings(self, requests: list, status: str):
+        items = [self.build_item(request.shipping_type, request.product_ids, request.order_id, status,
+                                 request.due_date, request.shipping_id)
+                 for request in requests]
+        with self.lock:
+            for item in items:
+                self._put(item)
+        return [item["shipping_id"] for item in items]
+
+    def _add_outbox(self, item):
+        self.outbox[item["shipping_id"]] = {"event_id": item["shipping_id"], "shipping_id": item["shipping_id"],
+                                            "created_at": item["created_at"]}
+
+    def create_shipping_with_outbox(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                                    due_date: datetime):
+        item = self.build_item(shipping_type, product_ids, order_id, status, due_date)
+        with self.lock:
+            self._put(item)
+            self._add_outbox(item)
+        return item["shipping_id"]
+
+    def fetch_outbox(self, limit: int = 100):
+        with self.lock:
+            return [dict(event) for event in itertools.islice(self.outbox.values(), limit)]
+
+    def delete_outbox(self, event_ids: list):
+        with self.lock:
+            for event_id in event_ids:
+                self.outbox.pop(event_id, None)
+
+    def set_product_stock(self, stock: dict):
+        with self.lock:
+            self.products.update(stock)
+
+    def create_order_transaction(self, shipping_type: str, product_counts: dict, order_id: str, status: str,
+                                 due_date: datetime, with_outbox: bool = False, created_at: int = None):
+        shipping_id = self.order_shipping_id(order_id)
+        item = self.build_item(shipping_type, list(product_counts), order_id, status, due_date, shipping_id,
+                               created_at)
+        with self.lock:
+            placed = self.orders.get(str(order_id))
+            if placed is not None:
+                if not same_products(placed["products"], product_counts):
+                    raise OrderConflictError(f"Order {order_id} was already placed with different products")
+                return shipping_id
+            for product_id, count in product_counts.items():
+                if self.products.get(product_id, 0) < count:
+                    raise ValueError(f"Product {product_id} is out of stock")
+            for product_id, count in product_counts.items():
+                self.products[product_id] -= count
+            self.orders[str(order_id)] = {"order_id": str(order_id), "shipping_id": shipping_id,
+                                          "products": dict(product_counts), "created_at": item["created_at"]}
+            self._put(item)
+            if with_outbox:
+                self._add_outbox(item)
+        return shipping_id
+
+    def update_shipping_status(self, shipping_id, status, expected_status=None):
+        expected = expected_statuses(expected_status)
+        with self.lock:
+            item = self.items.get(shipping_id)
+            if item is None or expected is not None and item["shipping_status"] not in expected:
+                return None
+            self._put(dict(item, shipping_status=status))
+        return dict(OK_RESPONSE)
+
+
+class MemoryShippingQueue:
+    # Ready messages wait in a FIFO; received ones sit in a heap keyed by the time they become visible
+    # again, so receiving costs O(batch) rather than a scan of the whole queue.
+    def __init__(self, visibility_timeout: int = SHIPPING_VISIBILITY_TIMEOUT, clock=time.monotonic):
+        self.visibility_timeout = visibility_timeout
+        self.clock = clock
+        self.bodies = {}
+        self.ready = deque()
+        # receipt handle -> (message id, visible at). The heap holds (visible at, sequence, handle) and may
+        # keep stale entries for extended or deleted handles; they are skipped on release.
+        self.in_flight = {}
+        self.timeouts = []
+        self.message_ids = itertools.count()
+        self.condition = threading.Condition()
+
+    def warm_up(self):
+        return self
+
+    def _release(self, now):
+        while self.timeouts and self.timeouts[0][0] <= now:
+            visible_at, _, handle = heapq.heappop(self.timeouts)
+            entry = self.in_flight.get(handle)
+            if entry is not None and entry[1] == visible_at:
+                del self.in_flight[handle]
+                self.ready.append(entry[0])
+
+    def send_new_shipping(self, shipping_id: str):
+        return self.send_new_shippings([shipping_id])[0]
+
+    def send_new_shippings(self, shipping_ids: list):
+        message_ids = [str(next(self.message_ids)) for _ in shipping_ids]
+        with self.condition:
+            for message_id, shipping_id in zip(message_ids, shipping_ids):
+                self.bodies[message_id] = shipping_id
+                self.ready.append(message_id)
+            self.condition.notify_all()
+        return message_ids
+
+    def poll_shipping(self, batch_size: int = 10):
+        return [message['Body'] for message in self.receive_shipping_messages(batch_size)]
+
+    def receive_shipping_messages(self, batch_size: int = 10, wait_time: int = SHIPPING_POLL_WAIT_SECONDS,
+                                  visibility_timeout: int = None):
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        deadline = self.clock() + wait_time
+        with self.condition:
+            while True:
+                now = self.clock()
+                self._release(now)
+                if self.ready or now >= deadline:
+                    break
+                wake = deadline if not self.timeouts else min(deadline, self.timeouts[0][0])
+                self.condition.wait(max(0.0, wake - now))
+            messages = []
+            while self.ready and len(messages) < batch_size:
+                message_id = self.ready.popleft()
+                handle = str(uuid4())
+                self.in_flight[handle] = (message_id, now + timeout)
+                heapq.heappush(self.timeouts, (now + timeout, int(message_id), handle))
+                messages.append({"MessageId": message_id, "Body": self.bodies[message_id], "ReceiptHandle": handle})
+        return messages
+
+    def queue_backlog(self):
+        with self.condition:
+            self._release(self.clock())
+            return len(self.ready)
+
+    def delete_shippings(self, receipt_handles: list):
+        with self.condition:
+            for handle in receipt_handles:
+                entry = self.in_flight.pop(handle, None)
+                if entry is not None:
+                    del self.bodies[entry[0]]
+        return []
+
+    def extend_visibility(self, receipt_handles: list, visibility_timeout: int):
+        with self.condition:
+            visible_at = self.clock() + visibility_timeout
+            for handle in receipt_handles:
+                if handle in self.in_flight:
+                    message_id = self.in_flight[handle][0]
+                    self.in_flight[handle] = (message_id, visible_at)
+                    heapq.heappush(self.timeouts, (visible_at, int(message_id), handle))
+            self.condition.notify_all()
+        return []
+
+
+def memory_backend():
+    return MemoryShippingRepository(), MemoryShippingQueue()
@@ -0,0 +1,323 @@
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from uuid import uuid4
+
+from .. import codec
+from ..config import SHIPPING_POLL_WAIT_SECONDS, SHIPPING_QUEUE, SHIPPING_SQLITE_PATH, SHIPPING_VISIBILITY_TIMEOUT
+from ..repository import OrderConflictError, ShippingRepository, same_products
+from .base import OK_RESPONSE, expected_statuses, project
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shipping (
+    shipping_id TEXT PRIMARY KEY,
+    record_version INTEGER NOT NULL,
+    shipping_type TEXT,
+    order_id TEXT,
+    product_ids TEXT NOT NULL,
+    shipping_status TEXT,
+    created_at INTEGER NOT NULL,
+    due_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS shipping_by_order ON shipping (order_id);
+CREATE INDEX IF NOT EXISTS shipping_by_status_due ON shipping (shipping_status, due_at);
+CREATE TABLE IF NOT EXISTS product (product_id TEXT PRIMARY KEY, available_amount INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS shipping_order (
+    order_id TEXT PRIMARY KEY,
+    shipping_id TEXT NOT NULL,
+    products TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    event_id TEXT PRIMARY KEY,
+    shipping_id TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue TEXT NOT NULL,
+    body TEXT NOT NULL,
+    visible_at REAL NOT NULL,
+    receipt_handle TEXT,
+    receive_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS message_visible ON message (queue, visible_at, seq);
+CREATE UNIQUE INDEX IF NOT EXISTS message_receipt ON message (receipt_handle);
+"""
+SHIPPING_COLUMNS = ("shipping_id", "record_version", "shipping_type", "order_id", "product_ids",
+                    "shipping_status", "created_at", "due_at")
+SELECT_SHIPPING = f"SELECT {', '.join(SHIPPING_COLUMNS)} FROM shipping"
+INSERT_SHIPPING = (f"INSERT OR REPLACE INTO shipping ({', '.join(SHIPPING_COLUMNS)}) "
+                   f"VALUES ({', '.join('?' * len(SHIPPING_COLUMNS))})")
+# SQLite's default limit on host parameters is 999 before 3.32.
+MAX_PARAMETERS = 500
+
+
+def to_row(item):
+    return tuple(json.dumps(item[name]) if name == "product_ids" else item[name] for name in SHIPPING_COLUMNS)
+
+
+def to_item(row):
+    item = dict(zip(SHIPPING_COLUMNS, row))
+    item["product_ids"] = json.loads(item["product_ids"])
+    return item
+
+
+class SqliteDatabase:
+    # One connection per thread on a WAL-mode database: readers never block the writer, and worker
+    # processes on the same host can share the file. Writes run in BEGIN IMMEDIATE transactions so two
+    # writers queue on the lock instead of failing on a read-to-write upgrade.
+    def __init__(self, path: str = SHIPPING_SQLITE_PATH, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            # Durable against process crashes; a power loss may drop the last transactions.
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def execute(self, sql, parameters=()):
+        return self.connection().execute(sql, parameters)
+
+    @contextmanager
+    def transaction(self):
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = []
+        self.local = threading.local()
+
+
+def chunked(items, size=MAX_PARAMETERS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SqliteShippingRepository:
+    build_item = staticmethod(ShippingRepository.build_item)
+    order_shipping_id = staticmethod(ShippingRepository.order_shipping_id)
+
+    def __init__(self, database=None):
+        self.database = database if database is not None else SqliteDatabase()
+
+    def warm_up(self):
+        self.database.connection()
+        return self
+
+    def get_shipping(self, shipping_id):
+        row = self.database.execute(f"{SELECT_SHIPPING} WHERE shipping_id = ?", (shipping_id,)).fetchone()
+        return to_item(row) if row is not None else None
+
+    def get_record(self, shipping_id):
+        item = self.get_shipping(shipping_id)
+        return codec.decode(item) if item is not None else None
+
+    def get_shippings(self, shipping_ids):
+        shippings = {}
+        for chunk in chunked(list(dict.fromkeys(shipping_ids))):
+            rows = self.database.execute(
+                f"{SELECT_SHIPPING} WHERE shipping_id IN ({', '.join('?' * len(chunk))})", chunk)
+            shippings.update((row[0], to_item(row)) for row in rows)
+        return shippings
+
+    def _iter(self, sql, parameters, projection=None, filter=None, page_size=None):  # pylint: disable=redefined-builtin
+        # Reads run on their own cursor in autocommit mode, so a long export does not hold up writers.
+        cursor = self.database.execute(sql, parameters)
+        while True:
+            rows = cursor.fetchmany(page_size or 1000)
+            if not rows:
+                return
+            for row in rows:
+                item = to_item(row)
+                if filter is None or filter(item):
+                    yield project(item, projection)
+
+    def iter_shipments(self, filter=None, projection: str = None, segments: int = 1,  # pylint: disable=redefined-builtin
+                       page_size: int = None):
+        return self._iter(SELECT_SHIPPING, (), projection, filter, page_size)
+
+    def iter_shippings_by_order(self, order_id: str, page_size: int = None):
+        return self._iter(f"{SELECT_SHIPPING} WHERE order_id = ?", (str(order_id),), page_size=page_size)
+
+    def iter_shippings_by_status(self, status: str, due_before: datetime = None, projection: str = None,
+                                 page_size: int = None):
+        sql, parameters = f"{SELECT_SHIPPING} WHERE shipping_status = ?", [status]
+        if due_before is not None:
+            sql += " AND due_at < ?"
+            parameters.append(codec.to_millis(due_before))
+        return self._iter(sql + " ORDER BY due_at", parameters, projection, page_size=page_size)
+
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime):
+        item = self.build_item(shipping_type, product_ids, order_id, status, due_date)
+        self.database.execute(INSERT_SHIPPING, to_row(item))
+        return item["shipping_id"]
+
+    def create_shippings(self, requests: list, status: str):
+        items = [self.build_item(request.shipping_type, request.product_ids, request.order_id, status,
+                                 request.due_date, request.shipping_id)
+                 for request in requests]
+        with self.database.transaction() as connection:
+            connection.executemany(INSERT_SHIPPING, [to_row(item) for item in items])
+        return [item["shipping_id"] for item in items]
+
+    @staticmethod
+    def _add_outbox(connection, item):
+        connection.execute("INSERT OR REPLACE INTO outbox (event_id, shipping_id, created_at) VALUES (?, ?, ?)",
+                           (item["shipping_id"], item["shipping_id"], item["created_at"]))
+
+    def create_shipping_with_outbox(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                                    due_date: datetime):
+        item = self.build_item(shipping_type, product_ids, order_id, status, due_date)
+        with self.database.transaction() as connection:
+            connection.execute(INSERT_SHIPPING, to_row(item))
+            self._add_outbox(connection, item)
+        return item["shipping_id"]
+
+    def fetch_outbox(self, limit: int = 100):
+        rows = self.database.execute("SELECT event_id, shipping_id, created_at FROM outbox LIMIT ?", (limit,))
+        return [{"event_id": event_id, "shipping_id": shipping_id, "created_at": created_at}
+                for event_id, shipping_id, created_at in rows]
+
+    def delete_outbox(self, event_ids: list):
+        with self.database.transaction() as connection:
+            connection.executemany("DELETE FROM outbox WHERE event_id = ?", [(event_id,) for event_id in event_ids])
+
+    def set_product_stock(self, stock: dict):
+        with self.database.transaction() as connection:
+            connection.executemany("INSERT OR REPLACE INTO product (product_id, available_amount) VALUES (?, ?)",
+                                   list(stock.items()))
+
+    def create_order_transaction(self, shipping_type: str, product_counts: dict, order_id: str, status: str,
+                                 due_date: datetime, with_outbox: bool = False, created_at: int = None):
+        shipping_id = self.order_shipping_id(order_id)
+        item = self.build_item(shipping_type, list(product_counts), order_id, status, due_date, shipping_id,
+                               created_at)
+        with self.database.transaction() as connection:
+            placed = connection.execute("SELECT products FROM shipping_order WHERE order_id = ?",
+                                        (str(order_id),)).fetchone()
+            if placed:
+                if not same_products(json.loads(placed[0]), product_counts):
+                    raise OrderConflictError(f"Order {order_id} was already placed with different products")
+                return shipping_id
+            for product_id, count in product_counts.items():
+                updated = connection.execute("UPDATE product SET available_amount = available_amount - ? "
+                                             "WHERE product_id = ? AND available_amount >= ?",
+                                             (count, product_id, count)).rowcount
+                if not updated:
+                    raise ValueError(f"Product {product_id} is out of stock")
+            connection.execute("INSERT INTO shipping_order (order_id, shipping_id, products, created_at) "
+                               "VALUES (?, ?, ?, ?)",
+                               (str(order_id), shipping_id, json.dumps(product_counts), item["created_at"]))
+            connection.execute(INSERT_SHIPPING, to_row(item))
+            if with_outbox:
+                self._add_outbox(connection, item)
+        return shipping_id
+
+    def update_shipping_status(self, shipping_id, status, expected_status=None):
+        sql, parameters = "UPDATE shipping SET shipping_status = ? WHERE shipping_id = ?", [status, shipping_id]
+        expected = expected_statuses(expected_status)
+        if expected is not None:
+            sql += f" AND shipping_status IN ({', '.join('?' * len(expected))})"
+            parameters.extend(expected)
+        if not self.database.execute(sql, parameters).rowcount:
+            return None
+        return dict(OK_RESPONSE)
+
+
+class SqliteShippingQueue:
+    # Messages live in the same database as the shipments. Receiving claims a batch in one write
+    # transaction, so concurrent consumers, in this or other processes, never get the same message.
+    def __init__(self, database=None, name: str = SHIPPING_QUEUE,
+                 visibility_timeout: int = SHIPPING_VISIBILITY_TIMEOUT, poll_interval: float = 0.05):
+        self.database = database if database is not None else SqliteDatabase()
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+
+    def warm_up(self):
+        self.database.connection()
+        return self
+
+    def send_new_shipping(self, shipping_id: str):
+        return self.send_new_shippings([shipping_id])[0]
+
+    def send_new_shippings(self, shipping_ids: list):
+        now = time.time()
+        with self.database.transaction() as connection:
+            return [str(connection.execute("INSERT INTO message (queue, body, visible_at) VALUES (?, ?, ?)",
+                                           (self.name, shipping_id, now)).lastrowid)
+                    for shipping_id in shipping_ids]
+
+    def poll_shipping(self, batch_size: int = 10):
+        return [message['Body'] for message in self.receive_shipping_messages(batch_size)]
+
+    def _claim(self, batch_size, visibility_timeout):
+        # Wall-clock time, since the visibility deadline is shared with other processes.
+        now = time.time()
+        with self.database.transaction() as connection:
+            rows = connection.execute("SELECT seq, body FROM message WHERE queue = ? AND visible_at <= ? "
+                                      "ORDER BY visible_at, seq LIMIT ?", (self.name, now, batch_size)).fetchall()
+            messages = [{"MessageId": str(seq), "Body": body, "ReceiptHandle": str(uuid4())} for seq, body in rows]
+            connection.executemany("UPDATE message SET receipt_handle = ?, visible_at = ?, "
+                                   "receive_count = receive_count + 1 WHERE seq = ?",
+                                   [(message["ReceiptHandle"], now + visibility_timeout, int(message["MessageId"]))
+                                    for message in messages])
+        return messages
+
+    def receive_shipping_messages(self, batch_size: int = 10, wait_time: int = SHIPPING_POLL_WAIT_SECONDS,
+                                  visibility_timeout: int = None):
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        deadline = time.monotonic() + wait_time
+        while True:
+            messages = self._claim(batch_size, timeout)
+            remaining = deadline - time.monotonic()
+            if messages or remaining <= 0:
+                return messages
+            time.sleep(min(self.poll_interval, remaining))
+
+    def queue_backlog(self):
+        return self.database.execute("SELECT COUNT(*) FROM message WHERE queue = ? AND visible_at <= ?",
+                                     (self.name, time.time())).fetchone()[0]
+
+    def delete_shippings(self, receipt_handles: list):
+        with self.database.transaction() as connection:
+            connection.executemany("DELETE FROM message WHERE receipt_handle = ?",
+                                   [(handle,) for handle in receipt_handles])
+        return []
+
+    def extend_visibility(self, receipt_handles: list, visibility_timeout: int):
+        visible_at = time.time() + visibility_timeout
+        with self.database.transaction() as connection:
+            connection.executemany("UPDATE message SET visible_at = ? WHERE receipt_handle = ?",
+                                   [(visible_at, handle) for handle in receipt_handles])
+        return []
+
+
+def sqlite_backend(path: str = SHIPPING_SQLITE_PATH):
+    database = SqliteDatabase(path)
+    return SqliteShippingRepository(database), SqliteShippingQueue(database)
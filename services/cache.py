@@ -0,0 +1,159 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .config import (SHIPPING_CACHE_MAX_BYTES, SHIPPING_CACHE_MAX_ENTRIES, SHIPPING_CACHE_TERMINAL_TTL,
+                     SHIPPING_CACHE_TTL, SHIPPING_DEDUP_SIZE)
+from .service import ShippingService
+
+
+def estimate_size(item):
+    return sys.getsizeof(item) + sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in item.items())
+
+
+class ShippingCache:
+    TERMINAL_STATUSES = (ShippingService.SHIPPING_COMPLETED, ShippingService.SHIPPING_FAILED)
+
+    def __init__(self, ttl: float = SHIPPING_CACHE_TTL, terminal_ttl: float = SHIPPING_CACHE_TERMINAL_TTL,
+                 max_entries: int = SHIPPING_CACHE_MAX_ENTRIES, max_bytes: int = SHIPPING_CACHE_MAX_BYTES,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.terminal_ttl = terminal_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _expires_at(self, item):
+        ttl = self.terminal_ttl if item.get("shipping_status") in self.TERMINAL_STATUSES else self.ttl
+        return self.clock() + ttl
+
+    def get(self, shipping_id):
+        with self.lock:
+            entry = self.entries.get(shipping_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            item, expires_at, _ = entry
+            if expires_at <= self.clock():
+                self._remove(shipping_id)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(shipping_id)
+            self.hits += 1
+            return dict(item)
+
+    def put(self, item):
+        item = dict(item)
+        size = estimate_size(item)
+        with self.lock:
+            self._remove(item["shipping_id"])
+            self.entries[item["shipping_id"]] = (item, self._expires_at(item), size)
+            self.size += size
+            while self.entries and (len(self.entries) > self.max_entries or self.size > self.max_bytes):
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def update_status(self, shipping_id, status):
+        with self.lock:
+            entry = self.entries.get(shipping_id)
+            if entry is None:
+                return
+            item, _, size = entry
+            item["shipping_status"] = status
+            self.entries[shipping_id] = (item, self._expires_at(item), size)
+            self.entries.move_to_end(shipping_id)
+
+    def invalidate(self, shipping_id):
+        with self.lock:
+            self._remove(shipping_id)
+
+    def _remove(self, shipping_id):
+        entry = self.entries.pop(shipping_id, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
+
+
+class CachedShippingRepository:
+    def __init__(self, repository, cache=None):
+        self.repository = repository
+        self.cache = cache or ShippingCache()
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+    def get_shipping(self, shipping_id):
+        item = self.cache.get(shipping_id)
+        if item is None:
+            item = self.repository.get_shipping(shipping_id)
+            if item is not None:
+                self.cache.put(item)
+        return item
+
+    def get_shippings(self, shipping_ids):
+        shippings = {}
+        missing = []
+        for shipping_id in shipping_ids:
+            item = self.cache.get(shipping_id)
+            if item is None:
+                missing.append(shipping_id)
+            else:
+                shippings[shipping_id] = item
+        if missing:
+            fetched = self.repository.get_shippings(missing)
+            for item in fetched.values():
+                self.cache.put(item)
+            shippings.update(fetched)
+        return shippings
+
+    def update_shipping_status(self, shipping_id, status, expected_status=None):
+        response = self.repository.update_shipping_status(shipping_id, status, expected_status)
+        if response is None:
+            # The condition failed, so the cached status is stale.
+            self.cache.invalidate(shipping_id)
+        else:
+            self.cache.update_status(shipping_id, status)
+        return response
+
+
+class RecentIds:
+    # An exact LRU rather than a Bloom filter: a false positive would delete a message that was never processed.
+    def __init__(self, max_entries: int = SHIPPING_DEDUP_SIZE):
+        self.max_entries = max_entries
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, shipping_id):
+        with self.lock:
+            if shipping_id not in self.ids:
+                return False
+            self.ids.move_to_end(shipping_id)
+            return True
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, shipping_id):
+        with self.lock:
+            self.ids[shipping_id] = None
+            self.ids.move_to_end(shipping_id)
+            if len(self.ids) > self.max_entries:
+                self.ids.popitem(last=False)
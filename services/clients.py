@@ -0,0 +1,120 @@
+import threading
+
+from .config import AWS_ENDPOINT_URL, AWS_MAX_POOL_CONNECTIONS, AWS_REGION, AWS_TCP_KEEPALIVE
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+_queue_urls = {}
+
+
+# boto3 is imported on first use: it dominates the import time of this package.
+def _client_config(protected=False):
+    from botocore.config import Config  # pylint: disable=import-outside-toplevel
+
+    # Protected clients sit behind services.resilience, which does the retrying; botocore's own
+    # retries (10 attempts for DynamoDB) would multiply with it. total_max_attempts counts the first
+    # attempt, unlike max_attempts.
+    retries = {"total_max_attempts": 1, "mode": "standard"} if protected else None
+    return Config(max_pool_connections=AWS_MAX_POOL_CONNECTIONS, tcp_keepalive=AWS_TCP_KEEPALIVE, retries=retries)
+
+
+def _get_session():
+    global _session  # pylint: disable=global-statement
+    if _session is None:
+        import boto3  # pylint: disable=import-outside-toplevel
+
+        _session = boto3.session.Session(
+            region_name=AWS_REGION,
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+        )
+    return _session
+
+
+def get_client(service_name, protected=False):
+    key = (service_name, protected)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _get_session().client(service_name, endpoint_url=AWS_ENDPOINT_URL,
+                                               config=_client_config(protected))
+                _clients[key] = client
+    return client
+
+
+def get_resource(service_name, protected=False):
+    key = (service_name, protected)
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = _get_session().resource(service_name, endpoint_url=AWS_ENDPOINT_URL,
+                                                   config=_client_config(protected))
+                _resources[key] = resource
+    return resource
+
+
+def counterpart(client, protected):
+    # The registry's other flavour of a shared client or resource; anything else is returned as is.
+    for registry, factory in ((_clients, get_client), (_resources, get_resource)):
+        for (service_name, is_protected), value in list(registry.items()):
+            if value is client:
+                return client if is_protected == protected else factory(service_name, protected)
+    return client
+
+
+class ClientProxy:
+    # One layer (metrics, resilience) over a client, resource or table that other services may share.
+    # The listed operations are wrapped on every lookup, so the shared object is never patched and a
+    # layer can be taken out of a chain without leaving its wrappers behind in the others.
+    def __init__(self, target, layer, wrap, operations):
+        self.proxied = target
+        self.layer = layer
+        self.wrap = wrap
+        self.operations = frozenset(operations)
+
+    def __getattr__(self, name):
+        value = getattr(self.proxied, name)
+        if name in self.operations and callable(value):
+            return self.wrap(name, value)
+        return value
+
+
+def has_layer(target, layer):
+    while isinstance(target, ClientProxy):
+        if target.layer == layer:
+            return True
+        target = target.proxied
+    return False
+
+
+def remove_layer(target, layer):
+    if not isinstance(target, ClientProxy):
+        return target
+    if target.layer == layer:
+        return target.proxied
+    target.proxied = remove_layer(target.proxied, layer)
+    return target
+
+
+def get_queue_url(queue_name):
+    queue_url = _queue_urls.get(queue_name)
+    if queue_url is None:
+        queue_url = get_client("sqs").create_queue(QueueName=queue_name)["QueueUrl"]
+        with _lock:
+            queue_url = _queue_urls.setdefault(queue_name, queue_url)
+    return queue_url
+
+
+def reset_clients():
+    global _session  # pylint: disable=global-statement
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
+        _queue_urls.clear()
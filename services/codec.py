@@ -0,0 +1,79 @@
+import time
+from datetime import datetime, timezone
+
+from .models import ShippingRecord
+
+RECORD_VERSION = 2
+# Version 2 items keep timestamps as integer epoch milliseconds in created_at/due_at and product ids as a
+# native list. Version 1 items (no record_version) have comma-joined product_ids and ISO created_date/due_date.
+# The new attributes have new names, so a version 1 item never holds a value of the wrong type for the
+# status/due index key.
+LEGACY_VERSION = 1
+
+
+def to_millis(value):
+    if isinstance(value, datetime):
+        return int(value.replace(tzinfo=value.tzinfo or timezone.utc).timestamp() * 1000)
+    if isinstance(value, str):
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    return int(value)
+
+
+def now_millis():
+    return int(time.time() * 1000)
+
+
+def encode(shipping_id: str, shipping_type: str, order_id: str, status: str, product_ids: list, due_date,
+           created_at: int = None):
+    return {
+        "shipping_id": shipping_id,
+        "record_version": RECORD_VERSION,
+        "shipping_type": shipping_type,
+        # The order index's hash key is a string attribute; a numeric order id would not be indexed.
+        "order_id": str(order_id),
+        "product_ids": list(product_ids),
+        "shipping_status": status,
+        "created_at": created_at if created_at is not None else now_millis(),
+        "due_at": to_millis(due_date),
+    }
+
+
+def record_version(item):
+    return int(item.get("record_version", LEGACY_VERSION))
+
+
+def due_millis(item):
+    # Hot path of process_shipping and the scheduler: no datetime parsing for version 2 items.
+    if "due_at" in item:
+        return int(item["due_at"])
+    return to_millis(item["due_date"])
+
+
+def decode(item):
+    if record_version(item) >= RECORD_VERSION:
+        product_ids = list(item.get("product_ids") or [])
+        created_at = int(item["created_at"])
+    else:
+        product_ids = item["product_ids"].split(",") if item.get("product_ids") else []
+        created_at = to_millis(item["created_date"])
+    return ShippingRecord(item["shipping_id"], item.get("shipping_type"), item.get("order_id"),
+                          item.get("shipping_status"), product_ids, created_at, due_millis(item),
+                          record_version(item))
+
+
+def upgrade(item):
+    record = decode(item)
+    return encode(record.shipping_id, record.shipping_type, record.order_id, record.shipping_status,
+                  record.product_ids, record.due_at, record.created_at)
+
+
+def as_dict(record: ShippingRecord):
+    return {
+        "shipping_id": record.shipping_id,
+        "shipping_type": record.shipping_type,
+        "order_id": record.order_id,
+        "shipping_status": record.shipping_status,
+        "product_ids": record.product_ids,
+        "created_date": record.created_date.isoformat(),
+        "due_date": record.due_date.isoformat(),
+    }
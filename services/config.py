@@ -3,4 +3,36 @@ import os
 AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL", "http://localhost:4566")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 SHIPPING_TABLE_NAME = os.getenv("SHIPPING_TABLE_NAME", "ShippingTable")
-SHIPPING_QUEUE = os.getenv("SHIPPING_QUEUE_NAME", "ShippingQueue")
\ No newline at end of file
+SHIPPING_QUEUE = os.getenv("SHIPPING_QUEUE_NAME", "ShippingQueue")
+SHIPPING_WORKERS = int(os.getenv("SHIPPING_WORKERS", "8"))
+SHIPPING_VISIBILITY_TIMEOUT = int(os.getenv("SHIPPING_VISIBILITY_TIMEOUT", "30"))
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+AWS_TCP_KEEPALIVE = os.getenv("AWS_TCP_KEEPALIVE", "true").lower() == "true"
+
+SHIPPING_CACHE_TTL = float(os.getenv("SHIPPING_CACHE_TTL", "5"))
+SHIPPING_CACHE_TERMINAL_TTL = float(os.getenv("SHIPPING_CACHE_TERMINAL_TTL", "600"))
+SHIPPING_CACHE_MAX_ENTRIES = int(os.getenv("SHIPPING_CACHE_MAX_ENTRIES", "100000"))
+SHIPPING_CACHE_MAX_BYTES = int(os.getenv("SHIPPING_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+PRODUCT_TABLE_NAME = os.getenv("PRODUCT_TABLE_NAME", "ProductTable")
+ORDER_TABLE_NAME = os.getenv("ORDER_TABLE_NAME", "OrderTable")
+OUTBOX_TABLE_NAME = os.getenv("OUTBOX_TABLE_NAME", "ShippingOutboxTable")
+OUTBOX_RELAY_INTERVAL = float(os.getenv("OUTBOX_RELAY_INTERVAL", "0.5"))
+
+SHIPPING_POLL_WAIT_SECONDS = int(os.getenv("SHIPPING_POLL_WAIT_SECONDS", "10"))
+SHIPPING_POLLERS = int(os.getenv("SHIPPING_POLLERS", "2"))
+SHIPPING_PROCESSES = int(os.getenv("SHIPPING_PROCESSES", str(os.cpu_count() or 1)))
+SHIPPING_SHUTDOWN_TIMEOUT = float(os.getenv("SHIPPING_SHUTDOWN_TIMEOUT", "60"))
+SHIPPING_DEDUP_SIZE = int(os.getenv("SHIPPING_DEDUP_SIZE", "10000"))
+EVENT_BROKER_HOST = os.getenv("EVENT_BROKER_HOST", "127.0.0.1")
+EVENT_BROKER_PORT = int(os.getenv("EVENT_BROKER_PORT", "8765"))
+EVENT_BROKER_ENABLED = os.getenv("EVENT_BROKER_ENABLED", "false").lower() == "true"
+AWS_RETRY_MAX_ATTEMPTS = int(os.getenv("AWS_RETRY_MAX_ATTEMPTS", "4"))
+AWS_RETRY_BASE_SECONDS = float(os.getenv("AWS_RETRY_BASE_SECONDS", "0.05"))
+AWS_RETRY_MAX_SECONDS = float(os.getenv("AWS_RETRY_MAX_SECONDS", "2"))
+AWS_BREAKER_THRESHOLD = int(os.getenv("AWS_BREAKER_THRESHOLD", "5"))
+AWS_BREAKER_RESET_SECONDS = float(os.getenv("AWS_BREAKER_RESET_SECONDS", "30"))
+SHIPPING_WAL_PATH = os.getenv("SHIPPING_WAL_PATH", "shipping.wal")
+SHIPPING_WAL_SIZE = int(os.getenv("SHIPPING_WAL_SIZE", str(64 * 1024 * 1024)))
+SHIPPING_WAL_FLUSH_INTERVAL = float(os.getenv("SHIPPING_WAL_FLUSH_INTERVAL", "0.05"))
+SHIPPING_SQLITE_PATH = os.getenv("SHIPPING_SQLITE_PATH", "shipping.db")
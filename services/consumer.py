@@ -0,0 +1,156 @@
+import logging
+import math
+import queue
+import threading
+import time
+
+from .config import SHIPPING_POLLERS
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConsumer:
+    # Several long-polls run concurrently and feed one buffer. Batch size follows the queue
+    # backlog, and the wait time drops to `min_wait` while there is a backlog and grows to
+    # `max_wait` when the queue is idle, which keeps empty receives (billed calls) rare.
+    # Buffered messages are not heartbeated, so the processor caps the buffer (`limit`) at what its
+    # workers finish within one visibility window, and messages that outlived it are dropped.
+    def __init__(self, publisher, pollers: int = SHIPPING_POLLERS, max_batch: int = 10, min_wait: int = 1,
+                 max_wait: int = 20, backlog_interval: float = 5.0, visibility_timeout: int = None,
+                 buffer_size: int = 100):
+        self.publisher = publisher
+        self.pollers = pollers
+        self.max_batch = max_batch
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.backlog_interval = backlog_interval
+        self.visibility_timeout = visibility_timeout
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.limit = buffer_size
+        self.backlog = 0
+        self.backlog_checked_at = None
+        self.receives = 0
+        self.empty_receives = 0
+        self.messages = 0
+        self.expired = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def refresh_backlog(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.backlog_checked_at is not None and now - self.backlog_checked_at < self.backlog_interval:
+                return self.backlog
+            self.backlog_checked_at = now
+        try:
+            backlog = self.publisher.queue_backlog()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Failed to read the queue backlog")
+            return self.backlog
+        with self.lock:
+            self.backlog = backlog
+        return backlog
+
+    def batch_size(self):
+        free = self.limit - self.buffer.qsize()
+        wanted = math.ceil(self.backlog / self.pollers) if self.backlog else self.max_batch
+        return max(1, min(self.max_batch, wanted, free))
+
+    def wait_time(self):
+        return self.min_wait if self.backlog else self.max_wait
+
+    def limit_buffer(self, limit: int):
+        self.limit = max(1, min(self.buffer.maxsize, limit))
+
+    def poll(self):
+        self.refresh_backlog()
+        batch_size = self.batch_size()
+        messages = self.publisher.receive_shipping_messages(batch_size, self.wait_time(), self.visibility_timeout)
+        received_at = time.monotonic()
+        with self.lock:
+            self.receives += 1
+            self.messages += len(messages)
+            if not messages:
+                self.empty_receives += 1
+                self.backlog = 0
+            elif len(messages) == batch_size:
+                # A full batch means the backlog estimate is probably stale.
+                self.backlog = max(self.backlog, batch_size * self.pollers)
+        for message in messages:
+            message['ReceivedAt'] = received_at
+        return messages
+
+    def run_poller(self):
+        while not self.stop_event.is_set():
+            if self.buffer.qsize() >= self.limit:
+                self.stop_event.wait(0.05)
+                continue
+            try:
+                messages = self.poll()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to receive shipping messages")
+                self.stop_event.wait(self.min_wait)
+                continue
+            for message in messages:
+                self.put(message)
+
+    def put(self, message):
+        while not self.stop_event.is_set():
+            try:
+                self.buffer.put(message, timeout=self.min_wait or 0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, max_messages: int = 10, timeout: float = 1.0):
+        try:
+            messages = [self.buffer.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(messages) < max_messages:
+            try:
+                messages.append(self.buffer.get_nowait())
+            except queue.Empty:
+                break
+        return self.drop_expired(messages)
+
+    def drop_expired(self, messages):
+        # Such a message is visible on the queue again and may already be with another worker.
+        if self.visibility_timeout is None:
+            return messages
+        now = time.monotonic()
+        fresh = [message for message in messages if now - message['ReceivedAt'] < self.visibility_timeout]
+        if len(fresh) < len(messages):
+            with self.lock:
+                self.expired += len(messages) - len(fresh)
+        return fresh
+
+    def start(self):
+        self.stop_event.clear()
+        self.threads = [threading.Thread(target=self.run_poller, name=f"shipping-poller-{index}", daemon=True)
+                        for index in range(self.pollers)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self, timeout: float = None):
+        # A poller still inside a long poll drops what it receives; those messages become visible
+        # again after the visibility timeout, so shutdown does not have to wait out the poll.
+        self.stop_event.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "receives": self.receives,
+                "empty_receives": self.empty_receives,
+                "messages": self.messages,
+                "messages_per_call": self.messages / self.receives if self.receives else 0.0,
+                "empty_receive_ratio": self.empty_receives / self.receives if self.receives else 0.0,
+                "backlog": self.backlog,
+                "buffered": self.buffer.qsize(),
+                "buffer_limit": self.limit,
+                "expired": self.expired,
+            }
@@ -0,0 +1,202 @@
+import json
+import logging
+import socket
+import socketserver
+import threading
+import time
+from typing import NamedTuple
+from uuid import uuid4
+
+from .config import EVENT_BROKER_HOST, EVENT_BROKER_PORT
+
+logger = logging.getLogger(__name__)
+
+ALL_SHIPPINGS = None
+
+
+class StatusEvent(NamedTuple):
+    shipping_id: str
+    status: str
+    timestamp: float
+
+
+class Subscription:
+    def __init__(self, bus, shipping_ids, callback):
+        self.bus = bus
+        self.shipping_ids = shipping_ids
+        self.callback = callback
+
+    def cancel(self):
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cancel()
+
+
+class AsyncSubscription:
+    def __init__(self, bus, shipping_ids, loop=None):
+        # Only the async API needs asyncio; it is the largest part of importing the service.
+        import asyncio  # pylint: disable=import-outside-toplevel
+
+        # Streams are opened from a coroutine; other threads must pass the loop that consumes them.
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        # Events are published from worker threads, so they are handed over to the loop's thread.
+        self.subscription = bus.subscribe(shipping_ids,
+                                          lambda event: self.loop.call_soon_threadsafe(self.queue.put_nowait, event))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+    def cancel(self):
+        self.subscription.cancel()
+
+
+class StatusEventBus:
+    def __init__(self):
+        # shipping_id -> subscriptions; ALL_SHIPPINGS holds the subscribers to every shipping.
+        self.subscriptions = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, shipping_ids, callback):
+        keys = [ALL_SHIPPINGS] if shipping_ids is ALL_SHIPPINGS else list(dict.fromkeys(shipping_ids))
+        subscription = Subscription(self, keys, callback)
+        with self.lock:
+            for key in keys:
+                self.subscriptions.setdefault(key, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for key in subscription.shipping_ids:
+                subscribers = self.subscriptions.get(key, [])
+                if subscription in subscribers:
+                    subscribers.remove(subscription)
+                if not subscribers:
+                    self.subscriptions.pop(key, None)
+
+    def stream(self, shipping_ids=ALL_SHIPPINGS, loop=None):
+        return AsyncSubscription(self, shipping_ids, loop)
+
+    def add_listener(self, listener):
+        # Listeners see every locally published event, e.g. to forward it to other processes.
+        self.listeners.append(listener)
+
+    def publish(self, shipping_id, status):
+        event = StatusEvent(shipping_id, status, time.time())
+        self.deliver(event)
+        for listener in self.listeners:
+            listener(event)
+        return event
+
+    def deliver(self, event):
+        with self.lock:
+            subscribers = self.subscriptions.get(event.shipping_id, []) + self.subscriptions.get(ALL_SHIPPINGS, [])
+        for subscription in subscribers:
+            try:
+                subscription.callback(event)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Status subscriber failed for shipping %s", event.shipping_id)
+
+
+class _BrokerHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.server.add_client(self.wfile)
+        try:
+            for line in self.rfile:
+                self.server.broadcast(line)
+        finally:
+            self.server.remove_client(self.wfile)
+
+
+class EventBroker(socketserver.ThreadingTCPServer):
+    # Local stand-in for a message broker: relays newline-delimited JSON events to every connected process.
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=(EVENT_BROKER_HOST, EVENT_BROKER_PORT)):
+        super().__init__(address, _BrokerHandler)
+        self.clients = []
+        self.clients_lock = threading.Lock()
+        self.thread = None
+
+    def add_client(self, stream):
+        with self.clients_lock:
+            self.clients.append(stream)
+
+    def remove_client(self, stream):
+        with self.clients_lock:
+            if stream in self.clients:
+                self.clients.remove(stream)
+
+    def broadcast(self, line):
+        with self.clients_lock:
+            clients = list(self.clients)
+        for stream in clients:
+            try:
+                stream.write(line)
+                stream.flush()
+            except OSError:
+                self.remove_client(stream)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, name="event-broker", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class BrokerBridge:
+    def __init__(self, bus, address=(EVENT_BROKER_HOST, EVENT_BROKER_PORT)):
+        self.bus = bus
+        self.origin = str(uuid4())
+        self.socket = socket.create_connection(address)
+        self.reader = self.socket.makefile("rb")
+        self.send_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.receive, name="event-bridge", daemon=True)
+        bus.add_listener(self.forward)
+        self.thread.start()
+
+    def forward(self, event):
+        line = json.dumps({"origin": self.origin, "event": list(event)}) + "\n"
+        # Runs inside publish(): losing the broker must not fail the status update that triggered it.
+        try:
+            with self.send_lock:
+                self.socket.sendall(line.encode())
+        except OSError:
+            logger.warning("Event broker connection lost, status event for %s not forwarded", event.shipping_id)
+
+    def receive(self):
+        try:
+            for line in self.reader:
+                message = json.loads(line)
+                # The broker echoes our own events back; those were already delivered locally.
+                if message["origin"] != self.origin:
+                    self.bus.deliver(StatusEvent(*message["event"]))
+        except (OSError, ValueError):
+            logger.exception("Event broker connection lost")
+
+    def close(self):
+        self.bus.listeners.remove(self.forward)
+        self.socket.shutdown(socket.SHUT_RDWR)
+        self.socket.close()
+        self.thread.join()
+
+
+def connect_broker(bus, address=(EVENT_BROKER_HOST, EVENT_BROKER_PORT)):
+    # Without a broker every process only sees its own transitions; that is not worth failing startup for.
+    try:
+        return BrokerBridge(bus, address)
+    except OSError:
+        logger.warning("Event broker at %s:%s is not reachable, status events stay local", *address)
+        return None
@@ -0,0 +1,54 @@
+import csv
+import json
+from decimal import Decimal
+
+from . import codec
+
+EXPORT_FIELDS = ("shipping_id", "order_id", "shipping_type", "shipping_status", "product_ids", "created_date",
+                 "due_date")
+
+
+def plain(value):
+    # DynamoDB numbers come back as Decimal and sets as set, neither of which json or csv handle well.
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(plain(element) for element in value)
+    if isinstance(value, list):
+        return [plain(element) for element in value]
+    if isinstance(value, dict):
+        return {name: plain(element) for name, element in value.items()}
+    return value
+
+
+def write_jsonl(items, stream):
+    count = 0
+    for item in items:
+        stream.write(json.dumps(plain(item), ensure_ascii=False))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(items, stream, fields=EXPORT_FIELDS):
+    writer = csv.DictWriter(stream, fieldnames=list(fields), extrasaction="ignore")
+    writer.writeheader()
+    count = 0
+    for item in items:
+        row = plain(item)
+        # Lists are JSON-encoded: product names may contain commas, so a joined cell could not be split back.
+        writer.writerow({name: json.dumps(value, ensure_ascii=False) if isinstance(value, list) else value
+                         for name, value in row.items()})
+        count += 1
+    return count
+
+
+WRITERS = {"jsonl": write_jsonl, "csv": write_csv}
+
+
+def export_shipments(repository, path, format="jsonl", **scan_options):  # pylint: disable=redefined-builtin
+    if format not in WRITERS:
+        raise ValueError(f"Unsupported export format: {format}")
+    with open(path, "w", encoding="utf-8", newline="") as stream:
+        records = (codec.as_dict(codec.decode(item)) for item in repository.iter_shipments(**scan_options))
+        return WRITERS[format](records, stream)
@@ -0,0 +1,404 @@
+import copy
+import itertools
+import re
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from uuid import uuid4
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from .config import SHIPPING_TABLE_NAME
+from .schema import TABLE_INDEXES, TABLE_KEYS
+
+OK_RESPONSE = {"ResponseMetadata": {"HTTPStatusCode": 200}}
+MISSING = object()
+FUNCTION_CLAUSE = re.compile(r"^(attribute_exists|attribute_not_exists)\((\w+)\)$")
+COMPARISON_CLAUSE = re.compile(r"^(\w+)\s*(=|<>|<=|>=|<|>)\s*(:\w+)$")
+ASSIGNMENT = re.compile(r"^(\w+)\s*=\s*(?:(\w+)\s*([+-])\s*)?(:\w+)$")
+
+COMPARISONS = {
+    "=": lambda left, right: left == right,
+    "<>": lambda left, right: left != right,
+    "<": lambda left, right: left < right,
+    "<=": lambda left, right: left <= right,
+    ">": lambda left, right: left > right,
+    ">=": lambda left, right: left >= right,
+}
+
+
+def evaluate(condition, item):
+    expression = condition.get_expression()
+    operator, values = expression["operator"], expression["values"]
+    if operator == "AND":
+        return all(evaluate(value, item) for value in values)
+    if operator == "OR":
+        return any(evaluate(value, item) for value in values)
+    if operator == "NOT":
+        return not evaluate(values[0], item)
+    attribute = item.get(values[0].name, MISSING)
+    if operator == "attribute_exists":
+        return attribute is not MISSING
+    if operator == "attribute_not_exists":
+        return attribute is MISSING
+    if attribute is MISSING:
+        return False
+    if operator == "IN":
+        return attribute in values[1]
+    if operator == "BETWEEN":
+        return values[1] <= attribute <= values[2]
+    if operator == "begins_with":
+        return attribute.startswith(values[1])
+    if operator == "contains":
+        return values[1] in attribute
+    return COMPARISONS[operator](attribute, values[1])
+
+
+def project(item, projection):
+    if not projection:
+        return item
+    return {name: item[name] for name in (part.strip() for part in projection.split(",")) if name in item}
+
+
+def evaluate_string(expression, item, values):
+    for clause in (part.strip() for part in expression.split(" AND ")):
+        function = FUNCTION_CLAUSE.match(clause)
+        if function:
+            exists = function.group(2) in item
+            if exists != (function.group(1) == "attribute_exists"):
+                return False
+            continue
+        attribute, operator, placeholder = COMPARISON_CLAUSE.match(clause).groups()
+        if attribute not in item or not COMPARISONS[operator](item[attribute], values[placeholder]):
+            return False
+    return True
+
+
+def check_condition(condition, item, values):
+    if condition is None:
+        return True
+    if isinstance(condition, str):
+        return evaluate_string(condition, item or {}, values or {})
+    return evaluate(condition, item or {})
+
+
+def apply_update(item, expression, values):
+    for assignment in expression.strip()[len("SET "):].split(","):
+        attribute, operand, operator, placeholder = ASSIGNMENT.match(assignment.strip()).groups()
+        value = copy.deepcopy(values[placeholder])
+        if operand:
+            value = item[operand] + value if operator == "+" else item[operand] - value
+        item[attribute] = value
+
+
+def conditional_check_failed(operation):
+    return ClientError({"Error": {"Code": "ConditionalCheckFailedException",
+                                  "Message": "The conditional request failed"}}, operation)
+
+
+def simulate_latency(latency):
+    if latency:
+        time.sleep(latency)
+
+
+class FakeTable:
+    def __init__(self, name, key_name="shipping_id", latency=0.0, indexes=None):
+        self.name = name
+        self.key_name = key_name
+        self.latency = latency
+        self.indexes = indexes or {}
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            return copy.deepcopy(self.items.get(key[self.key_name]))
+
+    def get_item(self, Key, **kwargs):
+        simulate_latency(self.latency)
+        item = self.get(Key)
+        response = dict(OK_RESPONSE)
+        if item is not None:
+            response["Item"] = item
+        return response
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None, **kwargs):
+        simulate_latency(self.latency)
+        with self.lock:
+            if not check_condition(ConditionExpression, self.items.get(Item[self.key_name]),
+                                   ExpressionAttributeValues):
+                raise conditional_check_failed("PutItem")
+            self.items[Item[self.key_name]] = copy.deepcopy(Item)
+        return dict(OK_RESPONSE)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None,
+                    **kwargs):
+        simulate_latency(self.latency)
+        with self.lock:
+            if not check_condition(ConditionExpression, self.items.get(Key[self.key_name]),
+                                   ExpressionAttributeValues):
+                raise conditional_check_failed("UpdateItem")
+            item = self.items.setdefault(Key[self.key_name], dict(Key))
+            apply_update(item, UpdateExpression, ExpressionAttributeValues)
+        return dict(OK_RESPONSE)
+
+    def scan(self, FilterExpression=None, ProjectionExpression=None, ExclusiveStartKey=None, Limit=None,
+             Segment=None, TotalSegments=None, **kwargs):
+        simulate_latency(self.latency)
+        with self.lock:
+            keys = sorted(self.items)
+            if TotalSegments:
+                keys = [key for key in keys if zlib.crc32(str(key).encode()) % TotalSegments == Segment]
+            if ExclusiveStartKey is not None:
+                keys = [key for key in keys if key > ExclusiveStartKey[self.key_name]]
+            page = keys[:Limit] if Limit else keys
+            items = [copy.deepcopy(self.items[key]) for key in page]
+        response = dict(OK_RESPONSE, ScannedCount=len(items))
+        if FilterExpression is not None:
+            items = [item for item in items if evaluate(FilterExpression, item)]
+        response["Items"] = [project(item, ProjectionExpression) for item in items]
+        response["Count"] = len(items)
+        if Limit and len(keys) > Limit:
+            response["LastEvaluatedKey"] = {self.key_name: page[-1]}
+        return response
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ProjectionExpression=None,
+              ExclusiveStartKey=None, Limit=None, ScanIndexForward=True, **kwargs):
+        simulate_latency(self.latency)
+        hash_key, range_key = self.indexes[IndexName] if IndexName else (self.key_name, None)
+
+        def position(item):
+            return (item.get(range_key, "") if range_key else "", item[self.key_name])
+
+        with self.lock:
+            # Items without the index keys are not in a sparse index.
+            matched = sorted((copy.deepcopy(item) for item in self.items.values()
+                              if hash_key in item and (range_key is None or range_key in item)
+                              and evaluate(KeyConditionExpression, item)), key=position, reverse=not ScanIndexForward)
+        if ExclusiveStartKey is not None:
+            start = position(ExclusiveStartKey)
+            matched = [item for item in matched if (position(item) > start) == ScanIndexForward
+                       and position(item) != start]
+        page = matched[:Limit] if Limit else matched
+        response = dict(OK_RESPONSE, ScannedCount=len(page))
+        items = [item for item in page if FilterExpression is None or evaluate(FilterExpression, item)]
+        response["Items"] = [project(item, ProjectionExpression) for item in items]
+        response["Count"] = len(items)
+        if Limit and len(matched) > Limit:
+            last = page[-1]
+            response["LastEvaluatedKey"] = {name: last[name] for name in (self.key_name, range_key) if name}
+        return response
+
+
+class FakeDynamoClient:
+    def __init__(self, resource):
+        self.resource = resource
+        self.deserializer = TypeDeserializer()
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def deserialize(self, values):
+        return {name: self.deserializer.deserialize(value) for name, value in (values or {}).items()}
+
+    def transact_write_items(self, TransactItems, ClientRequestToken=None):
+        simulate_latency(self.resource.latency)
+        operations = []
+        for transact_item in TransactItems:
+            (kind, request), = transact_item.items()
+            table = self.resource.Table(request["TableName"])
+            item = self.deserialize(request.get("Item"))
+            key = item[table.key_name] if kind == "Put" else self.deserialize(request["Key"])[table.key_name]
+            operations.append((kind, request, table, key, item))
+        tables = sorted({id(table): table for _, _, table, _, _ in operations}.values(), key=lambda t: t.name)
+        with self.lock:
+            if ClientRequestToken is not None and ClientRequestToken in self.tokens:
+                if self.tokens[ClientRequestToken] != TransactItems:
+                    raise ClientError({"Error": {"Code": "IdempotentParameterMismatchException",
+                                                 "Message": "Token reused with different parameters"}},
+                                      "TransactWriteItems")
+                return dict(OK_RESPONSE)
+            for table in tables:
+                table.lock.acquire()
+            try:
+                reasons = [{"Code": "ConditionalCheckFailed"}
+                           if not check_condition(request.get("ConditionExpression"), table.items.get(key),
+                                                  self.deserialize(request.get("ExpressionAttributeValues")))
+                           else {"Code": "None"}
+                           for _, request, table, key, _ in operations]
+                if any(reason["Code"] != "None" for reason in reasons):
+                    raise ClientError({"Error": {"Code": "TransactionCanceledException",
+                                                 "Message": "Transaction cancelled"},
+                                       "CancellationReasons": reasons}, "TransactWriteItems")
+                for kind, request, table, key, item in operations:
+                    if kind == "Put":
+                        table.items[key] = item
+                    elif kind == "Update":
+                        apply_update(table.items.setdefault(key, {table.key_name: key}),
+                                     request["UpdateExpression"],
+                                     self.deserialize(request.get("ExpressionAttributeValues")))
+                    elif kind == "Delete":
+                        table.items.pop(key, None)
+            finally:
+                for table in reversed(tables):
+                    table.lock.release()
+            if ClientRequestToken is not None:
+                self.tokens[ClientRequestToken] = TransactItems
+        return dict(OK_RESPONSE)
+
+
+class FakeDynamoResource:
+    def __init__(self, latency=0.0, table_keys=None):
+        self.latency = latency
+        self.table_keys = dict(TABLE_KEYS, **(table_keys or {}))
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.meta = SimpleNamespace(client=FakeDynamoClient(self))
+
+    def Table(self, name):  # pylint: disable=invalid-name
+        with self.lock:
+            if name not in self.tables:
+                self.tables[name] = FakeTable(name, self.table_keys.get(name, "shipping_id"), self.latency,
+                                              TABLE_INDEXES.get(name))
+            return self.tables[name]
+
+    def batch_write_item(self, RequestItems):
+        simulate_latency(self.latency)
+        for table_name, requests in RequestItems.items():
+            table = self.Table(table_name)
+            for request in requests:
+                if "PutRequest" in request:
+                    with table.lock:
+                        table.items[request["PutRequest"]["Item"][table.key_name]] = copy.deepcopy(
+                            request["PutRequest"]["Item"])
+                else:
+                    with table.lock:
+                        table.items.pop(request["DeleteRequest"]["Key"][table.key_name], None)
+        return dict(OK_RESPONSE, UnprocessedItems={})
+
+    def batch_get_item(self, RequestItems):
+        simulate_latency(self.latency)
+        responses = {}
+        for table_name, request in RequestItems.items():
+            found = (self.Table(table_name).get(key) for key in request["Keys"])
+            responses[table_name] = [item for item in found if item is not None]
+        return dict(OK_RESPONSE, Responses=responses, UnprocessedKeys={})
+
+
+class FakeQueue:
+    def __init__(self, url):
+        self.url = url
+        self.messages = []
+        self.condition = threading.Condition()
+
+
+class FakeSqsClient:
+    DEFAULT_VISIBILITY_TIMEOUT = 30
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.queues = {}
+        self.lock = threading.Lock()
+        self.message_ids = itertools.count()
+
+    def create_queue(self, QueueName, **kwargs):
+        with self.lock:
+            if QueueName not in self.queues:
+                self.queues[QueueName] = FakeQueue(f"fake://sqs/{QueueName}")
+            return dict(OK_RESPONSE, QueueUrl=self.queues[QueueName].url)
+
+    def get_queue_url(self, QueueName):
+        return dict(OK_RESPONSE, QueueUrl=self.queues[QueueName].url)
+
+    def _queue(self, url):
+        return self.queues[url.rsplit("/", 1)[-1]]
+
+    def _enqueue(self, queue, body):
+        message_id = str(next(self.message_ids))
+        with queue.condition:
+            queue.messages.append({"MessageId": message_id, "Body": body, "ReceiptHandle": None,
+                                   "VisibleAt": 0.0, "ReceiveCount": 0})
+            queue.condition.notify_all()
+        return message_id
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        simulate_latency(self.latency)
+        return dict(OK_RESPONSE, MessageId=self._enqueue(self._queue(QueueUrl), MessageBody))
+
+    def send_message_batch(self, QueueUrl, Entries):
+        simulate_latency(self.latency)
+        queue = self._queue(QueueUrl)
+        successful = [{"Id": entry["Id"], "MessageId": self._enqueue(queue, entry["MessageBody"])}
+                      for entry in Entries]
+        return dict(OK_RESPONSE, Successful=successful, Failed=[])
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=None,
+                        **kwargs):
+        simulate_latency(self.latency)
+        queue = self._queue(QueueUrl)
+        visibility_timeout = self.DEFAULT_VISIBILITY_TIMEOUT if VisibilityTimeout is None else VisibilityTimeout
+        deadline = time.monotonic() + WaitTimeSeconds
+        with queue.condition:
+            while True:
+                now = time.monotonic()
+                received = []
+                for message in queue.messages:
+                    if len(received) == MaxNumberOfMessages:
+                        break
+                    if message["VisibleAt"] <= now:
+                        message["ReceiptHandle"] = str(uuid4())
+                        message["VisibleAt"] = now + visibility_timeout
+                        message["ReceiveCount"] += 1
+                        received.append({"MessageId": message["MessageId"], "Body": message["Body"],
+                                         "ReceiptHandle": message["ReceiptHandle"]})
+                if received or now >= deadline:
+                    break
+                queue.condition.wait(timeout=min(deadline - now, 0.05))
+        response = dict(OK_RESPONSE)
+        if received:
+            response["Messages"] = received
+        return response
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        simulate_latency(self.latency)
+        queue = self._queue(QueueUrl)
+        with queue.condition:
+            queue.messages = [message for message in queue.messages if message["ReceiptHandle"] != ReceiptHandle]
+        return dict(OK_RESPONSE)
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        simulate_latency(self.latency)
+        queue = self._queue(QueueUrl)
+        handles = {entry["ReceiptHandle"]: entry["Id"] for entry in Entries}
+        with queue.condition:
+            queue.messages = [message for message in queue.messages if message["ReceiptHandle"] not in handles]
+        return dict(OK_RESPONSE, Successful=[{"Id": entry_id} for entry_id in handles.values()], Failed=[])
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        simulate_latency(self.latency)
+        queue = self._queue(QueueUrl)
+        now = time.monotonic()
+        with queue.condition:
+            visible = sum(1 for message in queue.messages if message["VisibleAt"] <= now)
+            attributes = {"ApproximateNumberOfMessages": str(visible),
+                          "ApproximateNumberOfMessagesNotVisible": str(len(queue.messages) - visible)}
+        return dict(OK_RESPONSE, Attributes=attributes)
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        simulate_latency(self.latency)
+        queue = self._queue(QueueUrl)
+        now = time.monotonic()
+        timeouts = {entry["ReceiptHandle"]: entry["VisibilityTimeout"] for entry in Entries}
+        with queue.condition:
+            for message in queue.messages:
+                if message["ReceiptHandle"] in timeouts:
+                    message["VisibleAt"] = now + timeouts[message["ReceiptHandle"]]
+            queue.condition.notify_all()
+        return dict(OK_RESPONSE, Successful=[{"Id": entry["Id"]} for entry in Entries], Failed=[])
+
+
+def fake_backend(dynamo_latency=0.0, sqs_latency=0.0):
+    dynamo_resource = FakeDynamoResource(dynamo_latency)
+    dynamo_resource.Table(SHIPPING_TABLE_NAME)
+    return dynamo_resource, FakeSqsClient(sqs_latency)
@@ -0,0 +1,186 @@
+import functools
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from .clients import ClientProxy, has_layer, remove_layer
+
+LAYER = "metrics"
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+DYNAMODB_OPERATIONS = ("get_item", "put_item", "update_item", "delete_item", "query", "scan",
+                       "batch_get_item", "batch_write_item", "transact_write_items")
+SQS_OPERATIONS = ("send_message", "send_message_batch", "receive_message", "delete_message",
+                  "delete_message_batch", "change_message_visibility_batch", "create_queue",
+                  "get_queue_attributes")
+# Service entry points. Repository and publisher methods are thin wrappers over the client calls, and the
+# service's own helpers run inside these, so instrumenting them as well would count the same work twice.
+SERVICE_OPERATIONS = ("create_shipping", "create_shippings_bulk", "place_order_transaction", "process_shipping_batch",
+                      "process_shipping", "check_status", "check_statuses")
+
+
+def bucket_index(value):
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_value(index):
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return (index % SUB_BUCKETS + SUB_BUCKETS) << shift
+
+
+class Histogram:
+    # Log-linear buckets over microseconds, as in HdrHistogram: values are kept with ~3%
+    # relative precision in a fixed number of buckets whatever the range.
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.errors = 0
+        self.total = 0
+        self.max = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds, error=False):
+        value = int(seconds * 1_000_000)
+        index = bucket_index(value)
+        with self.lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+            if error:
+                self.errors += 1
+
+    def percentile(self, fraction):
+        with self.lock:
+            counts = sorted(self.counts.items())
+            target = fraction * self.count
+        seen = 0
+        for index, count in counts:
+            seen += count
+            if seen >= target:
+                return (bucket_value(index) + bucket_value(index + 1)) // 2
+        return 0
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "error_rate": self.errors / self.count if self.count else 0.0,
+            "mean_ms": self.total / self.count / 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) / 1000,
+            "p90_ms": self.percentile(0.90) / 1000,
+            "p99_ms": self.percentile(0.99) / 1000,
+            "max_ms": self.max / 1000,
+        }
+
+
+class Span(NamedTuple):
+    name: str
+    parent: Optional[str]
+    start: float
+    duration: float
+    error: Optional[BaseException]
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {}
+        self.span_listeners = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def add_span_listener(self, listener):
+        self.span_listeners.append(listener)
+
+    def snapshot(self):
+        return {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def wrap(self, name, function):
+        metrics = self
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            stack = None
+            if metrics.span_listeners:
+                stack = metrics.local.__dict__.setdefault("stack", [])
+                stack.append(name)
+            started = time.perf_counter()
+            error = None
+            try:
+                return function(*args, **kwargs)
+            except BaseException as exc:
+                error = exc
+                raise
+            finally:
+                duration = time.perf_counter() - started
+                metrics.histogram(name).record(duration, error is not None)
+                if stack is not None:
+                    stack.pop()
+                    span = Span(name, stack[-1] if stack else None, started, duration, error)
+                    for listener in metrics.span_listeners:
+                        listener(span)
+
+        timed.__wrapped_by_metrics__ = True
+        return timed
+
+
+def instrument(target, prefix, metrics, methods):
+    for name in methods:
+        function = getattr(target, name, None)
+        if callable(function) and not getattr(function, "__wrapped_by_metrics__", False):
+            setattr(target, name, metrics.wrap(prefix + name, function))
+    return target
+
+
+def uninstrument(target):
+    for name, value in list(vars(target).items()):
+        if getattr(value, "__wrapped_by_metrics__", False):
+            delattr(target, name)
+    return target
+
+
+def instrument_client(client, prefix, metrics, methods):
+    # Clients, resources and tables may be shared with other services, so they get a proxy of their own.
+    if has_layer(client, LAYER):
+        return client
+    return ClientProxy(client, LAYER, lambda name, function: metrics.wrap(prefix + name, function), methods)
+
+
+def enable_instrumentation(service, metrics=None):
+    metrics = metrics or Metrics()
+    repository, publisher = service.repository, service.publisher
+    repository.table = instrument_client(repository.table, "dynamodb.", metrics, DYNAMODB_OPERATIONS)
+    repository.dynamo_client = instrument_client(repository.dynamo_client, "dynamodb.", metrics,
+                                                 DYNAMODB_OPERATIONS)
+    repository.dynamo_resource = instrument_client(repository.dynamo_resource, "dynamodb.", metrics,
+                                                   DYNAMODB_OPERATIONS)
+    publisher.client = instrument_client(publisher.client, "sqs.", metrics, SQS_OPERATIONS)
+    instrument(service, "service.", metrics, SERVICE_OPERATIONS)
+    return metrics
+
+
+def disable_instrumentation(service):
+    repository, publisher = service.repository, service.publisher
+    repository.table = remove_layer(repository.table, LAYER)
+    repository.dynamo_client = remove_layer(repository.dynamo_client, LAYER)
+    repository.dynamo_resource = remove_layer(repository.dynamo_resource, LAYER)
+    publisher.client = remove_layer(publisher.client, LAYER)
+    uninstrument(service)
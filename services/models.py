@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional
+
+
+class ShippingRequest(NamedTuple):
+    shipping_type: str
+    product_ids: List[str]
+    order_id: str
+    due_date: datetime
+    shipping_id: Optional[str] = None
+
+
+@dataclass
+class ShippingRecord:
+    # Slots are declared by hand because dataclass(slots=True) needs Python 3.10.
+    __slots__ = ("shipping_id", "shipping_type", "order_id", "shipping_status", "product_ids", "created_at",
+                 "due_at", "version")
+    shipping_id: str
+    shipping_type: str
+    order_id: str
+    shipping_status: str
+    product_ids: List[str]
+    created_at: int
+    due_at: int
+    version: int
+
+    @property
+    def due_date(self):
+        return datetime.fromtimestamp(self.due_at / 1000, timezone.utc)
+
+    @property
+    def created_date(self):
+        return datetime.fromtimestamp(self.created_at / 1000, timezone.utc)
@@ -0,0 +1,59 @@
+import logging
+import random
+import threading
+
+from .config import OUTBOX_RELAY_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    def __init__(self, repository, publisher, batch_size: int = 10, fetch_size: int = 100,
+                 interval: float = OUTBOX_RELAY_INTERVAL, max_backoff: float = 30.0):
+        self.repository = repository
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.fetch_size = fetch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.relayed = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def drain_once(self):
+        events = self.repository.fetch_outbox(self.fetch_size)
+        for start in range(0, len(events), self.batch_size):
+            batch = events[start:start + self.batch_size]
+            # Publish before deleting: a crash in between republishes the batch, never loses it.
+            self.publisher.send_new_shippings([event["shipping_id"] for event in batch])
+            self.repository.delete_outbox([event["event_id"] for event in batch])
+            self.relayed += len(batch)
+        return len(events)
+
+    def backoff(self):
+        delay = min(self.max_backoff, self.interval * 2 ** self.failures)
+        return random.uniform(delay / 2, delay)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                relayed = self.drain_once()
+            except Exception:  # pylint: disable=broad-except
+                self.failures += 1
+                logger.exception("Outbox relay failed %d time(s) in a row", self.failures)
+                self.stop_event.wait(self.backoff())
+                continue
+            self.failures = 0
+            if relayed < self.fetch_size:
+                self.stop_event.wait(self.interval)
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="outbox-relay", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import RecentIds
+from .config import SHIPPING_VISIBILITY_TIMEOUT, SHIPPING_WORKERS
+from .service import ShippingNotFoundError
+
+logger = logging.getLogger(__name__)
+
+
+class ShippingProcessor:
+    def __init__(self, service, workers: int = SHIPPING_WORKERS, batch_size: int = 10, wait_time: int = 1,
+                 visibility_timeout: int = SHIPPING_VISIBILITY_TIMEOUT, consumer=None, seen=None):
+        self.service = service
+        self.publisher = service.publisher
+        self.consumer = consumer
+        # Recently finished shipping ids: redelivered messages for them are deleted without a database call.
+        self.seen = seen if seen is not None else RecentIds()
+        self.workers = workers
+        self.batch_size = batch_size
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+        # Keep one extra batch per worker queued so the pool never waits on a poll.
+        self.capacity = workers * 2
+        # Moving average of the seconds a worker spends on one message.
+        self.average_duration = None
+        self.in_flight = {}
+        self.completed = []
+        self.processed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.missing = 0
+        self.started_at = None
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+
+    def run(self):
+        self.started_at = time.monotonic()
+        if self.consumer is not None:
+            self.consumer.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="shipping") as executor:
+                while not self.stop_event.is_set():
+                    self.poll_once(executor)
+                self.drain()
+        finally:
+            if self.consumer is not None:
+                self.consumer.stop(self.wait_time)
+        self.acknowledge()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def poll_once(self, executor):
+        with self.condition:
+            if len(self.in_flight) >= self.capacity and not self.stop_event.is_set():
+                self.condition.wait(timeout=self.wait_time)
+            free = self.capacity - len(self.in_flight)
+        if free > 0 and not self.stop_event.is_set():
+            messages = self.skip_duplicates(self.receive(min(self.batch_size, free)))
+            now = time.monotonic()
+            with self.condition:
+                for message in messages:
+                    # Buffered messages started their visibility timeout when the consumer received them.
+                    received_at = message.pop('ReceivedAt', now)
+                    self.in_flight[message['ReceiptHandle']] = received_at + self.visibility_timeout
+            shippings = self.fetch_shippings(messages)
+            for message in messages:
+                executor.submit(self.process_message, message, shippings.get(message['Body']))
+        if self.consumer is not None and self.average_duration:
+            self.consumer.limit_buffer(self.buffer_limit())
+        self.acknowledge()
+        self.heartbeat()
+
+    def buffer_limit(self):
+        # A buffered message waits for everything queued and in flight ahead of it.
+        per_window = int(self.workers * self.visibility_timeout / self.average_duration)
+        return per_window - self.capacity
+
+    def record_duration(self, started_at):
+        duration = time.monotonic() - started_at
+        with self.condition:
+            average = self.average_duration
+            self.average_duration = duration if average is None else average + (duration - average) * 0.2
+
+    def receive(self, batch_size):
+        if self.consumer is not None:
+            return self.consumer.get(batch_size, self.wait_time)
+        return self.publisher.receive_shipping_messages(batch_size, self.wait_time, self.visibility_timeout)
+
+    def skip_duplicates(self, messages):
+        fresh = []
+        duplicates = []
+        for message in messages:
+            (duplicates if message['Body'] in self.seen else fresh).append(message)
+        if duplicates:
+            with self.condition:
+                self.duplicates += len(duplicates)
+                self.completed.extend(message['ReceiptHandle'] for message in duplicates)
+        return fresh
+
+    def fetch_shippings(self, messages):
+        if not messages:
+            return {}
+        try:
+            return self.service.repository.get_shippings([message['Body'] for message in messages])
+        except Exception:  # pylint: disable=broad-except
+            # Fall back to one read per message in the workers.
+            logger.exception("Failed to fetch shipping batch")
+            return {}
+
+    def process_message(self, message, shipping=None):
+        receipt_handle = message['ReceiptHandle']
+        started_at = time.monotonic()
+        try:
+            self.service.process_shipping(message['Body'], shipping)
+        except ShippingNotFoundError:
+            # Terminal: a redelivery would not find it either, so the message is deleted.
+            logger.warning("Shipping %s does not exist, dropping its message", message['Body'])
+            with self.condition:
+                self.missing += 1
+                self.in_flight.pop(receipt_handle, None)
+                self.completed.append(receipt_handle)
+                self.condition.notify_all()
+            return
+        except Exception:  # pylint: disable=broad-except
+            # Leave the message on the queue, it is redelivered after the visibility timeout.
+            logger.exception("Failed to process shipping %s", message['Body'])
+            self.record_duration(started_at)
+            with self.condition:
+                self.failed += 1
+                self.in_flight.pop(receipt_handle, None)
+                self.condition.notify_all()
+            return
+        self.record_duration(started_at)
+        self.seen.add(message['Body'])
+        with self.condition:
+            self.processed += 1
+            self.in_flight.pop(receipt_handle, None)
+            self.completed.append(receipt_handle)
+            self.condition.notify_all()
+
+    def acknowledge(self):
+        with self.condition:
+            completed, self.completed = self.completed, []
+        if completed:
+            self.publisher.delete_shippings(completed)
+
+    def heartbeat(self):
+        now = time.monotonic()
+        with self.condition:
+            expiring = [receipt_handle for receipt_handle, visible_until in self.in_flight.items()
+                        if visible_until - now < self.visibility_timeout / 3]
+            for receipt_handle in expiring:
+                self.in_flight[receipt_handle] = now + self.visibility_timeout
+        if expiring:
+            self.publisher.extend_visibility(expiring, self.visibility_timeout)
+
+    def drain(self):
+        while True:
+            with self.condition:
+                if not self.in_flight:
+                    return
+                self.condition.wait(timeout=self.wait_time)
+            self.acknowledge()
+            self.heartbeat()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        stats = {
+            "processed": self.processed,
+            "failed": self.failed,
+            "duplicates": self.duplicates,
+            "missing": self.missing,
+            "in_flight": len(self.in_flight),
+            "throughput": self.processed / elapsed if elapsed else 0.0,
+        }
+        if self.consumer is not None:
+            stats["consumer"] = self.consumer.stats()
+        return stats
@@ -1,19 +1,42 @@
-import boto3
+import time
 
-from .config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE
+from .clients import get_client, get_queue_url
+from .config import SHIPPING_POLL_WAIT_SECONDS, SHIPPING_QUEUE
+
+SQS_BATCH_SIZE = 10
+SEND_MAX_ATTEMPTS = 5
+SEND_BACKOFF_SECONDS = 0.05
 
 
 class ShippingPublisher:
-    def __init__(self):
-        self.client = boto3.client(
-            "sqs",
-            endpoint_url=AWS_ENDPOINT_URL,
-            region_name=AWS_REGION,
-            aws_access_key_id="test",
-            aws_secret_access_key="test",
-        )
-        response = self.client.create_queue(QueueName=SHIPPING_QUEUE)
-        self.queue_url = response["QueueUrl"]
+    def __init__(self, client=None):
+        # The client and the queue URL are resolved on first use, so constructing a publisher is free.
+        self._client = client
+        self._shared = client is None
+        self._queue_url = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client("sqs")
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+        self._shared = False
+
+    @property
+    def queue_url(self):
+        if self._queue_url is None:
+            if self._shared:
+                self._queue_url = get_queue_url(SHIPPING_QUEUE)
+            else:
+                self._queue_url = self._client.create_queue(QueueName=SHIPPING_QUEUE)["QueueUrl"]
+        return self._queue_url
+
+    def warm_up(self):
+        return self.queue_url
 
     def send_new_shipping(self, shipping_id: str):
         response = self.client.send_message(
@@ -23,15 +46,76 @@ class ShippingPublisher:
 
         return response['MessageId']
 
+    def send_new_shippings(self, shipping_ids: list):
+        message_ids = {}
+        for start in range(0, len(shipping_ids), SQS_BATCH_SIZE):
+            entries = {str(index): shipping_id
+                       for index, shipping_id in enumerate(shipping_ids[start:start + SQS_BATCH_SIZE])}
+            message_ids.update(self._send_batch(entries))
+
+        return [message_ids[shipping_id] for shipping_id in shipping_ids]
+
+    def _send_batch(self, entries: dict):
+        message_ids = {}
+        for attempt in range(SEND_MAX_ATTEMPTS):
+            response = self.client.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": entry_id, "MessageBody": body} for entry_id, body in entries.items()]
+            )
+            for sent in response.get("Successful", []):
+                message_ids[entries.pop(sent["Id"])] = sent["MessageId"]
+            if not entries:
+                return message_ids
+            time.sleep(SEND_BACKOFF_SECONDS * 2 ** attempt)
+        raise RuntimeError(f"SendMessageBatch failed for {len(entries)} messages")
+
     def poll_shipping(self, batch_size: int = 10):
+        return [msg['Body'] for msg in self.receive_shipping_messages(batch_size)]
+
+    def receive_shipping_messages(self, batch_size: int = 10, wait_time: int = SHIPPING_POLL_WAIT_SECONDS,
+                                  visibility_timeout: int = None):
+        params = {}
+        if visibility_timeout is not None:
+            params['VisibilityTimeout'] = visibility_timeout
+        # Only the body and receipt handle are used, so no message or system attributes are requested.
         messages = self.client.receive_message(
             QueueUrl=self.queue_url,
-            MessageAttributeNames=['All'],
             MaxNumberOfMessages=batch_size,
-            WaitTimeSeconds=10
+            WaitTimeSeconds=wait_time,
+            **params
+        )
+
+        return messages.get('Messages', [])
+
+    def queue_backlog(self):
+        response = self.client.get_queue_attributes(
+            QueueUrl=self.queue_url,
+            AttributeNames=['ApproximateNumberOfMessages']
         )
 
-        if 'Messages' not in messages:
-            return []
+        return int(response['Attributes']['ApproximateNumberOfMessages'])
+
+    def delete_shippings(self, receipt_handles: list):
+        failed = []
+        for start in range(0, len(receipt_handles), SQS_BATCH_SIZE):
+            chunk = receipt_handles[start:start + SQS_BATCH_SIZE]
+            response = self.client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": str(index), "ReceiptHandle": handle} for index, handle in enumerate(chunk)]
+            )
+            failed.extend(chunk[int(entry["Id"])] for entry in response.get("Failed", []))
+
+        return failed
+
+    def extend_visibility(self, receipt_handles: list, visibility_timeout: int):
+        failed = []
+        for start in range(0, len(receipt_handles), SQS_BATCH_SIZE):
+            chunk = receipt_handles[start:start + SQS_BATCH_SIZE]
+            response = self.client.change_message_visibility_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{"Id": str(index), "ReceiptHandle": handle, "VisibilityTimeout": visibility_timeout}
+                         for index, handle in enumerate(chunk)]
+            )
+            failed.extend(chunk[int(entry["Id"])] for entry in response.get("Failed", []))
 
-        return [msg['Body'] for msg in messages['Messages']]
+        return failed
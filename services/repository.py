@@ -1,45 +1,413 @@
-from .config import SHIPPING_TABLE_NAME
+import queue
+import threading
+import time
+
+from . import codec
+from .config import ORDER_TABLE_NAME, OUTBOX_TABLE_NAME, PRODUCT_TABLE_NAME, SHIPPING_TABLE_NAME
 from .db import get_dynamodb_resource
+from .schema import ORDER_INDEX, STATUS_DUE_INDEX
+
+from uuid import NAMESPACE_URL, uuid4, uuid5
+from datetime import datetime
+
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
+BATCH_MAX_ATTEMPTS = 5
+BATCH_BACKOFF_SECONDS = 0.05
+TRANSACTION_MAX_ITEMS = 100
+TRANSACTION_RETRYABLE_CODES = ("TransactionConflict", "ThrottlingError", "ProvisionedThroughputExceeded")
+ORDER_NAMESPACE = uuid5(NAMESPACE_URL, "shipping-orders")
+
+
+# boto3 and botocore are imported inside the methods that need them, so importing the repository
+# (and with it the whole package) stays cheap for short-lived processes.
+_serializer = None
+
+
+def serialize_item(item):
+    global _serializer  # pylint: disable=global-statement
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeSerializer  # pylint: disable=import-outside-toplevel
 
-from uuid import uuid4
-from datetime import datetime, timezone
+        _serializer = TypeSerializer()
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+
+class OrderConflictError(ValueError):
+    pass
+
+
+def same_products(placed, product_counts):
+    return {name: int(count) for name, count in placed.items()} == \
+        {name: int(count) for name, count in product_counts.items()}
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
 
 class ShippingRepository:
 
 
-    def __init__(self):
-        dynamo_resource = get_dynamodb_resource()
-        self.table = dynamo_resource.Table(SHIPPING_TABLE_NAME)
+    def __init__(self, dynamo_resource=None):
+        # The resource and the table are resolved on first use.
+        self._dynamo_resource = dynamo_resource
+        self._table = None
+        self._dynamo_client = None
+
+    @property
+    def dynamo_resource(self):
+        if self._dynamo_resource is None:
+            self._dynamo_resource = get_dynamodb_resource()
+        return self._dynamo_resource
+
+    @dynamo_resource.setter
+    def dynamo_resource(self, dynamo_resource):
+        self._dynamo_resource = dynamo_resource
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = self.dynamo_resource.Table(SHIPPING_TABLE_NAME)
+        return self._table
+
+    @table.setter
+    def table(self, table):
+        self._table = table
+
+    # The low-level client for TransactWriteItems, which the resource does not offer. Not cached, so it
+    # follows the resource unless set explicitly.
+    @property
+    def dynamo_client(self):
+        if self._dynamo_client is None:
+            return self.dynamo_resource.meta.client
+        return self._dynamo_client
+
+    @dynamo_client.setter
+    def dynamo_client(self, dynamo_client):
+        self._dynamo_client = dynamo_client
+
+    def warm_up(self):
+        # Resolves the table and, against real DynamoDB, opens a connection with a DescribeTable call.
+        load = getattr(self.table, "load", None)
+        if load is not None:
+            load()
+        return self.table
 
 
     def get_shipping(self, shipping_id):
         response = self.table.get_item(Key={"shipping_id": shipping_id})
         return response.get("Item")
 
+    def get_record(self, shipping_id):
+        item = self.get_shipping(shipping_id)
+        return codec.decode(item) if item is not None else None
+
+    def get_shippings(self, shipping_ids):
+        shippings = {}
+        unique_ids = list(dict.fromkeys(shipping_ids))
+        for chunk in chunked(unique_ids, BATCH_GET_SIZE):
+            for item in self._batch_get([{"shipping_id": shipping_id} for shipping_id in chunk]):
+                shippings[item["shipping_id"]] = item
+        return shippings
+
+    def _batch_get(self, keys):
+        items = []
+        request_items = {SHIPPING_TABLE_NAME: {"Keys": keys}}
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            response = self.dynamo_resource.batch_get_item(RequestItems=request_items)
+            items.extend(response.get("Responses", {}).get(SHIPPING_TABLE_NAME, []))
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                return items
+            time.sleep(BATCH_BACKOFF_SECONDS * 2 ** attempt)
+        unprocessed = len(request_items[SHIPPING_TABLE_NAME]["Keys"])
+        raise RuntimeError(f"BatchGetItem left {unprocessed} unprocessed keys")
+
+    def scan_shippings_by_status(self, statuses, projection="shipping_id, shipping_status, due_at, due_date"):
+        from boto3.dynamodb.conditions import Attr  # pylint: disable=import-outside-toplevel
+
+        return self.iter_shipments(Attr("shipping_status").is_in(list(statuses)), projection)
+
+    def iter_shipments(self, filter=None, projection: str = None, segments: int = 1,  # pylint: disable=redefined-builtin
+                       page_size: int = None):
+        params = {}
+        if filter is not None:
+            params["FilterExpression"] = filter
+        if projection:
+            params["ProjectionExpression"] = projection
+        if page_size:
+            params["Limit"] = page_size
+        if segments <= 1:
+            return self._scan_pages(params)
+        return self._parallel_scan(params, segments)
+
+    def _scan_pages(self, params):
+        params = dict(params)
+        while True:
+            response = self.table.scan(**params)
+            yield from response.get("Items", [])
+            if "LastEvaluatedKey" not in response:
+                return
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def _parallel_scan(self, params, segments):
+        # Each segment is scanned on its own thread; the bounded queue holds at most two pages per
+        # segment, so a slow consumer stalls the scanners instead of growing memory.
+        pages = queue.Queue(maxsize=segments * 2)
+        stop_event = threading.Event()
+
+        def put(entry):
+            while not stop_event.is_set():
+                try:
+                    pages.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def scan_segment(segment):
+            segment_params = dict(params, Segment=segment, TotalSegments=segments)
+            try:
+                while not stop_event.is_set():
+                    response = self.table.scan(**segment_params)
+                    if not put(response.get("Items", [])) or "LastEvaluatedKey" not in response:
+                        break
+                    segment_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+            except Exception as error:  # pylint: disable=broad-except
+                put(error)
+            put(None)
+
+        threads = [threading.Thread(target=scan_segment, args=(segment,), name=f"shipping-scan-{segment}",
+                                    daemon=True) for segment in range(segments)]
+        for thread in threads:
+            thread.start()
+        try:
+            remaining = segments
+            while remaining:
+                page = pages.get()
+                if page is None:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield from page
+        finally:
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    def _query(self, params, page_size=None):
+        if page_size:
+            params["Limit"] = page_size
+        while True:
+            response = self.table.query(**params)
+            yield from response.get("Items", [])
+            if "LastEvaluatedKey" not in response:
+                return
+            params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def iter_shippings_by_order(self, order_id: str, page_size: int = None):
+        from boto3.dynamodb.conditions import Key  # pylint: disable=import-outside-toplevel
+
+        return self._query({"IndexName": ORDER_INDEX, "KeyConditionExpression": Key("order_id").eq(str(order_id))},
+                           page_size)
+
+    def iter_shippings_by_status(self, status: str, due_before: datetime = None, projection: str = None,
+                                 page_size: int = None):
+        from boto3.dynamodb.conditions import Key  # pylint: disable=import-outside-toplevel
+
+        condition = Key("shipping_status").eq(status)
+        if due_before is not None:
+            condition &= Key("due_at").lt(codec.to_millis(due_before))
+        params = {"IndexName": STATUS_DUE_INDEX, "KeyConditionExpression": condition}
+        if projection:
+            params["ProjectionExpression"] = projection
+        return self._query(params, page_size)
+
+    @staticmethod
+    def build_item(shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime,
+                   shipping_id: str = None, created_at: int = None):
+        return codec.encode(shipping_id or str(uuid4()), shipping_type, order_id, status, product_ids, due_date,
+                            created_at)
+
     def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime):
-        shipping_id = str(uuid4())
-        item = {
+        item = self.build_item(shipping_type, product_ids, order_id, status, due_date)
+        self.table.put_item(Item=item)
+        return item["shipping_id"]
+
+    def create_shippings(self, requests: list, status: str):
+        items = [self.build_item(request.shipping_type, request.product_ids, request.order_id, status,
+                                 request.due_date, request.shipping_id)
+                 for request in requests]
+        for chunk in chunked(items, BATCH_WRITE_SIZE):
+            self._batch_write([{"PutRequest": {"Item": item}} for item in chunk])
+        return [item["shipping_id"] for item in items]
+
+    def _batch_write(self, write_requests, table_name=SHIPPING_TABLE_NAME):
+        request_items = {table_name: write_requests}
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            response = self.dynamo_resource.batch_write_item(RequestItems=request_items)
+            request_items = response.get("UnprocessedItems") or {}
+            if not request_items:
+                return
+            time.sleep(BATCH_BACKOFF_SECONDS * 2 ** attempt)
+        unprocessed = len(request_items.get(table_name, []))
+        raise RuntimeError(f"BatchWriteItem left {unprocessed} unprocessed items")
+
+    def migrate_shippings(self, segments: int = 1):
+        from boto3.dynamodb.conditions import Attr  # pylint: disable=import-outside-toplevel
+        from botocore.exceptions import ClientError  # pylint: disable=import-outside-toplevel
+
+        # Rewrites version 1 items in the current format so they become visible to the status/due index.
+        # Each put is conditional on the item still being the scanned version 1 item, so a status update
+        # that lands between the scan and the put is kept; such an item is migrated by the next run.
+        migrated = 0
+        for item in self.iter_shipments(Attr("record_version").not_exists(), segments=segments):
+            try:
+                self.table.put_item(
+                    Item=codec.upgrade(item),
+                    ConditionExpression="attribute_not_exists(record_version) AND shipping_status = :scanned",
+                    ExpressionAttributeValues={":scanned": item.get("shipping_status")},
+                )
+            except ClientError as error:
+                if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                continue
+            migrated += 1
+        return migrated
+
+    def set_product_stock(self, stock: dict):
+        items = [{"product_id": product_id, "available_amount": amount} for product_id, amount in stock.items()]
+        for chunk in chunked(items, BATCH_WRITE_SIZE):
+            self._batch_write([{"PutRequest": {"Item": item}} for item in chunk], PRODUCT_TABLE_NAME)
+
+    @staticmethod
+    def order_shipping_id(order_id: str):
+        return str(uuid5(ORDER_NAMESPACE, str(order_id)))
+
+    @staticmethod
+    def outbox_put(shipping_item):
+        event = {
+            "event_id": shipping_item["shipping_id"],
+            "shipping_id": shipping_item["shipping_id"],
+            "created_at": shipping_item["created_at"],
+        }
+        return {"Put": {"TableName": OUTBOX_TABLE_NAME, "Item": serialize_item(event)}}
+
+    def create_shipping_with_outbox(self, shipping_type: str, product_ids: list, order_id: str, status: str,
+                                    due_date: datetime):
+        item = self.build_item(shipping_type, product_ids, order_id, status, due_date)
+        self._transact_write([
+            {"Put": {"TableName": SHIPPING_TABLE_NAME, "Item": serialize_item(item)}},
+            self.outbox_put(item),
+        ], item["shipping_id"], [])
+        return item["shipping_id"]
+
+    def fetch_outbox(self, limit: int = 100):
+        response = self.dynamo_resource.Table(OUTBOX_TABLE_NAME).scan(Limit=limit, ConsistentRead=True)
+        return response.get("Items", [])
+
+    def delete_outbox(self, event_ids: list):
+        for chunk in chunked(list(event_ids), BATCH_WRITE_SIZE):
+            self._batch_write([{"DeleteRequest": {"Key": {"event_id": event_id}}} for event_id in chunk],
+                              OUTBOX_TABLE_NAME)
+
+    def create_order_transaction(self, shipping_type: str, product_counts: dict, order_id: str, status: str,
+                                 due_date: datetime, with_outbox: bool = False, created_at: int = None):
+        if len(product_counts) + 3 > TRANSACTION_MAX_ITEMS:
+            raise ValueError(f"An order can contain at most {TRANSACTION_MAX_ITEMS - 3} products")
+        # The shipping id and the idempotency token are derived from the order id and created_at comes
+        # from the caller, so a retried placement sends the same payload and DynamoDB applies it once.
+        shipping_id = self.order_shipping_id(order_id)
+        shipping_item = self.build_item(shipping_type, list(product_counts), order_id, status, due_date, shipping_id,
+                                        created_at)
+        order_item = {
+            "order_id": str(order_id),
             "shipping_id": shipping_id,
-            "shipping_type": shipping_type,
-            "order_id": order_id,
-            "product_ids": ",".join(product_ids),
-            "shipping_status": status,
-            "created_date": datetime.now(timezone.utc).isoformat(),
-            "due_date": due_date.replace(tzinfo=timezone.utc).isoformat()
+            "products": dict(product_counts),
+            "created_at": shipping_item["created_at"],
         }
-        self.table.put_item(Item=item)
+        transact_items = [
+            {"Put": {"TableName": ORDER_TABLE_NAME, "Item": serialize_item(order_item),
+                     "ConditionExpression": "attribute_not_exists(order_id)"}},
+            {"Put": {"TableName": SHIPPING_TABLE_NAME, "Item": serialize_item(shipping_item)}},
+        ]
+        if with_outbox:
+            transact_items.append(self.outbox_put(shipping_item))
+        for product_id, count in product_counts.items():
+            transact_items.append({"Update": {
+                "TableName": PRODUCT_TABLE_NAME,
+                "Key": {"product_id": {"S": product_id}},
+                "UpdateExpression": "SET available_amount = available_amount - :amount",
+                "ConditionExpression": "available_amount >= :amount",
+                "ExpressionAttributeValues": {":amount": {"N": str(count)}},
+            }})
+        if not self._transact_write(transact_items, shipping_id, list(product_counts)):
+            self._check_placed(order_id, product_counts)
         return shipping_id
 
-    def update_shipping_status(self, shipping_id, status):
-        response = self.table.update_item(
-            Key={
-                'shipping_id': shipping_id,
-            },
-            UpdateExpression='SET shipping_status = :sh_status',
-            ExpressionAttributeValues={
-                ':sh_status': status
-            }
-        )
+    def _check_placed(self, order_id, product_counts):
+        # The order id was used before: it is only the same order if the stored products match.
+        placed = self.dynamo_resource.Table(ORDER_TABLE_NAME).get_item(
+            Key={"order_id": str(order_id)}, ConsistentRead=True).get("Item")
+        if placed is None:
+            raise OrderConflictError(f"Order {order_id} was sent with a different payload and is not placed")
+        if not same_products(placed["products"], product_counts):
+            raise OrderConflictError(f"Order {order_id} was already placed with different products")
+
+    # Returns False when the write was not applied because an earlier one with the same token or
+    # the same record (the first item's condition) already went through.
+    def _transact_write(self, transact_items, client_token, product_ids):
+        from botocore.exceptions import ClientError  # pylint: disable=import-outside-toplevel
+
+        client = self.dynamo_client
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            try:
+                client.transact_write_items(TransactItems=transact_items, ClientRequestToken=client_token)
+                return True
+            except ClientError as error:
+                code = error.response["Error"]["Code"]
+                if code == "IdempotentParameterMismatchException":
+                    return False
+                if code != "TransactionCanceledException":
+                    raise
+                reasons = [reason.get("Code", "None") for reason in error.response.get("CancellationReasons", [])]
+            if reasons and reasons[0] == "ConditionalCheckFailed":
+                # The record already exists: an earlier attempt went through.
+                return False
+            for product_id, reason in zip(product_ids, reasons[-len(product_ids):] if product_ids else []):
+                if reason == "ConditionalCheckFailed":
+                    raise ValueError(f"Product {product_id} is out of stock")
+            if not any(reason in TRANSACTION_RETRYABLE_CODES for reason in reasons):
+                raise RuntimeError(f"TransactWriteItems was cancelled: {reasons}")
+            time.sleep(BATCH_BACKOFF_SECONDS * 2 ** attempt)
+        raise RuntimeError("TransactWriteItems kept conflicting")
+
+    def update_shipping_status(self, shipping_id, status, expected_status=None):
+        from boto3.dynamodb.conditions import Attr  # pylint: disable=import-outside-toplevel
+        from botocore.exceptions import ClientError  # pylint: disable=import-outside-toplevel
+
+        params = {}
+        if expected_status is not None:
+            expected = [expected_status] if isinstance(expected_status, str) else list(expected_status)
+            params['ConditionExpression'] = Attr('shipping_status').is_in(expected)
+        try:
+            response = self.table.update_item(
+                Key={
+                    'shipping_id': shipping_id,
+                },
+                UpdateExpression='SET shipping_status = :sh_status',
+                ExpressionAttributeValues={
+                    ':sh_status': status
+                },
+                **params
+            )
+        except ClientError as error:
+            if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            # The shipping already moved on, e.g. a redelivered message for a completed shipping.
+            return None
 
         return response
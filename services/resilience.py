@@ -0,0 +1,349 @@
+import functools
+import logging
+import random
+import threading
+import time
+from collections import deque
+from uuid import uuid4
+
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+
+from .clients import ClientProxy, counterpart, has_layer, remove_layer
+from .config import (AWS_BREAKER_RESET_SECONDS, AWS_BREAKER_THRESHOLD, AWS_RETRY_BASE_SECONDS,
+                     AWS_RETRY_MAX_ATTEMPTS, AWS_RETRY_MAX_SECONDS)
+from .metrics import DYNAMODB_OPERATIONS, SQS_OPERATIONS
+
+logger = logging.getLogger(__name__)
+
+LAYER = "resilience"
+
+THROTTLE_CODES = ("ThrottlingException", "Throttling", "ProvisionedThroughputExceededException",
+                  "RequestLimitExceeded", "RequestThrottled", "TooManyRequestsException")
+TRANSIENT_CODES = ("InternalServerError", "InternalFailure", "ServiceUnavailable", "ServiceUnavailableException")
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def error_kind(error):
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        if code in THROTTLE_CODES:
+            return "throttle"
+        if code in TRANSIENT_CODES:
+            return "transient"
+        return None
+    if isinstance(error, (BotoConnectionError, ReadTimeoutError)):
+        return "transient"
+    return None
+
+
+def backoff_delay(attempt, base=AWS_RETRY_BASE_SECONDS, cap=AWS_RETRY_MAX_SECONDS):
+    # Full jitter: clients that failed together do not retry together.
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class AdaptiveRateLimiter:
+    # Token bucket whose rate halves on every throttle and creeps back up on success (AIMD).
+    def __init__(self, rate: float = 1000.0, min_rate: float = 1.0, max_rate: float = 1000.0,
+                 increase: float = 1.0, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = rate
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, self.rate)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half open"
+
+    def __init__(self, failure_threshold: int = AWS_BREAKER_THRESHOLD,
+                 reset_timeout: float = AWS_BREAKER_RESET_SECONDS, clock=time.monotonic, on_close=None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.on_close = on_close
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                # Let one probe through; its outcome decides whether the circuit closes again.
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            closed = self.state == self.HALF_OPEN
+            self.state = self.CLOSED
+            self.failures = 0
+        if closed and self.on_close is not None:
+            self.on_close()
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class RetryPolicy:
+    def __init__(self, name, max_attempts: int = AWS_RETRY_MAX_ATTEMPTS, limiter=None, breaker=None,
+                 sleep=time.sleep, delay=backoff_delay):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.sleep = sleep
+        self.delay = delay
+        self.calls = 0
+        self.retries = 0
+        self.throttles = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def call(self, operation, function, *args, **kwargs):
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                with self.lock:
+                    self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit is open, {operation} was not sent")
+            self.limiter.acquire()
+            with self.lock:
+                self.calls += 1
+            try:
+                result = function(*args, **kwargs)
+            except Exception as error:
+                kind = error_kind(error)
+                if kind is None:
+                    # Validation and conditional failures mean the backend answered.
+                    self.breaker.record_success()
+                    raise
+                if kind == "throttle":
+                    self.limiter.on_throttle()
+                    with self.lock:
+                        self.throttles += 1
+                if attempt + 1 >= self.max_attempts or self.breaker.state != CircuitBreaker.CLOSED:
+                    # One breaker failure per call once it gives up; a failed half-open probe is not retried.
+                    self.breaker.record_failure()
+                    raise
+                with self.lock:
+                    self.retries += 1
+                logger.warning("%s.%s failed (%s), retrying", self.name, operation, kind)
+                self.sleep(self.delay(attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            self.limiter.on_success()
+            return result
+
+    def wrap(self, operation, function, fallback=None):
+        policy = self
+
+        @functools.wraps(function)
+        def resilient(*args, **kwargs):
+            try:
+                return policy.call(operation, function, *args, **kwargs)
+            except Exception as error:  # pylint: disable=broad-except
+                # Open circuit or retries exhausted on a degraded backend.
+                if fallback is None or not (isinstance(error, CircuitOpenError) or error_kind(error)):
+                    raise
+                return fallback(operation, *args, **kwargs)
+
+        resilient.__wrapped_by_resilience__ = True
+        return resilient
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "throttles": self.throttles,
+                "rejected": self.rejected,
+                "trips": self.breaker.trips,
+                "state": self.breaker.state,
+                "rate": self.limiter.rate,
+            }
+
+
+class LocalBuffer:
+    # Holds SQS sends while the circuit is open and replays them once it closes.
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.calls = deque()
+        self.replaying = threading.local()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.calls)
+
+    def divert(self, operation, **kwargs):
+        if getattr(self.replaying, "active", False):
+            # A replayed call that fails again stays at the head of the buffer instead of being re-queued.
+            raise CircuitOpenError(f"{operation} could not be replayed")
+        with self.lock:
+            if len(self.calls) >= self.max_entries:
+                raise CircuitOpenError(f"Local buffer is full, {operation} was not sent")
+            self.calls.append((operation, kwargs))
+        if operation == "send_message_batch":
+            return {"Successful": [{"Id": entry["Id"], "MessageId": f"buffered-{uuid4()}"}
+                                   for entry in kwargs["Entries"]], "Failed": []}
+        return {"MessageId": f"buffered-{uuid4()}"}
+
+    def replay(self, target):
+        replayed = 0
+        # Bounded by the current size: a call diverted again during replay waits for the next flush.
+        for _ in range(len(self.calls)):
+            with self.lock:
+                if not self.calls:
+                    break
+                operation, kwargs = self.calls.popleft()
+            self.replaying.active = True
+            try:
+                getattr(target, operation)(**kwargs)
+            except Exception:  # pylint: disable=broad-except
+                with self.lock:
+                    self.calls.appendleft((operation, kwargs))
+                logger.exception("Failed to replay buffered %s", operation)
+                break
+            finally:
+                self.replaying.active = False
+            replayed += 1
+        return replayed
+
+
+def protect(target, policy, methods, fallbacks=None):
+    # Wraps a proxy, not the target: clients and resources from services.clients are shared by every service.
+    if has_layer(target, LAYER):
+        return target
+    fallbacks = fallbacks or {}
+    return ClientProxy(target, LAYER, lambda name, function: policy.wrap(name, function, fallbacks.get(name)),
+                       methods)
+
+
+def unprotect(target):
+    return remove_layer(target, LAYER)
+
+
+class ResilienceLayer:
+    BUFFERED_OPERATIONS = ("send_message", "send_message_batch")
+
+    def __init__(self, dynamodb=None, sqs=None, buffer=None):
+        self.dynamodb = dynamodb or RetryPolicy("dynamodb")
+        self.sqs = sqs or RetryPolicy("sqs")
+        self.buffer = buffer if buffer is not None else LocalBuffer()
+        self.sqs_client = None
+        # Replays run on a drain thread, not on the request thread whose success closed the circuit.
+        self.drain_requested = threading.Event()
+        self.drainer = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.sqs.breaker.on_close = self.request_flush
+
+    def apply(self, repository, publisher):
+        resource = counterpart(repository.dynamo_resource, protected=True)
+        if resource is not repository.dynamo_resource:
+            # Swap the shared clients for ones without botocore retries; the table and the transaction
+            # client then resolve from the new resource.
+            repository.dynamo_resource, repository.table, repository.dynamo_client = resource, None, None
+        publisher.client = counterpart(publisher.client, protected=True)
+        repository.table = protect(repository.table, self.dynamodb, DYNAMODB_OPERATIONS)
+        repository.dynamo_client = protect(repository.dynamo_client, self.dynamodb, DYNAMODB_OPERATIONS)
+        repository.dynamo_resource = protect(repository.dynamo_resource, self.dynamodb, DYNAMODB_OPERATIONS)
+        fallbacks = {name: lambda operation, **kwargs: self.buffer.divert(operation, **kwargs)
+                     for name in self.BUFFERED_OPERATIONS}
+        publisher.client = protect(publisher.client, self.sqs, SQS_OPERATIONS, fallbacks)
+        self.sqs_client = publisher.client
+        return self
+
+    def request_flush(self):
+        with self.lock:
+            if self.closed:
+                return
+            if self.drainer is None:
+                self.drainer = threading.Thread(target=self.drain, name="resilience-drain", daemon=True)
+                self.drainer.start()
+        self.drain_requested.set()
+
+    def drain(self):
+        while True:
+            self.drain_requested.wait()
+            self.drain_requested.clear()
+            if self.closed:
+                return
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to drain the local buffer")
+
+    def flush(self):
+        if self.sqs_client is None or not len(self.buffer):
+            return 0
+        return self.buffer.replay(self.sqs_client)
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            drainer = self.drainer
+        self.drain_requested.set()
+        if drainer is not None:
+            drainer.join()
+
+    def stats(self):
+        return {"dynamodb": self.dynamodb.stats(), "sqs": self.sqs.stats(), "buffered": len(self.buffer)}
+
+
+def enable_resilience(service, layer=None):
+    return (layer or ResilienceLayer()).apply(service.repository, service.publisher)
+
+
+def disable_resilience(service):
+    repository, publisher = service.repository, service.publisher
+    resource = unprotect(repository.dynamo_resource)
+    shared = counterpart(resource, protected=False)
+    if shared is not resource:
+        repository.dynamo_resource, repository.table, repository.dynamo_client = shared, None, None
+    else:
+        repository.dynamo_resource = resource
+        repository.table = unprotect(repository.table)
+        repository.dynamo_client = unprotect(repository.dynamo_client)
+    publisher.client = counterpart(unprotect(publisher.client), protected=False)
@@ -0,0 +1,117 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+
+from . import codec
+
+logger = logging.getLogger(__name__)
+
+
+def to_timestamp(due_date):
+    if isinstance(due_date, str):
+        due_date = datetime.fromisoformat(due_date)
+    if isinstance(due_date, datetime):
+        return due_date.timestamp()
+    return float(due_date)
+
+
+class DeadlineScheduler:
+    RETRY_DELAY = 5.0
+
+    def __init__(self, on_deadline, clock=time.time):
+        self.on_deadline = on_deadline
+        self.clock = clock
+        # Heap of (timestamp, shipping_id); cancelled or rescheduled entries are skipped lazily
+        # against `deadlines` and compacted once they dominate the heap.
+        self.heap = []
+        self.deadlines = {}
+        self.condition = threading.Condition()
+        self.thread = None
+        self.stopped = False
+
+    @classmethod
+    def for_service(cls, service, start=True):
+        scheduler = cls(service.expire_shipping)
+        service.scheduler = scheduler
+        projection = "shipping_id, shipping_status, due_at"
+        scheduler.load(itertools.chain.from_iterable(
+            service.repository.iter_shippings_by_status(status, projection=projection)
+            for status in (service.SHIPPING_CREATED, service.SHIPPING_IN_PROGRESS)))
+        if start:
+            scheduler.start()
+        return scheduler
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def schedule(self, shipping_id, due_date):
+        timestamp = to_timestamp(due_date)
+        with self.condition:
+            self.deadlines[shipping_id] = timestamp
+            heapq.heappush(self.heap, (timestamp, shipping_id))
+            if self.heap[0][1] == shipping_id:
+                self.condition.notify()
+
+    def load(self, shippings):
+        with self.condition:
+            for shipping in shippings:
+                self.deadlines[shipping["shipping_id"]] = codec.due_millis(shipping) / 1000
+            self.heap = [(timestamp, shipping_id) for shipping_id, timestamp in self.deadlines.items()]
+            heapq.heapify(self.heap)
+            self.condition.notify()
+
+    def cancel(self, shipping_id):
+        with self.condition:
+            removed = self.deadlines.pop(shipping_id, None) is not None
+            if removed and len(self.heap) > 2 * len(self.deadlines) + 1024:
+                self.heap = [(timestamp, shipping_id) for shipping_id, timestamp in self.deadlines.items()]
+                heapq.heapify(self.heap)
+
+    def pop_due(self, now=None):
+        now = self.clock() if now is None else now
+        due = []
+        with self.condition:
+            while self.heap and self.heap[0][0] <= now:
+                timestamp, shipping_id = heapq.heappop(self.heap)
+                if self.deadlines.get(shipping_id) == timestamp:
+                    del self.deadlines[shipping_id]
+                    due.append(shipping_id)
+        return due
+
+    def run_pending(self, now=None):
+        fired = []
+        for shipping_id in self.pop_due(now):
+            try:
+                self.on_deadline(shipping_id)
+                fired.append(shipping_id)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Failed to expire shipping %s", shipping_id)
+                self.schedule(shipping_id, self.clock() + self.RETRY_DELAY)
+        return fired
+
+    def start(self):
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="deadline-scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    delay = self.heap[0][0] - self.clock() if self.heap else None
+                    if delay is not None and delay <= 0:
+                        break
+                    self.condition.wait(timeout=delay)
+                if self.stopped:
+                    return
+            self.run_pending()
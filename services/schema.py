@@ -0,0 +1,62 @@
+from .config import ORDER_TABLE_NAME, OUTBOX_TABLE_NAME, PRODUCT_TABLE_NAME, SHIPPING_TABLE_NAME
+
+ORDER_INDEX = "order_id-index"
+STATUS_DUE_INDEX = "shipping_status-due_at-index"
+
+TABLE_KEYS = {
+    SHIPPING_TABLE_NAME: "shipping_id",
+    PRODUCT_TABLE_NAME: "product_id",
+    ORDER_TABLE_NAME: "order_id",
+    OUTBOX_TABLE_NAME: "event_id",
+}
+# index name -> (hash key, range key)
+TABLE_INDEXES = {
+    SHIPPING_TABLE_NAME: {
+        ORDER_INDEX: ("order_id", None),
+        STATUS_DUE_INDEX: ("shipping_status", "due_at"),
+    },
+}
+# Key attributes are strings unless listed here.
+ATTRIBUTE_TYPES = {"due_at": "N"}
+
+
+def key_schema(hash_key, range_key=None):
+    schema = [{"AttributeName": hash_key, "KeyType": "HASH"}]
+    if range_key:
+        schema.append({"AttributeName": range_key, "KeyType": "RANGE"})
+    return schema
+
+
+def table_definition(table_name):
+    key_name = TABLE_KEYS[table_name]
+    indexes = TABLE_INDEXES.get(table_name, {})
+    attributes = {key_name}
+    for hash_key, range_key in indexes.values():
+        attributes.update(name for name in (hash_key, range_key) if name)
+    definition = {
+        "TableName": table_name,
+        "KeySchema": key_schema(key_name),
+        "AttributeDefinitions": [{"AttributeName": name, "AttributeType": ATTRIBUTE_TYPES.get(name, "S")}
+                                 for name in sorted(attributes)],
+        "BillingMode": "PAY_PER_REQUEST",
+    }
+    if indexes:
+        definition["GlobalSecondaryIndexes"] = [
+            {"IndexName": index_name, "KeySchema": key_schema(hash_key, range_key),
+             "Projection": {"ProjectionType": "ALL"}}
+            for index_name, (hash_key, range_key) in indexes.items()
+        ]
+    return definition
+
+
+def create_tables(dynamo_client):
+    existing_tables = dynamo_client.list_tables()["TableNames"]
+    for table_name in TABLE_KEYS:
+        if table_name not in existing_tables:
+            dynamo_client.create_table(**table_definition(table_name))
+            dynamo_client.get_waiter("table_exists").wait(TableName=table_name)
+
+
+def delete_tables(dynamo_client):
+    for table_name in TABLE_KEYS:
+        dynamo_client.delete_table(TableName=table_name)
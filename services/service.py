@@ -1,48 +1,129 @@
+import logging
+import threading
+
+from . import codec
+from .config import EVENT_BROKER_HOST, EVENT_BROKER_PORT
+from .events import StatusEventBus, connect_broker
 from .repository import ShippingRepository
 from .publisher import ShippingPublisher
+from .models import ShippingRequest
 from datetime import datetime, timezone
 
+logger = logging.getLogger(__name__)
+
+
+class ShippingNotFoundError(LookupError):
+    pass
+
 
 class ShippingService:
     SHIPPING_CREATED: str = 'created'
     SHIPPING_IN_PROGRESS: str = 'in progress'
     SHIPPING_COMPLETED: str = 'completed'
     SHIPPING_FAILED: str = 'failed'
+    ACTIVE_STATUSES = (SHIPPING_CREATED, SHIPPING_IN_PROGRESS)
 
-    def __init__(self, repository, publisher):
+    def __init__(self, repository, publisher, scheduler=None, use_outbox=False, events=None):
         self.repository = repository
         self.publisher = publisher
+        self.scheduler = scheduler
+        self.use_outbox = use_outbox
+        self.events = events or StatusEventBus()
 
     @staticmethod
     def list_available_shipping_type():
         return ['Нова Пошта', 'Укр Пошта', 'Meest Express', 'Самовивіз']
 
-    def create_shipping(self, shipping_type, product_ids, order_id, due_date):
-        if shipping_type not in self.list_available_shipping_type():
+    @classmethod
+    def validate_shipping(cls, shipping_type, due_date):
+        if shipping_type not in cls.list_available_shipping_type():
             raise ValueError("Shipping type is not available")
 
         if due_date <= datetime.now(timezone.utc):
             raise ValueError("Shipping due datetime must be greater than datetime now")
 
-        shipping_id = self.repository.create_shipping(shipping_type, product_ids, order_id, self.SHIPPING_CREATED, due_date)
+    def create_shipping(self, shipping_type, product_ids, order_id, due_date):
+        self.validate_shipping(shipping_type, due_date)
+
+        if self.use_outbox:
+            # The outbox relay publishes the message, see services/outbox.py.
+            shipping_id = self.repository.create_shipping_with_outbox(shipping_type, product_ids, order_id,
+                                                                      self.SHIPPING_IN_PROGRESS, due_date)
+            self.events.publish(shipping_id, self.SHIPPING_IN_PROGRESS)
+        else:
+            shipping_id = self.repository.create_shipping(shipping_type, product_ids, order_id, self.SHIPPING_CREATED, due_date)
+
+            self.publisher.send_new_shipping(shipping_id)
+            # A fast worker may have finished the shipping already; never move it back to in progress.
+            if self.repository.update_shipping_status(shipping_id, self.SHIPPING_IN_PROGRESS,
+                                                      expected_status=self.SHIPPING_CREATED) is not None:
+                self.events.publish(shipping_id, self.SHIPPING_IN_PROGRESS)
+        if self.scheduler is not None:
+            self.scheduler.schedule(shipping_id, due_date)
+
+        return shipping_id
 
-        self.publisher.send_new_shipping(shipping_id)
-        self.repository.update_shipping_status(shipping_id, self.SHIPPING_IN_PROGRESS)
+    def create_shippings_bulk(self, orders, validate=True):
+        requests = [ShippingRequest(*order) for order in orders]
+        for request in requests:
+            if validate:
+                self.validate_shipping(request.shipping_type, request.due_date)
+
+        shipping_ids = self.repository.create_shippings(requests, self.SHIPPING_IN_PROGRESS)
+        self.publisher.send_new_shippings(shipping_ids)
+        for shipping_id in shipping_ids:
+            self.events.publish(shipping_id, self.SHIPPING_IN_PROGRESS)
+        if self.scheduler is not None:
+            for shipping_id, request in zip(shipping_ids, requests):
+                self.scheduler.schedule(shipping_id, request.due_date)
+
+        return shipping_ids
+
+    def place_order_transaction(self, shipping_type, product_counts, order_id, due_date, created_at=None):
+        self.validate_shipping(shipping_type, due_date)
+
+        shipping_id = self.repository.create_order_transaction(shipping_type, product_counts, order_id,
+                                                               self.SHIPPING_IN_PROGRESS, due_date,
+                                                               with_outbox=self.use_outbox, created_at=created_at)
+        if not self.use_outbox:
+            self.publisher.send_new_shipping(shipping_id)
+        self.events.publish(shipping_id, self.SHIPPING_IN_PROGRESS)
+        if self.scheduler is not None:
+            self.scheduler.schedule(shipping_id, due_date)
 
         return shipping_id
 
     def process_shipping_batch(self):
         result = []
-        shipping = self.publisher.poll_shipping()
-        for shipping_id in shipping:
-            shipping = self.process_shipping(shipping_id)
+        messages = self.publisher.receive_shipping_messages()
+        shippings = self.repository.get_shippings([message['Body'] for message in messages]) if messages else {}
+        for message in messages:
+            try:
+                shipping = self.process_shipping(message['Body'], shippings.get(message['Body']))
+            except ShippingNotFoundError:
+                # Nothing to process: the message is deleted with the rest of the batch.
+                logger.warning("Shipping %s does not exist, dropping its message", message['Body'])
+                shipping = None
             result.append(shipping)
 
+        if messages:
+            self.publisher.delete_shippings([message['ReceiptHandle'] for message in messages])
+
         return result
 
-    def process_shipping(self, shipping_id):
-        shipping = self.repository.get_shipping(shipping_id)
-        if datetime.fromisoformat(shipping['due_date']) < datetime.now(timezone.utc):
+    @staticmethod
+    def is_overdue(shipping):
+        return codec.due_millis(shipping) < codec.now_millis()
+
+    def process_shipping(self, shipping_id, shipping=None):
+        if shipping is None:
+            shipping = self.repository.get_shipping(shipping_id)
+        if shipping is None:
+            raise ShippingNotFoundError(f"Shipping {shipping_id} does not exist")
+        if shipping['shipping_status'] not in self.ACTIVE_STATUSES:
+            # Redelivered message: the shipping is already completed or failed.
+            return None
+        if self.is_overdue(shipping):
             return self.fail_shipping(shipping_id)
 
         return self.complete_shipping(shipping_id)
@@ -52,10 +133,55 @@ class ShippingService:
 
         return shipping['shipping_status']
 
+    def check_statuses(self, shipping_ids):
+        shippings = self.repository.get_shippings(shipping_ids)
+
+        return {shipping_id: shipping['shipping_status'] for shipping_id, shipping in shippings.items()}
+
+    def expire_shipping(self, shipping_id):
+        shipping = self.repository.get_shipping(shipping_id)
+        if shipping and shipping['shipping_status'] in self.ACTIVE_STATUSES:
+            return self.fail_shipping(shipping_id)
+
+        return None
+
     def fail_shipping(self, shipping_id):
-        response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_FAILED)
-        return response['ResponseMetadata']
+        return self.finish_shipping(shipping_id, self.SHIPPING_FAILED)
 
     def complete_shipping(self, shipping_id):
-        response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_COMPLETED)
+        return self.finish_shipping(shipping_id, self.SHIPPING_COMPLETED)
+
+    def finish_shipping(self, shipping_id, status):
+        # Only an active shipping can finish, so a duplicate run cannot flip completed to failed.
+        response = self.repository.update_shipping_status(shipping_id, status, expected_status=self.ACTIVE_STATUSES)
+        if self.scheduler is not None:
+            self.scheduler.cancel(shipping_id)
+        if response is None:
+            return None
+        self.events.publish(shipping_id, status)
         return response['ResponseMetadata']
+
+    def warm_up(self):
+        # Optional: pays the client setup and first-connection cost before the first order does.
+        self.repository.warm_up()
+        self.publisher.warm_up()
+        return self
+
+    def subscribe(self, shipping_ids, callback):
+        return self.events.subscribe(shipping_ids, callback)
+
+    def stream_statuses(self, shipping_ids=None):
+        return self.events.stream(shipping_ids)
+
+    def connect_event_broker(self, address=(EVENT_BROKER_HOST, EVENT_BROKER_PORT)):
+        # Processes that did not process a shipping (e.g. the API) see its transitions through the
+        # broker the worker supervisor runs. Returns the bridge to close, or None without a broker.
+        return connect_broker(self.events, address)
+
+    def wait_for_status(self, shipping_id, statuses, timeout=None):
+        done = threading.Event()
+        with self.subscribe([shipping_id], lambda event: event.status in statuses and done.set()):
+            # Subscribed before the single read, so a transition in between is not missed.
+            if self.check_status(shipping_id) in statuses or done.wait(timeout):
+                return self.check_status(shipping_id)
+        return None
@@ -0,0 +1,256 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime
+from uuid import uuid4
+
+from .config import SHIPPING_WAL_FLUSH_INTERVAL, SHIPPING_WAL_PATH, SHIPPING_WAL_SIZE
+from .models import ShippingRequest
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SWAL"
+# magic, epoch, checkpoint offset
+HEADER = struct.Struct("<4sIQ")
+# payload length, crc32 of epoch + payload
+ENTRY = struct.Struct("<II")
+
+
+class WalFullError(BufferError):
+    pass
+
+
+class WriteAheadLog:
+    # Append-only log in a memory-mapped file. Entries between the checkpoint and the write offset are
+    # not yet flushed to the backend. The epoch is part of every entry's checksum, so entries left over
+    # from before a reset never look valid.
+    def __init__(self, path: str = SHIPPING_WAL_PATH, size: int = SHIPPING_WAL_SIZE):
+        self.path = path
+        self.size = size
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) < HEADER.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < size:
+            os.ftruncate(self.fd, size)
+        self.size = os.fstat(self.fd).st_size
+        self.mm = mmap.mmap(self.fd, self.size)
+        if new or self.mm[:4] != MAGIC:
+            self._write_header(1, HEADER.size)
+            self.mm.flush()
+        _, self.epoch, self.checkpoint_offset = HEADER.unpack_from(self.mm, 0)
+        self.write_offset = self._recover_end(self.checkpoint_offset)
+        self.synced_offset = self.write_offset
+        self.appends = 0
+        self.syncs = 0
+
+    def _write_header(self, epoch, checkpoint_offset):
+        HEADER.pack_into(self.mm, 0, MAGIC, epoch, checkpoint_offset)
+
+    def _checksum(self, payload):
+        return zlib.crc32(payload, zlib.crc32(struct.pack("<I", self.epoch)))
+
+    def _read(self, offset):
+        if offset + ENTRY.size > self.size:
+            return None
+        length, checksum = ENTRY.unpack_from(self.mm, offset)
+        start = offset + ENTRY.size
+        if length == 0 or start + length > self.size:
+            return None
+        payload = bytes(self.mm[start:start + length])
+        if self._checksum(payload) != checksum:
+            # Torn write from a crash, or an entry from an earlier epoch.
+            return None
+        return payload
+
+    def _recover_end(self, offset):
+        while True:
+            payload = self._read(offset)
+            if payload is None:
+                return offset
+            offset += ENTRY.size + len(payload)
+
+    def append(self, payload: bytes, sync: bool = True):
+        with self.lock:
+            end = self.write_offset + ENTRY.size + len(payload)
+            if end > self.size:
+                raise WalFullError(f"Write-ahead log {self.path} is full")
+            self.mm[self.write_offset + ENTRY.size:end] = payload
+            ENTRY.pack_into(self.mm, self.write_offset, len(payload), self._checksum(payload))
+            self.write_offset = end
+            self.appends += 1
+        if sync:
+            self.sync(end)
+        return end
+
+    def sync(self, offset=None):
+        # Group commit: whoever gets the lock flushes everything appended so far, and the appenders
+        # queued behind it find their entries already durable.
+        with self.sync_lock:
+            if offset is not None and self.synced_offset >= offset:
+                return
+            with self.lock:
+                target = self.write_offset
+            self.mm.flush()
+            self.syncs += 1
+            self.synced_offset = max(self.synced_offset, target)
+
+    def pending(self, limit: int = None):
+        entries = []
+        with self.lock:
+            offset, end = self.checkpoint_offset, self.write_offset
+        while offset < end and (limit is None or len(entries) < limit):
+            payload = self._read(offset)
+            offset += ENTRY.size + len(payload)
+            entries.append((offset, payload))
+        return entries
+
+    def checkpoint(self, offset):
+        with self.sync_lock, self.lock:
+            if self.write_offset - offset <= offset - HEADER.size:
+                # The unflushed tail fits in front of the flushed entries: move it to the top so a steady
+                # trickle of writes still reclaims the space.
+                self._compact(offset)
+                return
+            self._write_header(self.epoch, offset)
+            self.checkpoint_offset = offset
+            self.mm.flush(0, min(mmap.PAGESIZE, self.size))
+
+    def _compact(self, offset):
+        payloads = []
+        while offset < self.write_offset:
+            payload = self._read(offset)
+            payloads.append(payload)
+            offset += ENTRY.size + len(payload)
+        # The copies are written under a new epoch and do not overlap the originals, which stay valid
+        # until the header switches to the new epoch.
+        self.epoch += 1
+        position = HEADER.size
+        for payload in payloads:
+            end = position + ENTRY.size + len(payload)
+            self.mm[position + ENTRY.size:end] = payload
+            ENTRY.pack_into(self.mm, position, len(payload), self._checksum(payload))
+            position = end
+        self.mm.flush()
+        self._write_header(self.epoch, HEADER.size)
+        self.mm.flush(0, min(mmap.PAGESIZE, self.size))
+        self.checkpoint_offset = HEADER.size
+        self.write_offset = self.synced_offset = position
+
+    def __len__(self):
+        return len(self.pending())
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+        os.close(self.fd)
+
+
+def encode_request(request: ShippingRequest):
+    return json.dumps([request.shipping_type, request.product_ids, request.order_id, request.due_date.isoformat(),
+                       request.shipping_id]).encode()
+
+
+def decode_request(payload: bytes):
+    shipping_type, product_ids, order_id, due_date, shipping_id = json.loads(payload)
+    return ShippingRequest(shipping_type, product_ids, order_id, datetime.fromisoformat(due_date), shipping_id)
+
+
+class BufferedShippingService:
+    # Order placement appends to the write-ahead log and returns; a background thread writes the
+    # shipments to DynamoDB and SQS in batches.
+    def __init__(self, service, log=None, batch_size: int = 25, interval: float = SHIPPING_WAL_FLUSH_INTERVAL):
+        self.service = service
+        # Not `log or ...`: an empty log has a length of 0.
+        self.log = log if log is not None else WriteAheadLog()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.flushed = 0
+        # Set after a failed flush: part of the batch may already be in DynamoDB and even processed.
+        self.replaying = False
+
+    def __getattr__(self, name):
+        return getattr(self.service, name)
+
+    def create_shipping(self, shipping_type, product_ids, order_id, due_date):
+        self.service.validate_shipping(shipping_type, due_date)
+        request = ShippingRequest(shipping_type, list(product_ids), order_id, due_date, str(uuid4()))
+        try:
+            self.log.append(encode_request(request))
+        except WalFullError:
+            logger.warning("Write-ahead log is full, creating shipping synchronously")
+            return self.service.create_shipping(shipping_type, product_ids, order_id, due_date)
+        self.wakeup.set()
+        return request.shipping_id
+
+    def replay(self, requests):
+        # Entries from an interrupted flush may already be in DynamoDB, and a worker may have moved them on.
+        # Those are never rewritten, only re-sent to SQS, which processing handles idempotently.
+        existing = self.service.repository.get_shippings([request.shipping_id for request in requests])
+        missing = [request for request in requests if request.shipping_id not in existing]
+        if missing:
+            self.service.create_shippings_bulk(missing, validate=False)
+        if existing:
+            self.service.publisher.send_new_shippings(list(existing))
+
+    def recover(self):
+        # A crash may come between the batch write and the checkpoint.
+        entries = self.log.pending()
+        if not entries:
+            return 0
+        self.replay([decode_request(payload) for _, payload in entries])
+        self.log.checkpoint(entries[-1][0])
+        return len(entries)
+
+    def flush(self):
+        flushed = 0
+        while True:
+            entries = self.log.pending(self.batch_size)
+            if not entries:
+                return flushed
+            requests = [decode_request(payload) for _, payload in entries]
+            try:
+                if self.replaying:
+                    self.replay(requests)
+                else:
+                    # Already validated on append; a due date that passed while buffered is failed by processing.
+                    self.service.create_shippings_bulk(requests, validate=False)
+            except Exception:
+                self.replaying = True
+                raise
+            self.replaying = False
+            self.log.checkpoint(entries[-1][0])
+            flushed += len(entries)
+            self.flushed += len(entries)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                # The entries stay in the log and are retried on the next round.
+                logger.exception("Failed to flush the write-ahead log")
+                self.stop_event.wait(self.interval)
+        self.flush()
+
+    def start(self):
+        self.recover()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="shipping-wal-flusher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
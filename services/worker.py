@@ -0,0 +1,183 @@
+import argparse
+import functools
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+from .clients import reset_clients
+from .config import (EVENT_BROKER_ENABLED, EVENT_BROKER_HOST, EVENT_BROKER_PORT, SHIPPING_POLLERS,
+                     SHIPPING_PROCESSES, SHIPPING_SHUTDOWN_TIMEOUT, SHIPPING_WORKERS)
+from .consumer import AdaptiveConsumer
+from .events import EventBroker
+from .processor import ShippingProcessor
+from .publisher import ShippingPublisher
+from .repository import ShippingRepository
+from .resilience import enable_resilience
+from .service import ShippingService
+
+logger = logging.getLogger(__name__)
+
+
+def build_service():
+    service = ShippingService(ShippingRepository(), ShippingPublisher())
+    enable_resilience(service)
+    return service
+
+
+def build_sqlite_service(path):
+    # Single-host deployment: every worker process opens the same WAL-mode database.
+    from .backends import sqlite_backend  # pylint: disable=import-outside-toplevel
+
+    return ShippingService(*sqlite_backend(path))
+
+
+def report(index, processor, interval, stop_event):
+    while not stop_event.wait(interval):
+        stats = processor.stats()
+        logger.info("worker %d: processed=%d failed=%d missing=%d in_flight=%d throughput=%.1f/s", index,
+                    stats["processed"], stats["failed"], stats["missing"], stats["in_flight"], stats["throughput"])
+
+
+def run_worker(index, workers=SHIPPING_WORKERS, pollers=SHIPPING_POLLERS, report_interval=30.0,
+               service_factory=build_service, event_broker=None):
+    # Clients created before the fork share sockets with the parent.
+    reset_clients()
+    service = service_factory()
+    bridge = service.connect_event_broker(event_broker) if event_broker is not None else None
+    processor = ShippingProcessor(service, workers=workers)
+    if pollers:
+        # Visibility starts at the poller's receive, and the buffer shrinks to what the workers can finish in it.
+        processor.consumer = AdaptiveConsumer(service.publisher, pollers=pollers,
+                                              visibility_timeout=processor.visibility_timeout)
+    # SIGTERM only stops polling; run() returns once in-flight messages are processed and deleted.
+    signal.signal(signal.SIGTERM, lambda signum, frame: processor.stop())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    stop_event = threading.Event()
+    reporter = threading.Thread(target=report, args=(index, processor, report_interval, stop_event), daemon=True)
+    reporter.start()
+    processor.run()
+    stop_event.set()
+    if bridge is not None:
+        bridge.close()
+    stats = processor.stats()
+    logger.info("worker %d stopped: processed=%d failed=%d throughput=%.1f/s", index,
+                stats["processed"], stats["failed"], stats["throughput"])
+    return stats
+
+
+class WorkerSupervisor:
+    def __init__(self, processes: int = SHIPPING_PROCESSES, target=run_worker, kwargs=None,
+                 restart_backoff: float = 1.0, max_backoff: float = 60.0, stable_after: float = 60.0,
+                 shutdown_timeout: float = SHIPPING_SHUTDOWN_TIMEOUT, event_broker=None):
+        self.processes = processes
+        self.target = target
+        self.kwargs = kwargs or {}
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.shutdown_timeout = shutdown_timeout
+        self.children = {}
+        self.started_at = {}
+        self.failures = {}
+        self.restart_at = {}
+        self.restarts = 0
+        self.stop_event = threading.Event()
+        # Address to serve status events on; workers publish their transitions to it.
+        self.event_broker = event_broker
+        self.broker = None
+
+    def start_broker(self):
+        if self.event_broker is not None and self.broker is None:
+            self.broker = EventBroker(self.event_broker).start()
+            self.kwargs = dict(self.kwargs, event_broker=self.broker.server_address)
+        return self.broker
+
+    def spawn(self, index):
+        process = multiprocessing.Process(target=self.target, args=(index,), kwargs=self.kwargs,
+                                          name=f"shipping-worker-{index}")
+        process.start()
+        self.children[index] = process
+        self.started_at[index] = time.monotonic()
+        self.restart_at.pop(index, None)
+        logger.info("Started worker %d (pid %d)", index, process.pid)
+
+    def check_children(self):
+        now = time.monotonic()
+        for index in range(self.processes):
+            process = self.children.get(index)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                process.join()
+                del self.children[index]
+                # A child that stayed up for a while starts its backoff from scratch.
+                if now - self.started_at[index] >= self.stable_after:
+                    self.failures[index] = 0
+                self.failures[index] = self.failures.get(index, 0) + 1
+                delay = min(self.max_backoff, self.restart_backoff * 2 ** (self.failures[index] - 1))
+                self.restart_at[index] = now + delay
+                logger.warning("Worker %d exited with code %s, restarting in %.1fs", index, process.exitcode, delay)
+            if self.restart_at.get(index, now) <= now:
+                if index in self.restart_at:
+                    self.restarts += 1
+                self.spawn(index)
+
+    def run(self, poll_interval: float = 0.5):
+        self.start_broker()
+        while not self.stop_event.is_set():
+            self.check_children()
+            self.stop_event.wait(poll_interval)
+        self.shutdown()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def shutdown(self):
+        for process in self.children.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for index, process in self.children.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker %d did not drain in time, killing it", index)
+                process.kill()
+                process.join()
+        self.children = {}
+        if self.broker is not None:
+            self.broker.stop()
+            self.broker = None
+
+    def install_signal_handlers(self):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda signum, frame: self.stop())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m services.worker",
+                                     description="Run shipping processors across several processes")
+    parser.add_argument("--processes", type=int, default=SHIPPING_PROCESSES)
+    parser.add_argument("--workers", type=int, default=SHIPPING_WORKERS, help="processing threads per process")
+    parser.add_argument("--pollers", type=int, default=SHIPPING_POLLERS,
+                        help="concurrent long-polls per process, 0 polls from the processor loop")
+    parser.add_argument("--report-interval", type=float, default=30.0)
+    parser.add_argument("--shutdown-timeout", type=float, default=SHIPPING_SHUTDOWN_TIMEOUT)
+    parser.add_argument("--sqlite", metavar="PATH", help="use a local SQLite database instead of DynamoDB and SQS")
+    parser.add_argument("--event-broker", action="store_true", default=EVENT_BROKER_ENABLED,
+                        help=f"relay status events to other processes on {EVENT_BROKER_HOST}:{EVENT_BROKER_PORT}")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    kwargs = {"workers": args.workers, "pollers": args.pollers, "report_interval": args.report_interval}
+    if args.sqlite:
+        kwargs["service_factory"] = functools.partial(build_sqlite_service, args.sqlite)
+    supervisor = WorkerSupervisor(args.processes, kwargs=kwargs, shutdown_timeout=args.shutdown_timeout,
+                                  event_broker=(EVENT_BROKER_HOST, EVENT_BROKER_PORT) if args.event_broker else None)
+    supervisor.install_signal_handlers()
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
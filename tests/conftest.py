@@ -2,6 +2,7 @@ import pytest
 import boto3
 from services.config import *
 from services.db import get_dynamodb_resource
+from services.schema import create_tables, delete_tables
 
 @pytest.fixture(scope="session", autouse=True)
 def setup_localstack_resources():
@@ -12,15 +13,7 @@ def setup_localstack_resources():
         aws_access_key_id="test",
         aws_secret_access_key="test"
     )
-    existing_tables = dynamo_client.list_tables()["TableNames"]
-    if SHIPPING_TABLE_NAME not in existing_tables:
-        dynamo_client.create_table(
-            TableName=SHIPPING_TABLE_NAME,
-            KeySchema=[{"AttributeName": "shipping_id", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "shipping_id", "AttributeType": "S"}],
-            BillingMode="PAY_PER_REQUEST",
-        )
-        dynamo_client.get_waiter("table_exists").wait(TableName=SHIPPING_TABLE_NAME)
+    create_tables(dynamo_client)
     sqs_client = boto3.client(
         "sqs",
         endpoint_url=AWS_ENDPOINT_URL,
@@ -33,7 +26,7 @@ def setup_localstack_resources():
 
     yield  # Всі тести йдуть тут
 
-    dynamo_client.delete_table(TableName=SHIPPING_TABLE_NAME)
+    delete_tables(dynamo_client)
     sqs_client.delete_queue(QueueUrl=queue_url)
 
 
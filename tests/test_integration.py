@@ -7,7 +7,7 @@ from services.service import ShippingService
 from services.repository import ShippingRepository
 from services.publisher import ShippingPublisher
 from datetime import datetime, timedelta, timezone
-from services.config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE, SHIPPING_TABLE_NAME
+from services.config import AWS_ENDPOINT_URL, AWS_REGION, PRODUCT_TABLE_NAME, SHIPPING_QUEUE, SHIPPING_TABLE_NAME
 
 @pytest.mark.parametrize("order_id, shipping_id", [
     ("order_1", "shipping_1"),
@@ -165,7 +165,7 @@ def test_order_with_multiple_products(dynamo_resource):
     shipping_data = real_repository.get_shipping(shipping_id)
     assert shipping_data is not None
     assert shipping_data["shipping_type"] == "Нова Пошта"
-    assert set(shipping_data["product_ids"].split(",")) == {"Product X", "Product Y"}
+    assert set(shipping_data["product_ids"]) == {"Product X", "Product Y"}
     assert shipping_data["shipping_status"] == shipping_service.SHIPPING_IN_PROGRESS
     # Ініціалізуємо клієнт SQS для перевірки повідомлення
     sqs_client = boto3.client(
@@ -224,7 +224,7 @@ def test_order_with_zero_price_product(dynamo_resource):
     assert cart.calculate_total() == 0.0
     # Перевіряємо збереження даних у DynamoDB
     shipping_data = real_repository.get_shipping(shipping_id)
-    assert shipping_data["product_ids"] == "Free Product"
+    assert shipping_data["product_ids"] == ["Free Product"]
     assert shipping_data["shipping_status"] == shipping_service.SHIPPING_IN_PROGRESS
 
 
@@ -249,7 +249,7 @@ def test_order_with_maximum_product_amount(dynamo_resource):
     assert len(cart.products) == 0
     # Перевіряємо збереження даних у DynamoDB
     shipping_data = real_repository.get_shipping(shipping_id)
-    assert shipping_data["product_ids"] == "Max Product"
+    assert shipping_data["product_ids"] == ["Max Product"]
     assert shipping_data["shipping_status"] == shipping_service.SHIPPING_IN_PROGRESS
     sqs_client = boto3.client(
         "sqs",
@@ -337,7 +337,7 @@ def test_order_with_empty_cart_real(dynamo_resource):
     shipping_data = real_repository.get_shipping(shipping_id)
     assert shipping_data is not None
     assert shipping_data["shipping_type"] == "Самовивіз"
-    assert shipping_data["product_ids"] == ""
+    assert shipping_data["product_ids"] == []
     assert shipping_data["shipping_status"] == shipping_service.SHIPPING_IN_PROGRESS
     sqs_client = boto3.client(
         "sqs",
@@ -389,7 +389,7 @@ def test_order_with_duplicate_products(dynamo_resource):
     assert product.available_amount == 8  # 10 - 2 (последнее добавление перезаписало 3 на 2)
     assert len(cart.products) == 0
     shipping_data = real_repository.get_shipping(shipping_id)
-    assert shipping_data["product_ids"] == "Duplicate Product"
+    assert shipping_data["product_ids"] == ["Duplicate Product"]
     assert shipping_data["shipping_status"] == shipping_service.SHIPPING_IN_PROGRESS
 
 # Тест 7: Перевірка замовлення з великою кількістю різних продуктів
@@ -415,7 +415,7 @@ def test_order_with_large_number_of_products(dynamo_resource):
         assert product.available_amount == 18
     assert len(cart.products) == 0
     shipping_data = real_repository.get_shipping(shipping_id)
-    assert set(shipping_data["product_ids"].split(",")) == {f"Product_{i}" for i in range(5)}
+    assert set(shipping_data["product_ids"]) == {f"Product_{i}" for i in range(5)}
     sqs_client = boto3.client(
         "sqs",
         endpoint_url=AWS_ENDPOINT_URL,
@@ -465,7 +465,7 @@ def test_order_with_high_price(dynamo_resource):
     assert len(cart.products) == 0
     assert cart.calculate_total() == 0.0
     shipping_data = real_repository.get_shipping(shipping_id)
-    assert shipping_data["product_ids"] == "Expensive Product"
+    assert shipping_data["product_ids"] == ["Expensive Product"]
     assert shipping_data["shipping_status"] == shipping_service.SHIPPING_IN_PROGRESS
 
 # Тест 9: Перевірка замовлення з мінімальним терміном доставки
@@ -510,4 +510,39 @@ def test_order_with_nameless_product(mocker, dynamo_resource):
         [""],
         order.order_id,
         due_date
-    )
\ No newline at end of file
+    )
+# Тест 11: Перевірка транзакційного оформлення замовлення
+def test_transactional_order_updates_stock_and_shipping(dynamo_resource):
+    real_repository = ShippingRepository()
+    shipping_service = ShippingService(real_repository, ShippingPublisher())
+    product = Product(name=f"Transactional Product {uuid.uuid4()}", price=10.0, available_amount=5)
+    real_repository.set_product_stock({product.name: 5})
+    cart = ShoppingCart()
+    cart.add_product(product, 2)
+    order = Order(cart=cart, shipping_service=shipping_service, transactional=True)
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=2)
+    shipping_id = order.place_order(shipping_type="Нова Пошта", due_date=due_date)
+    assert shipping_id == real_repository.order_shipping_id(order.order_id)
+    assert product.available_amount == 3
+    assert len(cart.products) == 0
+    stock = dynamo_resource.Table(PRODUCT_TABLE_NAME).get_item(Key={"product_id": product.name})["Item"]
+    assert stock["available_amount"] == 3
+    shipping_data = real_repository.get_shipping(shipping_id)
+    assert shipping_data["shipping_status"] == shipping_service.SHIPPING_IN_PROGRESS
+    # Повторне оформлення того ж замовлення не списує товар вдруге
+    assert shipping_service.place_order_transaction("Нова Пошта", {product.name: 2}, order.order_id,
+                                                    due_date) == shipping_id
+    stock = dynamo_resource.Table(PRODUCT_TABLE_NAME).get_item(Key={"product_id": product.name})["Item"]
+    assert stock["available_amount"] == 3
+
+
+# Тест 12: Пошук доставок за замовленням і простроченими термінами через GSI
+def test_index_queries_by_order_and_status(dynamo_resource):
+    repository = ShippingRepository()
+    order_id = str(uuid.uuid4())
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    shipping_id = repository.create_shipping("Нова Пошта", ["Product"], order_id, "overdue-test", past)
+    by_order = list(repository.iter_shippings_by_order(order_id))
+    assert [shipping["shipping_id"] for shipping in by_order] == [shipping_id]
+    overdue = list(repository.iter_shippings_by_status("overdue-test", due_before=datetime.now(timezone.utc)))
+    assert shipping_id in [shipping["shipping_id"] for shipping in overdue]
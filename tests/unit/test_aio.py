@@ -0,0 +1,57 @@
+import asyncio
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from services.aio import AsyncShippingPublisher, AsyncShippingRepository, AsyncShippingService
+from services.fake import fake_backend
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+
+
+class TestAsyncShippingService(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.executor = ThreadPoolExecutor(max_workers=16)
+        self.repository = AsyncShippingRepository(ShippingRepository(dynamo_resource), self.executor)
+        self.publisher = AsyncShippingPublisher(ShippingPublisher(sqs_client), self.executor)
+        self.service = AsyncShippingService(self.repository, self.publisher)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    async def test_create_and_process_many_shipments(self):
+        due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+        shipping_ids = await asyncio.gather(*(
+            self.service.create_shipping("Нова Пошта", [f"Product_{i}"], f"order_{i}", due_date)
+            for i in range(20)
+        ))
+        statuses = await asyncio.gather(*(self.service.check_status(shipping_id) for shipping_id in shipping_ids))
+        self.assertEqual(set(statuses), {AsyncShippingService.SHIPPING_IN_PROGRESS})
+
+        processed = 0
+        while processed < 20:
+            processed += len(await self.service.process_shipping_batch())
+        statuses = await asyncio.gather(*(self.service.check_status(shipping_id) for shipping_id in shipping_ids))
+        self.assertEqual(set(statuses), {AsyncShippingService.SHIPPING_COMPLETED})
+        self.assertEqual(await self.publisher.receive_shipping_messages(wait_time=0), [])
+
+    async def test_rejects_unavailable_shipping_type(self):
+        with self.assertRaises(ValueError):
+            await self.service.create_shipping("Новий тип доставки", [], "order",
+                                               datetime.now(timezone.utc) + timedelta(minutes=5))
+
+    async def test_calls_overlap_on_one_event_loop(self):
+        repository = MagicMock()
+        repository.get_shipping.side_effect = lambda shipping_id: time.sleep(0.1) or {
+            "shipping_status": "in progress"}
+        service = AsyncShippingService(AsyncShippingRepository(repository, self.executor), self.publisher)
+        started = time.monotonic()
+        await asyncio.gather(*(service.check_status(str(i)) for i in range(10)))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
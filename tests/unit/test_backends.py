@@ -0,0 +1,191 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from services.backends import SqliteShippingQueue, memory_backend, sqlite_backend
+from services.fake import fake_backend
+from services.models import ShippingRequest
+from services.publisher import ShippingPublisher
+from services.repository import OrderConflictError, ShippingRepository
+from services.service import ShippingService
+
+SHIPPING_TYPE = "Нова Пошта"
+
+
+class BackendConformance:
+    # Shared by every backend; subclasses only build the repository/queue pair.
+    def create_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.repository, self.queue = self.create_backend()
+        self.service = ShippingService(self.repository, self.queue)
+        self.now = datetime.now(timezone.utc)
+
+    def due(self, minutes):
+        return self.now + timedelta(minutes=minutes)
+
+    def test_shipping_round_trip(self):
+        shipping_id = self.repository.create_shipping(SHIPPING_TYPE, ["A", "B"], "order_1", "created", self.due(5))
+        item = self.repository.get_shipping(shipping_id)
+        self.assertEqual((item["order_id"], item["shipping_status"], list(item["product_ids"])),
+                         ("order_1", "created", ["A", "B"]))
+        record = self.repository.get_record(shipping_id)
+        self.assertEqual(record.due_at, int(self.due(5).timestamp() * 1000))
+        self.assertIsNone(self.repository.get_shipping("missing"))
+        self.assertEqual(set(self.repository.get_shippings([shipping_id, "missing", shipping_id])), {shipping_id})
+
+    def test_bulk_create_keeps_ids_and_indexes_by_order(self):
+        requests = [ShippingRequest(SHIPPING_TYPE, ["A"], f"order_{i % 2}", self.due(i + 1), f"id_{i}")
+                    for i in range(6)]
+        self.assertEqual(self.repository.create_shippings(requests, "in progress"), [f"id_{i}" for i in range(6)])
+        by_order = {item["shipping_id"] for item in self.repository.iter_shippings_by_order("order_1")}
+        self.assertEqual(by_order, {"id_1", "id_3", "id_5"})
+        self.assertEqual(len(list(self.repository.iter_shipments(page_size=4))), 6)
+
+    def test_numeric_order_ids_are_indexed_as_strings(self):
+        shipping_id = self.repository.create_shipping(SHIPPING_TYPE, ["A"], 42, "created", self.due(5))
+        self.assertEqual(self.repository.get_shipping(shipping_id)["order_id"], "42")
+        self.assertEqual([item["shipping_id"] for item in self.repository.iter_shippings_by_order(42)], [shipping_id])
+        self.assertEqual([item["shipping_id"] for item in self.repository.iter_shippings_by_order("42")],
+                         [shipping_id])
+
+    def test_status_index_is_ordered_by_due_date(self):
+        for minutes in (30, -10, 20, -5):
+            self.repository.create_shipping(SHIPPING_TYPE, ["A"], f"order_{minutes}", "in progress", self.due(minutes))
+        self.repository.create_shipping(SHIPPING_TYPE, ["A"], "done", "completed", self.due(-20))
+        due = [item["order_id"] for item in self.repository.iter_shippings_by_status("in progress")]
+        self.assertEqual(due, ["order_-10", "order_-5", "order_20", "order_30"])
+        overdue = list(self.repository.iter_shippings_by_status("in progress", due_before=self.now,
+                                                                projection="shipping_id, due_at"))
+        self.assertEqual(len(overdue), 2)
+        self.assertEqual(set(overdue[0]), {"shipping_id", "due_at"})
+
+    def test_conditional_status_update(self):
+        shipping_id = self.repository.create_shipping(SHIPPING_TYPE, ["A"], "order_1", "in progress", self.due(5))
+        self.assertIsNone(self.repository.update_shipping_status(shipping_id, "failed", expected_status="created"))
+        self.assertEqual(self.repository.get_shipping(shipping_id)["shipping_status"], "in progress")
+        self.assertIsNotNone(self.repository.update_shipping_status(
+            shipping_id, "completed", expected_status=["created", "in progress"]))
+        self.assertEqual(self.repository.get_shipping(shipping_id)["shipping_status"], "completed")
+        self.assertEqual(list(self.repository.iter_shippings_by_status("in progress")), [])
+
+    def test_order_transaction_is_idempotent_and_checks_stock(self):
+        self.repository.set_product_stock({"A": 3, "B": 1})
+        shipping_id = self.repository.create_order_transaction(SHIPPING_TYPE, {"A": 2, "B": 1}, "order_1",
+                                                               "in progress", self.due(5))
+        retried = self.repository.create_order_transaction(SHIPPING_TYPE, {"A": 2, "B": 1}, "order_1",
+                                                           "in progress", self.due(5))
+        self.assertEqual(retried, shipping_id)
+        with self.assertRaises(OrderConflictError):
+            self.repository.create_order_transaction(SHIPPING_TYPE, {"A": 1}, "order_1", "in progress", self.due(5))
+        with self.assertRaises(ValueError):
+            self.repository.create_order_transaction(SHIPPING_TYPE, {"A": 1, "B": 1}, "order_2", "in progress",
+                                                     self.due(5))
+        # The failed order took nothing: one A is still left for the next one.
+        self.repository.create_order_transaction(SHIPPING_TYPE, {"A": 1}, "order_3", "in progress", self.due(5))
+        with self.assertRaises(ValueError):
+            self.repository.create_order_transaction(SHIPPING_TYPE, {"A": 1}, "order_4", "in progress", self.due(5))
+        self.assertEqual(len(list(self.repository.iter_shipments())), 2)
+
+    def test_outbox(self):
+        shipping_id = self.repository.create_shipping_with_outbox(SHIPPING_TYPE, ["A"], "order_1", "in progress",
+                                                                  self.due(5))
+        events = self.repository.fetch_outbox()
+        self.assertEqual([event["shipping_id"] for event in events], [shipping_id])
+        self.repository.delete_outbox([event["event_id"] for event in events])
+        self.assertEqual(self.repository.fetch_outbox(), [])
+
+    def test_queue_delivery_and_visibility(self):
+        self.queue.send_new_shippings([f"shipping_{i}" for i in range(15)])
+        self.assertEqual(self.queue.queue_backlog(), 15)
+        first = self.queue.receive_shipping_messages(10, wait_time=0)
+        self.assertEqual([message["Body"] for message in first], [f"shipping_{i}" for i in range(10)])
+        self.assertEqual(self.queue.queue_backlog(), 5)
+        rest = self.queue.receive_shipping_messages(10, wait_time=0, visibility_timeout=0)
+        self.assertEqual(len(rest), 5)
+        # A zero visibility timeout hands the same messages out again under new receipt handles.
+        again = self.queue.receive_shipping_messages(10, wait_time=0)
+        self.assertEqual([message["Body"] for message in again], [message["Body"] for message in rest])
+        self.assertTrue({message["ReceiptHandle"] for message in again}.isdisjoint(
+            message["ReceiptHandle"] for message in rest))
+        self.assertEqual(self.queue.delete_shippings([message["ReceiptHandle"] for message in first + again]), [])
+        self.assertEqual(self.queue.extend_visibility([], 30), [])
+        self.assertEqual(self.queue.receive_shipping_messages(10, wait_time=0), [])
+        self.assertEqual(self.queue.queue_backlog(), 0)
+
+    def test_extended_visibility_expires(self):
+        self.queue.send_new_shipping("shipping_1")
+        message = self.queue.receive_shipping_messages(1, wait_time=0)[0]
+        self.queue.extend_visibility([message["ReceiptHandle"]], 0)
+        self.assertEqual(self.queue.poll_shipping(), ["shipping_1"])
+
+    def test_concurrent_consumers_do_not_share_messages(self):
+        self.queue.send_new_shippings([f"shipping_{i}" for i in range(60)])
+        received = []
+
+        def consume():
+            while True:
+                messages = self.queue.receive_shipping_messages(7, wait_time=0)
+                if not messages:
+                    return
+                received.extend(message["Body"] for message in messages)
+
+        threads = [threading.Thread(target=consume) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(received), sorted(f"shipping_{i}" for i in range(60)))
+
+    def test_service_end_to_end(self):
+        shipping_ids = [self.service.create_shipping(SHIPPING_TYPE, ["A"], f"order_{i}", self.due(5))
+                        for i in range(5)]
+        self.assertEqual(self.queue.queue_backlog(), 5)
+        self.assertEqual(len(self.service.process_shipping_batch()), 5)
+        self.assertEqual({self.service.check_status(shipping_id) for shipping_id in shipping_ids},
+                         {ShippingService.SHIPPING_COMPLETED})
+        self.assertEqual(self.queue.queue_backlog(), 0)
+
+
+class TestMemoryBackend(BackendConformance, unittest.TestCase):
+    def create_backend(self):
+        return memory_backend()
+
+    def test_status_buckets_stay_sorted_across_updates(self):
+        ids = [self.repository.create_shipping(SHIPPING_TYPE, ["A"], f"order_{minutes}", "in progress",
+                                               self.due(minutes))
+               for minutes in (30, -10, 20, -5)]
+        self.repository.update_shipping_status(ids[1], "completed")
+        self.repository.update_shipping_status(ids[3], "completed")
+        self.repository.update_shipping_status(ids[1], "in progress")
+        buckets = self.repository.by_status
+        self.assertEqual(buckets["in progress"], sorted(buckets["in progress"]))
+        self.assertEqual([shipping_id for _, shipping_id in buckets["in progress"]], [ids[1], ids[2], ids[0]])
+        self.assertEqual([shipping_id for _, shipping_id in buckets["completed"]], [ids[3]])
+
+
+class TestSqliteBackend(BackendConformance, unittest.TestCase):
+    def create_backend(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        repository, queue = sqlite_backend(os.path.join(directory, "shipping.db"))
+        self.addCleanup(repository.database.close)
+        return repository, queue
+
+    def test_database_is_shared_between_connections(self):
+        self.queue.send_new_shipping("shipping_1")
+        other = SqliteShippingQueue(type(self.repository.database)(self.repository.database.path))
+        self.addCleanup(other.database.close)
+        self.assertEqual(other.database.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(other.poll_shipping(), ["shipping_1"])
+        self.assertEqual(self.queue.queue_backlog(), 0)
+
+
+class TestDynamoBackend(BackendConformance, unittest.TestCase):
+    def create_backend(self):
+        dynamo_resource, sqs_client = fake_backend()
+        return ShippingRepository(dynamo_resource), ShippingPublisher(sqs_client)
@@ -1,6 +1,6 @@
 import unittest
 from app.eshop import Product, ShoppingCart, Order
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 class TestProduct(unittest.TestCase):
     def setUp(self):
@@ -14,10 +14,10 @@ class TestProduct(unittest.TestCase):
 
     # Original tests
     def test_mock_add_product(self):
-        self.product.is_available = MagicMock()
-        self.cart.add_product(self.product, 12345)
-        self.product.is_available.assert_called_with(12345)
-        self.product.is_available.reset_mock()
+        with patch.object(Product, 'is_available', MagicMock()) as is_available:
+            self.cart.add_product(self.product, 12345)
+            is_available.assert_called_with(12345)
+            is_available.reset_mock()
 
     def test_add_available_amount(self):
         self.cart.add_product(self.product, 11)
@@ -0,0 +1,89 @@
+import tracemalloc
+import unittest
+
+from app.catalog import Catalog
+from app.eshop import Product, ShoppingCart, release_product
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.catalog = Catalog()
+        self.catalog.load((f'SKU-{i}', float(i), 10) for i in range(10000))
+
+    def test_lookup_by_name_and_id(self):
+        product = self.catalog.lookup('SKU-42')
+        self.assertEqual(product.price, 42.0)
+        self.assertEqual(self.catalog.get(product.product_id), product)
+        self.assertEqual(self.catalog.get(product.product_id).name, 'SKU-42')
+        self.assertIn('SKU-9999', self.catalog)
+        self.assertNotIn('SKU-10000', self.catalog)
+        self.assertEqual(len(self.catalog), 10000)
+
+    def test_removed_product_gives_its_slot_back(self):
+        slots = len(self.catalog.inventory.available)
+        self.catalog.remove('SKU-1')
+        self.assertNotIn('SKU-1', self.catalog)
+        self.catalog.add('SKU-new', 1.0, 1)
+        self.assertEqual(len(self.catalog.inventory.available), slots)
+        with self.assertRaises(KeyError):
+            self.catalog.remove('SKU-1')
+
+    def test_duplicate_name_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.catalog.add('SKU-1', 1.0, 1)
+
+    def test_products_are_keyed_by_id(self):
+        product = self.catalog.lookup('SKU-7')
+        self.assertEqual(hash(product), product.product_id)
+        self.assertEqual(product, self.catalog.lookup('SKU-7'))
+        self.assertNotEqual(product, self.catalog.lookup('SKU-8'))
+        # Ids are per catalog: a product of another catalog is a different product.
+        self.assertNotEqual(product, Catalog().add('SKU-7', 7.0, 1))
+
+    def test_standalone_products_with_the_same_name_are_equal(self):
+        first = Product(name='Standalone', price=1.0, available_amount=1)
+        second = Product(name='Standalone', price=2.0, available_amount=5)
+        self.assertEqual(first, second)
+        self.assertEqual((first.price, second.price, second.available_amount), (1.0, 2.0, 5))
+        release_product(first)
+        self.assertEqual(second.name, 'Standalone')
+        self.assertEqual(second, Product(name='Standalone', price=3.0, available_amount=1))
+
+    def test_product_is_a_view_without_a_dict(self):
+        self.assertEqual(set(Product.__slots__), {'catalog', 'row', 'product_id'})
+        self.assertFalse(hasattr(self.catalog.lookup('SKU-1'), '__dict__'))
+
+    def test_catalog_uses_less_memory_per_product_than_plain_objects(self):
+        class PlainProduct:
+            def __init__(self, name, price, available_amount):
+                self.name = name
+                self.price = price
+                self.available_amount = available_amount
+
+        count = 20000
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            plain = [PlainProduct(f'Plain-{i}', float(i), 10) for i in range(count)]
+            plain_size = tracemalloc.get_traced_memory()[0] - before
+            before = tracemalloc.get_traced_memory()[0]
+            catalog = Catalog()
+            catalog.load((f'Plain-{i}', float(i), 10) for i in range(count))
+            catalog_size = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        self.assertEqual((len(plain), len(catalog)), (count, count))
+        self.assertLess(catalog_size / count, plain_size / count)
+
+    def test_cart_uses_catalog_products(self):
+        cart = ShoppingCart()
+        cart.add_product(self.catalog.lookup('SKU-3'), 2)
+        cart.add_product(self.catalog.lookup('SKU-5'), 1)
+        self.assertTrue(cart.contains_product(self.catalog.lookup('SKU-3')))
+        self.assertEqual(cart.calculate_total(), 11.0)
+        self.assertEqual(cart.submit_cart_order(), ['SKU-3', 'SKU-5'])
+        self.assertEqual(self.catalog.lookup('SKU-3').available_amount, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
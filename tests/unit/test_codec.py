@@ -0,0 +1,95 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from services import codec
+from services.config import SHIPPING_TABLE_NAME
+from services.fake import fake_backend
+from services.repository import ShippingRepository
+from services.service import ShippingService
+
+DUE_DATE = datetime(2030, 1, 2, 3, 4, 5, 678000, tzinfo=timezone.utc)
+LEGACY_ITEM = {
+    "shipping_id": "legacy",
+    "shipping_type": "Нова Пошта",
+    "order_id": "order",
+    "product_ids": "A,B",
+    "shipping_status": "in progress",
+    "created_date": "2029-12-31T00:00:00+00:00",
+    "due_date": DUE_DATE.isoformat(),
+}
+
+
+class TestRecordCodec(unittest.TestCase):
+    def test_round_trip_keeps_commas_in_product_names(self):
+        item = codec.encode("id", "Нова Пошта", "order", "created", ["Pen, blue", "Ink"], DUE_DATE)
+        self.assertEqual(item["due_at"], 1893553445678)
+        record = codec.decode(item)
+        self.assertEqual(record.product_ids, ["Pen, blue", "Ink"])
+        self.assertEqual(record.due_date, DUE_DATE)
+        self.assertEqual(record.version, codec.RECORD_VERSION)
+
+    def test_reads_legacy_items(self):
+        record = codec.decode(LEGACY_ITEM)
+        self.assertEqual((record.product_ids, record.version), (["A", "B"], codec.LEGACY_VERSION))
+        self.assertEqual(record.due_at, codec.to_millis(DUE_DATE))
+        self.assertEqual(codec.decode(dict(LEGACY_ITEM, product_ids="")).product_ids, [])
+        upgraded = codec.decode(codec.upgrade(LEGACY_ITEM))
+        self.assertEqual((upgraded.product_ids, upgraded.created_at, upgraded.due_at, upgraded.version),
+                         (record.product_ids, record.created_at, record.due_at, codec.RECORD_VERSION))
+
+    def test_decimal_numbers_from_dynamodb(self):
+        item = codec.encode("id", "Нова Пошта", "order", "created", [], DUE_DATE)
+        item.update(due_at=Decimal(item["due_at"]), created_at=Decimal(item["created_at"]),
+                    record_version=Decimal(2))
+        self.assertEqual(codec.decode(item).due_at, 1893553445678)
+
+    def test_record_is_slotted_and_smaller(self):
+        record = codec.decode(LEGACY_ITEM)
+        self.assertFalse(hasattr(record, "__dict__"))
+        upgraded = codec.upgrade(LEGACY_ITEM)
+        self.assertLess(len(upgraded["product_ids"]) + len(str(upgraded["due_at"])),
+                        len(LEGACY_ITEM["product_ids"]) + len(LEGACY_ITEM["due_date"]))
+
+    def test_is_overdue_for_both_versions(self):
+        past = datetime.now(timezone.utc) - timedelta(seconds=1)
+        self.assertTrue(ShippingService.is_overdue(codec.encode("id", "t", "o", "s", [], past)))
+        self.assertTrue(ShippingService.is_overdue(dict(LEGACY_ITEM, due_date=past.isoformat())))
+        self.assertFalse(ShippingService.is_overdue(LEGACY_ITEM))
+
+    def test_migrate_legacy_items(self):
+        dynamo_resource, _ = fake_backend()
+        repository = ShippingRepository(dynamo_resource)
+        dynamo_resource.Table(SHIPPING_TABLE_NAME).put_item(Item=dict(LEGACY_ITEM))
+        repository.create_shipping("Нова Пошта", ["C"], "order", "in progress", DUE_DATE)
+        self.assertEqual(len(list(repository.iter_shippings_by_status("in progress"))), 1)
+        self.assertEqual(repository.migrate_shippings(), 1)
+        self.assertEqual(repository.migrate_shippings(), 0)
+        self.assertEqual(len(list(repository.iter_shippings_by_status("in progress"))), 2)
+        self.assertEqual(repository.get_record("legacy").product_ids, ["A", "B"])
+
+    def test_migration_keeps_a_concurrent_status_update(self):
+        dynamo_resource, _ = fake_backend()
+        repository = ShippingRepository(dynamo_resource)
+        table = dynamo_resource.Table(SHIPPING_TABLE_NAME)
+        table.put_item(Item=dict(LEGACY_ITEM))
+        table.put_item(Item=dict(LEGACY_ITEM, shipping_id="legacy_2"))
+        scan = repository.iter_shipments
+
+        def interleaved(*args, **kwargs):
+            for item in scan(*args, **kwargs):
+                if item["shipping_id"] == "legacy":
+                    repository.update_shipping_status("legacy", ShippingService.SHIPPING_COMPLETED)
+                yield item
+
+        with patch.object(repository, "iter_shipments", interleaved):
+            self.assertEqual(repository.migrate_shippings(), 1)
+        self.assertEqual(repository.get_record("legacy").shipping_status, ShippingService.SHIPPING_COMPLETED)
+        self.assertEqual(repository.migrate_shippings(), 1)
+        self.assertEqual(repository.get_record("legacy").shipping_status, ShippingService.SHIPPING_COMPLETED)
+        self.assertEqual(len(list(repository.iter_shippings_by_status(ShippingService.SHIPPING_COMPLETED))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
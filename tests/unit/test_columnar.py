@@ -0,0 +1,84 @@
+import math
+import random
+import unittest
+from unittest.mock import patch
+
+from app import columnar
+from app.columnar import ColumnarShoppingCart
+from app.eshop import Product, ShoppingCart
+
+
+class TestColumnarShoppingCart(unittest.TestCase):
+    def setUp(self):
+        self.products = [Product(name=f'Product_{i}', price=round(random.random() * 100, 2), available_amount=50)
+                         for i in range(1000)]
+        self.cart = ColumnarShoppingCart()
+
+    def test_total_is_maintained_across_edits(self):
+        reference = ShoppingCart()
+        for product in self.products:
+            amount = random.randint(1, 50)
+            self.cart.add_product(product, amount)
+            reference.add_product(product, amount)
+        for product in random.sample(self.products, 300):
+            self.cart.remove_product(product)
+            reference.remove_product(product)
+        for product in random.sample(self.products, 100):
+            self.cart.add_product(product, 7)
+            reference.add_product(product, 7)
+        self.assertAlmostEqual(self.cart.calculate_total(), reference.calculate_total(), places=4)
+        self.assertAlmostEqual(self.cart.recalculate_total(), reference.calculate_total(), places=6)
+        self.assertEqual(self.cart.products, reference.products)
+
+    def test_total_does_not_drift_after_removals(self):
+        large = Product(name='Large', price=1e16, available_amount=1)
+        small = Product(name='Small', price=1.5, available_amount=1)
+        self.cart.add_products([(large, 1), (small, 1)])
+        self.cart.remove_product(large)
+        self.assertEqual(self.cart.calculate_total(), 1.5)
+        self.cart.add_product(small, 1)
+        self.cart.add_product(self.products[0], 3)
+        self.assertEqual(self.cart.calculate_total(), math.fsum([1.5, self.products[0].price * 3]))
+
+    @unittest.skipIf(columnar.numpy is None, "numpy is not installed")
+    def test_numpy_total_matches_pure_python(self):
+        for product in self.products:
+            self.cart.add_product(product, random.randint(1, 50))
+        for product in random.sample(self.products, 300):
+            self.cart.remove_product(product)
+        with_numpy = self.cart.recalculate_total()
+        with patch.object(columnar, 'numpy', None):
+            pure_python = self.cart.recalculate_total()
+        self.assertAlmostEqual(with_numpy, pure_python, delta=abs(pure_python) * 1e-12)
+        self.assertEqual(self.cart.calculate_total(), pure_python)
+
+    def test_bulk_add_validates_all_lines_first(self):
+        self.products[1].buy(50)
+        with self.assertRaises(ValueError):
+            self.cart.add_products([(self.products[0], 1), (self.products[1], 1)])
+        self.assertEqual(len(self.cart), 0)
+        self.cart.add_products((product, 2) for product in self.products[2:12])
+        self.assertAlmostEqual(self.cart.calculate_total(), sum(p.price * 2 for p in self.products[2:12]))
+
+    def test_reprice_uses_current_prices(self):
+        self.cart.add_products([(self.products[0], 2), (self.products[1], 3)])
+        self.products[0].price = 10.0
+        self.products[1].price = 1.0
+        self.assertEqual(self.cart.reprice(), 23.0)
+
+    def test_submit_order_buys_products_and_clears_cart(self):
+        self.cart.add_products([(self.products[0], 5), (self.products[1], 50)])
+        self.assertEqual(self.cart.submit_cart_order(), ['Product_0', 'Product_1'])
+        self.assertEqual(self.products[0].available_amount, 45)
+        self.assertEqual(self.products[1].available_amount, 0)
+        self.assertEqual(self.cart.products, {})
+        self.assertEqual(self.cart.calculate_total(), 0.0)
+
+    def test_shopping_cart_bulk_add(self):
+        cart = ShoppingCart()
+        cart.add_products([(self.products[0], 1), (self.products[1], 2)])
+        self.assertEqual(cart.products, {self.products[0]: 1, self.products[1]: 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
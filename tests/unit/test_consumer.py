@@ -0,0 +1,92 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from services.consumer import AdaptiveConsumer
+from services.fake import fake_backend
+from services.processor import ShippingProcessor
+from services.publisher import ShippingPublisher
+
+
+class TestAdaptiveConsumer(unittest.TestCase):
+    def setUp(self):
+        _, sqs_client = fake_backend()
+        self.sqs_client = MagicMock(wraps=sqs_client)
+        self.publisher = ShippingPublisher(self.sqs_client)
+
+    def test_receive_does_not_request_message_attributes(self):
+        self.publisher.send_new_shipping("shipping_1")
+        self.publisher.receive_shipping_messages(10, wait_time=0)
+        self.assertNotIn("MessageAttributeNames", self.sqs_client.receive_message.call_args.kwargs)
+
+    def test_queue_backlog(self):
+        self.publisher.send_new_shippings([f"shipping_{i}" for i in range(7)])
+        self.assertEqual(self.publisher.queue_backlog(), 7)
+
+    def test_batch_size_and_wait_follow_backlog(self):
+        consumer = AdaptiveConsumer(self.publisher, pollers=2, min_wait=0, max_wait=20)
+        self.assertEqual((consumer.batch_size(), consumer.wait_time()), (10, 20))
+        self.publisher.send_new_shippings([f"shipping_{i}" for i in range(6)])
+        consumer.refresh_backlog()
+        self.assertEqual((consumer.batch_size(), consumer.wait_time()), (3, 0))
+        self.assertEqual(len(consumer.poll()), 3)
+
+    def test_empty_receives_are_counted(self):
+        consumer = AdaptiveConsumer(self.publisher, pollers=1, min_wait=0, max_wait=0)
+        self.publisher.send_new_shippings([f"shipping_{i}" for i in range(4)])
+        consumer.refresh_backlog()
+        consumer.poll()
+        consumer.poll()
+        stats = consumer.stats()
+        self.assertEqual((stats["receives"], stats["empty_receives"], stats["messages"]), (2, 1, 4))
+        self.assertEqual(stats["messages_per_call"], 2.0)
+
+    def test_processor_consumes_through_pollers(self):
+        self.publisher.send_new_shippings([f"shipping_{i}" for i in range(30)])
+        service = MagicMock(publisher=self.publisher)
+        service.repository.get_shippings.return_value = {}
+        consumer = AdaptiveConsumer(self.publisher, pollers=3, min_wait=0, max_wait=0)
+        processor = ShippingProcessor(service, workers=4, wait_time=0.05, consumer=consumer)
+        thread = threading.Thread(target=processor.run)
+        thread.start()
+        deadline = time.monotonic() + 5
+        while processor.stats()["processed"] < 30 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        processor.stop()
+        thread.join()
+        self.assertEqual(processor.stats()["processed"], 30)
+        self.assertEqual(processor.stats()["consumer"]["messages"], 30)
+        self.assertEqual(self.publisher.queue_backlog(), 0)
+        self.assertEqual(self.sqs_client.get_queue_attributes.call_args.kwargs["AttributeNames"],
+                         ["ApproximateNumberOfMessages"])
+
+    def test_slow_worker_never_gets_an_expired_message(self):
+        self.publisher.send_new_shippings([f"shipping_{i}" for i in range(100)])
+        visible = []
+        service = MagicMock(publisher=self.publisher)
+        service.repository.get_shippings.return_value = {}
+
+        def process(shipping_id, shipping=None):
+            time.sleep(0.1)
+            with processor.condition:
+                visible.extend(visible_until > time.monotonic() for visible_until in processor.in_flight.values())
+
+        service.process_shipping.side_effect = process
+        consumer = AdaptiveConsumer(self.publisher, pollers=2, min_wait=0, max_wait=0, visibility_timeout=1)
+        processor = ShippingProcessor(service, workers=1, wait_time=0.05, visibility_timeout=1, consumer=consumer)
+        thread = threading.Thread(target=processor.run)
+        thread.start()
+        time.sleep(2.5)
+        processor.stop()
+        thread.join()
+        self.assertTrue(visible)
+        self.assertTrue(all(visible))
+        self.assertEqual(self.sqs_client.receive_message.call_args.kwargs["VisibilityTimeout"], 1)
+        # One worker finishes about 10 messages per second; two of them are in flight.
+        self.assertLessEqual(consumer.stats()["buffer_limit"], 10)
+        self.assertGreater(consumer.stats()["expired"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
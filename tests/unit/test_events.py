@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import socket
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from services.events import BrokerBridge, EventBroker, StatusEventBus
+from services.fake import fake_backend
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.service import ShippingService
+
+
+def publish_from_child(address, ready):
+    bus = StatusEventBus()
+    bridge = BrokerBridge(bus, address)
+    ready.wait(5)
+    bus.publish("remote", ShippingService.SHIPPING_COMPLETED)
+    time.sleep(0.2)
+    bridge.close()
+
+
+class TestStatusEvents(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.repository = ShippingRepository(dynamo_resource)
+        self.service = ShippingService(self.repository, ShippingPublisher(sqs_client))
+        self.due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    def test_callback_receives_transitions_for_subscribed_ids(self):
+        shipping_ids = [self.service.create_shipping("Нова Пошта", ["Product"], f"order_{i}", self.due_date)
+                        for i in range(3)]
+        events = []
+        everything = []
+        subscription = self.service.subscribe(shipping_ids[:2], events.append)
+        self.service.subscribe(None, everything.append)
+        self.assertEqual(len(self.service.process_shipping_batch()), 3)
+        subscription.cancel()
+        self.service.process_shipping(shipping_ids[0])
+        self.assertEqual(sorted((event.shipping_id, event.status) for event in events),
+                         sorted((shipping_id, ShippingService.SHIPPING_COMPLETED) for shipping_id in shipping_ids[:2]))
+        self.assertEqual(len(everything), 3)
+        self.assertEqual(self.service.events.subscriptions.keys(), {None})
+
+    def test_failing_subscriber_does_not_break_processing(self):
+        shipping_id = self.service.create_shipping("Нова Пошта", ["Product"], "order", self.due_date)
+        self.service.subscribe([shipping_id], MagicMock(side_effect=RuntimeError))
+        self.assertIsNotNone(self.service.complete_shipping(shipping_id))
+
+    def test_wait_for_status_without_polling(self):
+        shipping_id = self.service.create_shipping("Нова Пошта", ["Product"], "order", self.due_date)
+        self.repository.get_shipping = MagicMock(wraps=self.repository.get_shipping)
+        threading.Timer(0.05, self.service.complete_shipping, args=(shipping_id,)).start()
+        status = self.service.wait_for_status(shipping_id, {ShippingService.SHIPPING_COMPLETED}, timeout=5)
+        self.assertEqual(status, ShippingService.SHIPPING_COMPLETED)
+        self.assertEqual(self.repository.get_shipping.call_count, 2)
+        self.assertIsNone(self.service.wait_for_status(shipping_id, {ShippingService.SHIPPING_FAILED}, timeout=0.01))
+
+    def test_async_stream(self):
+        async def consume():
+            stream = self.service.stream_statuses()
+            shipping_id = self.service.create_shipping("Нова Пошта", ["Product"], "order", self.due_date)
+            await asyncio.get_running_loop().run_in_executor(None, self.service.complete_shipping, shipping_id)
+            statuses = [(await stream.__anext__()).status for _ in range(2)]
+            stream.cancel()
+            return statuses
+
+        self.assertEqual(asyncio.run(consume()), [ShippingService.SHIPPING_IN_PROGRESS,
+                                                  ShippingService.SHIPPING_COMPLETED])
+
+    def test_stream_outside_a_coroutine_needs_a_loop(self):
+        with self.assertRaises(RuntimeError):
+            self.service.stream_statuses()
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        self.service.events.stream(loop=loop).cancel()
+
+    def test_unreachable_broker_keeps_events_local(self):
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        address = server.getsockname()
+        server.close()
+        self.assertIsNone(self.service.connect_event_broker(address))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "relies on fork")
+    def test_broker_fans_out_across_processes(self):
+        broker = EventBroker(("127.0.0.1", 0)).start()
+        bus = StatusEventBus()
+        bridge = BrokerBridge(bus, broker.server_address)
+        received = threading.Event()
+        bus.subscribe(["remote"], lambda event: received.set())
+        deadline = time.monotonic() + 5
+        while not broker.clients and time.monotonic() < deadline:
+            time.sleep(0.01)
+        ready = multiprocessing.Event()
+        child = multiprocessing.Process(target=publish_from_child, args=(broker.server_address, ready))
+        child.start()
+        ready.set()
+        self.assertTrue(received.wait(5))
+        child.join(5)
+        bridge.close()
+        broker.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
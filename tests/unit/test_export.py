@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+from boto3.dynamodb.conditions import Attr
+
+from services.config import SHIPPING_TABLE_NAME
+from services.export import export_shipments, write_csv, write_jsonl
+from services.fake import fake_backend
+from services.models import ShippingRequest
+from services.repository import ShippingRepository
+
+
+class TestShipmentExport(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, _ = fake_backend()
+        self.table = MagicMock(wraps=dynamo_resource.Table(SHIPPING_TABLE_NAME))
+        self.repository = ShippingRepository(dynamo_resource)
+        self.repository.table = self.table
+        due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+        requests = [ShippingRequest("Нова Пошта", ["A", "B"], f"order_{i}", due_date) for i in range(200)]
+        self.repository.create_shippings(requests, "in progress")
+        self.repository.create_shippings(requests[:50], "completed")
+
+    def test_sequential_scan_streams_pages(self):
+        shipments = self.repository.iter_shipments(page_size=40)
+        self.table.scan.assert_not_called()
+        self.assertEqual(len(list(shipments)), 250)
+        self.assertEqual(self.table.scan.call_count, 7)
+
+    def test_parallel_segments_cover_table_once(self):
+        shipments = list(self.repository.iter_shipments(segments=4, page_size=10))
+        self.assertEqual(len({shipment["shipping_id"] for shipment in shipments}), 250)
+        self.assertEqual(len(shipments), 250)
+        self.assertEqual({call.kwargs["TotalSegments"] for call in self.table.scan.call_args_list}, {4})
+
+    def test_filter_and_early_close(self):
+        completed = list(self.repository.iter_shipments(filter=Attr("shipping_status").eq("completed"), segments=3))
+        self.assertEqual(len(completed), 50)
+        shipments = self.repository.iter_shipments(segments=4, page_size=5)
+        next(shipments)
+        shipments.close()
+
+    def test_writers_handle_decimal(self):
+        items = [{"shipping_id": "a", "weight": Decimal("1.5"), "count": Decimal("3"), "product_ids": ["x, 1", "y"]}]
+        stream = io.StringIO()
+        self.assertEqual(write_jsonl(items, stream), 1)
+        self.assertEqual(json.loads(stream.getvalue()), {"shipping_id": "a", "weight": 1.5, "count": 3,
+                                                         "product_ids": ["x, 1", "y"]})
+        stream = io.StringIO()
+        write_csv(items, stream, fields=("shipping_id", "count", "product_ids"))
+        rows = list(csv.DictReader(io.StringIO(stream.getvalue())))
+        self.assertEqual(rows, [{"shipping_id": "a", "count": "3", "product_ids": '["x, 1", "y"]'}])
+        self.assertEqual(json.loads(rows[0]["product_ids"]), ["x, 1", "y"])
+
+    def test_export_to_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "shipments.csv")
+            self.assertEqual(export_shipments(self.repository, path, "csv", segments=2), 250)
+            with open(path, encoding="utf-8") as stream:
+                rows = list(csv.DictReader(stream))
+        self.assertEqual(len(rows), 250)
+        self.assertEqual(json.loads(rows[0]["product_ids"]), ["A", "B"])
+        with self.assertRaises(ValueError):
+            export_shipments(self.repository, "unused", "xml")
+
+
+if __name__ == '__main__':
+    unittest.main()
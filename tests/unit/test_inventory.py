@@ -0,0 +1,86 @@
+import threading
+import unittest
+
+from app.catalog import Catalog
+from app.eshop import ShoppingCart, release_product
+from app.inventory import Inventory
+
+
+class TestInventory(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.inventory = Inventory(stripes=4, reservation_ttl=60, clock=lambda: self.now)
+        self.catalog = Catalog(self.inventory)
+        self.product = self.catalog.add('Product', 10.0, 100)
+
+    def test_concurrent_checkouts_never_oversell(self):
+        sold = []
+
+        def checkout():
+            cart = ShoppingCart()
+            for _ in range(20):
+                try:
+                    cart.add_product(self.product, 3)
+                    cart.submit_cart_order()
+                    sold.append(3)
+                except ValueError:
+                    pass
+
+        threads = [threading.Thread(target=checkout) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.product.available_amount, 100 - sum(sold))
+        self.assertGreaterEqual(self.product.available_amount, 0)
+        self.assertEqual(sum(sold), 99)
+
+    def test_cart_order_is_all_or_nothing(self):
+        scarce = self.catalog.add('Scarce', 1.0, 1)
+        cart = ShoppingCart()
+        cart.add_product(self.product, 10)
+        cart.add_product(scarce, 1)
+        scarce.buy(1)
+        with self.assertRaises(ValueError):
+            cart.submit_cart_order()
+        self.assertEqual(self.product.available_amount, 100)
+        self.assertTrue(cart.contains_product(self.product))
+
+    def test_reservation_holds_stock_until_released(self):
+        reservation_id = self.inventory.reserve({self.product.stock_slot: 40})
+        self.assertEqual(self.product.available_amount, 60)
+        self.assertFalse(self.product.is_available(61))
+        self.inventory.release(reservation_id)
+        self.assertEqual(self.product.available_amount, 100)
+
+    def test_expired_reservation_returns_stock_and_cannot_be_committed(self):
+        reservation_id = self.inventory.reserve({self.product.stock_slot: 40})
+        self.now = 61
+        self.assertEqual(self.inventory.expire_reservations(), [reservation_id])
+        self.assertEqual(self.product.available_amount, 100)
+        with self.assertRaises(ValueError):
+            self.inventory.commit(reservation_id)
+
+    def test_buy_more_than_available_fails(self):
+        with self.assertRaises(ValueError):
+            self.product.buy(101)
+        self.assertEqual(self.product.available_amount, 100)
+
+    def test_released_products_free_their_slots_and_names(self):
+        for i in range(100):
+            release_product(self.catalog.add(f'Throwaway-{i}', 1.0, 1))
+        self.assertEqual((len(self.catalog), len(self.inventory)), (1, 1))
+        self.assertLessEqual(len(self.inventory.available), 2)
+        self.assertLessEqual(len(self.catalog.names), 2)
+
+    def test_slot_held_by_a_reservation_is_freed_when_it_closes(self):
+        product = self.catalog.add('Reserved', 1.0, 5)
+        reservation_id = self.inventory.reserve({product.stock_slot: 2})
+        slot = product.stock_slot
+        release_product(product)
+        self.assertNotIn(slot, self.inventory.free_slots)
+        self.inventory.release(reservation_id)
+        self.assertIn(slot, self.inventory.free_slots)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import random
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from services.config import SHIPPING_TABLE_NAME
+from services.fake import fake_backend
+from services.metrics import Histogram, disable_instrumentation, enable_instrumentation
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.service import ShippingService
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentiles_within_bucket_precision(self):
+        histogram = Histogram()
+        values = sorted(random.randint(1, 10_000_000) for _ in range(20000))
+        for value in values:
+            histogram.record(value / 1_000_000)
+        for fraction in (0.5, 0.9, 0.99):
+            expected = values[int(fraction * len(values)) - 1]
+            self.assertAlmostEqual(histogram.percentile(fraction) / expected, 1, delta=0.05)
+        self.assertEqual(histogram.snapshot()["count"], 20000)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.service = ShippingService(ShippingRepository(dynamo_resource), ShippingPublisher(sqs_client))
+        self.due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    def test_records_service_operations_and_client_calls_once(self):
+        metrics = enable_instrumentation(self.service)
+        shipping_id = self.service.create_shipping("Нова Пошта", ["Product"], "order", self.due_date)
+        self.service.process_shipping_batch()
+        snapshot = metrics.snapshot()
+        for name in ("service.create_shipping", "dynamodb.put_item", "sqs.send_message", "sqs.receive_message",
+                     "dynamodb.batch_get_item", "service.process_shipping_batch", "service.process_shipping"):
+            self.assertEqual(snapshot[name]["count"], 1, name)
+        self.assertEqual(snapshot["dynamodb.update_item"]["count"], 2)
+        # Repository, publisher and service helpers only forward to the calls above.
+        self.assertEqual({name for name in snapshot if name.split(".")[0] not in ("service", "dynamodb", "sqs")},
+                         set())
+        self.assertNotIn("service.complete_shipping", snapshot)
+        self.assertEqual(self.service.check_status(shipping_id), ShippingService.SHIPPING_COMPLETED)
+
+    def test_error_rate_and_spans(self):
+        metrics = enable_instrumentation(self.service)
+        spans = []
+        metrics.add_span_listener(spans.append)
+        with self.assertRaises(ValueError):
+            self.service.create_shipping("Новий тип доставки", [], "order", self.due_date)
+        self.service.create_shipping("Нова Пошта", [], "order", self.due_date)
+        snapshot = metrics.snapshot()["service.create_shipping"]
+        self.assertEqual((snapshot["count"], snapshot["errors"], snapshot["error_rate"]), (2, 1, 0.5))
+        parents = {span.name: span.parent for span in spans}
+        self.assertEqual(parents["dynamodb.put_item"], "service.create_shipping")
+        self.assertEqual(parents["sqs.send_message"], "service.create_shipping")
+        self.assertIsNone(parents["service.create_shipping"])
+
+    def test_services_sharing_clients_keep_their_own_metrics(self):
+        repository, publisher = self.service.repository, self.service.publisher
+        other = ShippingService(ShippingRepository(repository.dynamo_resource), ShippingPublisher(publisher.client))
+        metrics, other_metrics = enable_instrumentation(self.service), enable_instrumentation(other)
+        self.assertNotIn("put_item", vars(repository.dynamo_resource.Table(SHIPPING_TABLE_NAME)))
+        self.service.create_shipping("Нова Пошта", [], "order", self.due_date)
+        other.create_shipping("Нова Пошта", [], "order", self.due_date)
+        other.create_shipping("Нова Пошта", [], "order", self.due_date)
+        self.assertEqual(metrics.snapshot()["dynamodb.put_item"]["count"], 1)
+        self.assertEqual(other_metrics.snapshot()["dynamodb.put_item"]["count"], 2)
+        disable_instrumentation(self.service)
+        other.create_shipping("Нова Пошта", [], "order", self.due_date)
+        self.assertEqual(other_metrics.snapshot()["dynamodb.put_item"]["count"], 3)
+
+    def test_disable_removes_wrappers(self):
+        metrics = enable_instrumentation(self.service)
+        disable_instrumentation(self.service)
+        self.service.create_shipping("Нова Пошта", [], "order", self.due_date)
+        self.assertEqual(metrics.snapshot(), {})
+        self.assertNotIn("create_shipping", vars(self.service))
+        self.assertNotIn("put_item", vars(self.service.repository.table))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from services.config import OUTBOX_TABLE_NAME
+from services.fake import fake_backend
+from services.outbox import OutboxRelay
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.service import ShippingService
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.outbox = dynamo_resource.Table(OUTBOX_TABLE_NAME)
+        self.sqs_client = MagicMock(wraps=sqs_client)
+        self.repository = ShippingRepository(dynamo_resource)
+        self.publisher = ShippingPublisher(self.sqs_client)
+        self.service = ShippingService(self.repository, self.publisher, use_outbox=True)
+        self.due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    def create(self, count):
+        return [self.service.create_shipping("Нова Пошта", ["Product"], f"order_{i}", self.due_date)
+                for i in range(count)]
+
+    def test_create_shipping_does_not_touch_the_queue(self):
+        shipping_ids = self.create(3)
+        self.sqs_client.send_message.assert_not_called()
+        self.assertEqual(set(self.outbox.items), set(shipping_ids))
+        self.assertEqual(self.service.check_status(shipping_ids[0]), ShippingService.SHIPPING_IN_PROGRESS)
+
+    def test_relay_publishes_in_batches_of_10_and_clears_outbox(self):
+        shipping_ids = self.create(25)
+        relay = OutboxRelay(self.repository, self.publisher)
+        self.assertEqual(relay.drain_once(), 25)
+        batches = [call.kwargs["Entries"] for call in self.sqs_client.send_message_batch.call_args_list]
+        self.assertEqual(sorted(len(batch) for batch in batches), [5, 10, 10])
+        self.assertEqual(self.outbox.items, {})
+        received = self.publisher.receive_shipping_messages(10, wait_time=0)
+        received += self.publisher.receive_shipping_messages(10, wait_time=0)
+        received += self.publisher.receive_shipping_messages(10, wait_time=0)
+        self.assertEqual(sorted(message["Body"] for message in received), sorted(shipping_ids))
+
+    def test_failed_publish_keeps_events_and_backs_off(self):
+        self.create(2)
+        self.sqs_client.send_message_batch.side_effect = RuntimeError("SQS is down")
+        relay = OutboxRelay(self.repository, self.publisher, interval=0.01)
+        with self.assertRaises(RuntimeError):
+            relay.drain_once()
+        self.assertEqual(len(self.outbox.items), 2)
+        relay.failures = 3
+        self.assertLessEqual(relay.backoff(), 0.08)
+        self.assertGreaterEqual(relay.backoff(), 0.04)
+
+    def test_transactional_order_goes_through_outbox(self):
+        shipping_id = self.service.place_order_transaction("Нова Пошта", {}, "order", self.due_date)
+        self.sqs_client.send_message.assert_not_called()
+        self.assertEqual(set(self.outbox.items), {shipping_id})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+from services.fake import fake_backend
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.resilience import (AdaptiveRateLimiter, CircuitBreaker, CircuitOpenError, ResilienceLayer, RetryPolicy,
+                                 disable_resilience, enable_resilience)
+from services.service import ShippingService
+
+
+def client_error(code, operation):
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+class TestResilience(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.repository = ShippingRepository(dynamo_resource)
+        self.publisher = ShippingPublisher(sqs_client)
+        self.service = ShippingService(self.repository, self.publisher)
+        self.due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+        self.now = 0.0
+        clock = lambda: self.now
+        self.layer = ResilienceLayer(
+            dynamodb=RetryPolicy("dynamodb", max_attempts=3, breaker=CircuitBreaker(3, 10, clock), sleep=lambda _: None),
+            sqs=RetryPolicy("sqs", max_attempts=2, breaker=CircuitBreaker(2, 10, clock), sleep=lambda _: None))
+        self.addCleanup(self.layer.close)
+
+    def create(self):
+        return self.service.create_shipping("Нова Пошта", ["Product"], "order", self.due_date)
+
+    def test_throttled_write_is_retried(self):
+        put_item = self.repository.table.put_item
+        errors = [client_error("ProvisionedThroughputExceededException", "PutItem")]
+
+        def flaky_put_item(**kwargs):
+            if errors:
+                raise errors.pop()
+            return put_item(**kwargs)
+
+        self.repository.table.put_item = flaky_put_item
+        enable_resilience(self.service, self.layer)
+        self.assertEqual(self.service.check_status(self.create()), ShippingService.SHIPPING_IN_PROGRESS)
+        stats = self.layer.stats()["dynamodb"]
+        self.assertEqual((stats["retries"], stats["throttles"], stats["state"]), (1, 1, "closed"))
+        self.assertLess(stats["rate"], 1000.0)
+
+    def test_conditional_failures_are_not_retried(self):
+        enable_resilience(self.service, self.layer)
+        shipping_id = self.create()
+        self.assertIsNone(self.repository.update_shipping_status(shipping_id, ShippingService.SHIPPING_FAILED,
+                                                                 expected_status=ShippingService.SHIPPING_CREATED))
+        self.assertEqual(self.layer.stats()["dynamodb"]["retries"], 0)
+
+    def test_breaker_fails_fast_then_recovers(self):
+        self.repository.table.get_item = MagicMock(side_effect=client_error("InternalServerError", "GetItem"))
+        enable_resilience(self.service, self.layer)
+        # Each call retries three times and counts as one failure; the third one opens the circuit.
+        for calls in (3, 6, 9):
+            with self.assertRaises(ClientError):
+                self.repository.get_shipping("missing")
+            self.assertEqual(self.repository.table.get_item.__wrapped__.call_count, calls)
+        with self.assertRaises(CircuitOpenError):
+            self.repository.get_shipping("missing")
+        self.assertEqual(self.repository.table.get_item.__wrapped__.call_count, 9)
+        self.repository.table.get_item.__wrapped__.side_effect = None
+        self.repository.table.get_item.__wrapped__.return_value = {}
+        self.now = 10
+        self.assertIsNone(self.repository.get_shipping("missing"))
+        stats = self.layer.stats()["dynamodb"]
+        self.assertEqual((stats["trips"], stats["rejected"], stats["state"]), (1, 1, "closed"))
+
+    def test_open_sqs_circuit_buffers_sends_and_replays(self):
+        send_message = self.publisher.client.send_message
+        self.publisher.client.send_message = MagicMock(side_effect=client_error("ServiceUnavailable", "SendMessage"))
+        enable_resilience(self.service, self.layer)
+        first = self.create()
+        second = self.create()
+        self.assertEqual(self.layer.stats()["buffered"], 2)
+        self.assertEqual(self.service.check_status(second), ShippingService.SHIPPING_IN_PROGRESS)
+        replayed_on = []
+        self.publisher.client.send_message.__wrapped__.side_effect = \
+            lambda **kwargs: replayed_on.append(threading.current_thread()) or send_message(**kwargs)
+        self.now = 10
+        self.publisher.queue_backlog()
+        deadline = time.monotonic() + 5
+        while self.layer.stats()["buffered"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.layer.stats()["buffered"], 0)
+        self.assertEqual(set(replayed_on), {self.layer.drainer})
+        bodies = [message["Body"] for message in self.publisher.receive_shipping_messages(10, wait_time=0)]
+        self.assertEqual(sorted(bodies), sorted([first, second]))
+        disable_resilience(self.service)
+        self.assertFalse(hasattr(self.publisher.client.send_message, "__wrapped_by_resilience__"))
+
+    def test_failed_half_open_probe_reopens_without_retries(self):
+        breaker = CircuitBreaker(1, 10, lambda: self.now)
+        policy = RetryPolicy("dynamodb", max_attempts=3, breaker=breaker, sleep=lambda _: None)
+        function = MagicMock(side_effect=client_error("InternalServerError", "GetItem"))
+        with self.assertRaises(ClientError):
+            policy.call("get_item", function)
+        self.assertEqual((function.call_count, breaker.state), (3, CircuitBreaker.OPEN))
+        self.now = 10
+        with self.assertRaises(ClientError):
+            policy.call("get_item", function)
+        self.assertEqual((function.call_count, breaker.state), (4, CircuitBreaker.OPEN))
+
+    def test_replay_counts_only_calls_that_were_sent(self):
+        sent = []
+
+        def send_message(**kwargs):
+            if sent:
+                raise client_error("ServiceUnavailable", "SendMessage")
+            sent.append(kwargs["MessageBody"])
+            return {"MessageId": "sent"}
+
+        self.publisher.client.send_message = send_message
+        enable_resilience(self.service, self.layer)
+        self.layer.buffer.divert("send_message", QueueUrl="queue", MessageBody="first")
+        self.layer.buffer.divert("send_message", QueueUrl="queue", MessageBody="second")
+        # The failed replay would otherwise be diverted back into the buffer and counted as sent.
+        self.assertEqual(self.layer.flush(), 1)
+        self.assertEqual((sent, len(self.layer.buffer)), (["first"], 1))
+        self.assertEqual(self.layer.buffer.calls[0][1]["MessageBody"], "second")
+
+    def test_order_transactions_are_protected(self):
+        self.repository.set_product_stock({"Product": 1})
+        transact_write_items = self.repository.dynamo_client.transact_write_items
+        errors = [client_error("ThrottlingException", "TransactWriteItems")]
+
+        def flaky_transact_write_items(**kwargs):
+            if errors:
+                raise errors.pop()
+            return transact_write_items(**kwargs)
+
+        self.repository.dynamo_client.transact_write_items = flaky_transact_write_items
+        enable_resilience(self.service, self.layer)
+        self.service.place_order_transaction("Нова Пошта", {"Product": 1}, "order", self.due_date)
+        self.assertEqual(self.layer.stats()["dynamodb"]["throttles"], 1)
+
+    def test_layer_only_wraps_its_own_service(self):
+        other = ShippingService(ShippingRepository(self.repository.dynamo_resource),
+                                ShippingPublisher(self.publisher.client))
+        enable_resilience(self.service, self.layer)
+        self.assertNotIn("put_item", vars(other.repository.table))
+        other.create_shipping("Нова Пошта", ["Product"], "order", self.due_date)
+        self.assertEqual(self.layer.stats()["dynamodb"]["calls"], 0)
+        self.create()
+        self.assertGreater(self.layer.stats()["dynamodb"]["calls"], 0)
+        disable_resilience(self.service)
+        self.assertIs(self.repository.table, other.repository.table)
+
+    def test_rate_limiter_backs_off_multiplicatively(self):
+        slept = []
+        limiter = AdaptiveRateLimiter(rate=8, min_rate=1, max_rate=8, clock=lambda: 0.0, sleep=slept.append)
+        limiter.on_throttle()
+        limiter.on_throttle()
+        self.assertEqual(limiter.rate, 2)
+        limiter.on_success()
+        self.assertEqual(limiter.rate, 3)
+        limiter.tokens = 0
+        limiter.clock = lambda: 1.0 + len(slept)
+        limiter.acquire()
+        self.assertEqual(len(slept), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
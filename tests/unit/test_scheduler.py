@@ -0,0 +1,90 @@
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from services.fake import fake_backend
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.scheduler import DeadlineScheduler
+from services.service import ShippingService
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+    def setUp(self):
+        self.expired = []
+        self.scheduler = DeadlineScheduler(self.expired.append, clock=lambda: 1000.0)
+
+    def test_fires_in_deadline_order(self):
+        self.scheduler.schedule("late", 30)
+        self.scheduler.schedule("early", 10)
+        self.scheduler.schedule("future", 2000)
+        self.assertEqual(self.scheduler.run_pending(), ["early", "late"])
+        self.assertEqual(len(self.scheduler), 1)
+
+    def test_cancelled_and_rescheduled_deadlines(self):
+        self.scheduler.schedule("cancelled", 10)
+        self.scheduler.schedule("moved", 10)
+        self.scheduler.cancel("cancelled")
+        self.scheduler.schedule("moved", 2000)
+        self.assertEqual(self.scheduler.run_pending(), [])
+        self.assertEqual(self.scheduler.run_pending(now=2000), ["moved"])
+
+    def test_many_timers_without_threads(self):
+        for i in range(200000):
+            self.scheduler.schedule(str(i), i % 2000)
+        for i in range(0, 200000, 2):
+            self.scheduler.cancel(str(i))
+        fired = self.scheduler.run_pending()
+        self.assertEqual(len(fired), 50000)
+        self.assertTrue(all(int(shipping_id) % 2 for shipping_id in fired))
+
+    def test_failed_callback_is_retried(self):
+        scheduler = DeadlineScheduler(MagicMock(side_effect=RuntimeError), clock=lambda: 1000.0)
+        scheduler.schedule("a", 10)
+        self.assertEqual(scheduler.run_pending(), [])
+        self.assertEqual(scheduler.deadlines["a"], 1000.0 + DeadlineScheduler.RETRY_DELAY)
+
+    def test_background_thread_fires_at_deadline(self):
+        scheduler = DeadlineScheduler(self.expired.append)
+        scheduler.start()
+        scheduler.schedule("a", time.time() + 0.05)
+        deadline = time.monotonic() + 2
+        while not self.expired and time.monotonic() < deadline:
+            time.sleep(0.01)
+        scheduler.stop()
+        self.assertEqual(self.expired, ["a"])
+
+
+class TestShippingExpiry(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.service = ShippingService(ShippingRepository(dynamo_resource), ShippingPublisher(sqs_client))
+        self.due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    def test_pending_shipments_are_loaded_and_failed_at_deadline(self):
+        shipping_ids = self.service.create_shippings_bulk(
+            [("Нова Пошта", ["Product"], f"order_{i}", self.due_date) for i in range(3)])
+        self.service.complete_shipping(shipping_ids[0])
+        scheduler = DeadlineScheduler.for_service(self.service, start=False)
+        self.assertEqual(len(scheduler), 2)
+
+        fired = scheduler.run_pending(now=self.due_date.timestamp() + 1)
+        self.assertEqual(sorted(fired), sorted(shipping_ids[1:]))
+        self.assertEqual(self.service.check_statuses(shipping_ids), {
+            shipping_ids[0]: ShippingService.SHIPPING_COMPLETED,
+            shipping_ids[1]: ShippingService.SHIPPING_FAILED,
+            shipping_ids[2]: ShippingService.SHIPPING_FAILED,
+        })
+
+    def test_completed_shipment_is_not_expired(self):
+        scheduler = DeadlineScheduler.for_service(self.service, start=False)
+        shipping_id = self.service.create_shipping("Нова Пошта", ["Product"], "order", self.due_date)
+        self.assertEqual(len(scheduler), 1)
+        self.service.complete_shipping(shipping_id)
+        self.assertEqual(scheduler.run_pending(now=self.due_date.timestamp() + 1), [])
+        self.assertEqual(self.service.check_status(shipping_id), ShippingService.SHIPPING_COMPLETED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,485 @@
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+from app.eshop import Order, Product, ShoppingCart
+from services import clients
+from services.cache import CachedShippingRepository, RecentIds, ShippingCache
+from services.config import AWS_MAX_POOL_CONNECTIONS, PRODUCT_TABLE_NAME, SHIPPING_QUEUE, SHIPPING_TABLE_NAME
+from services.fake import fake_backend
+from services.models import ShippingRequest
+from services.processor import ShippingProcessor
+from services.publisher import ShippingPublisher
+from services.repository import OrderConflictError, ShippingRepository
+from services.schema import ORDER_INDEX, STATUS_DUE_INDEX, table_definition
+from services.service import ShippingNotFoundError, ShippingService
+
+
+class TestBulkShipping(unittest.TestCase):
+    def setUp(self):
+        self.dynamo_resource = MagicMock()
+        self.dynamo_resource.batch_write_item.return_value = {"UnprocessedItems": {}}
+        self.sqs_client = MagicMock()
+        self.sqs_client.create_queue.return_value = {"QueueUrl": "queue-url"}
+        self.sqs_client.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+            "Successful": [{"Id": entry["Id"], "MessageId": "m-" + entry["MessageBody"]} for entry in Entries]
+        }
+        self.repository = ShippingRepository(self.dynamo_resource)
+        self.publisher = ShippingPublisher(self.sqs_client)
+        self.service = ShippingService(self.repository, self.publisher)
+        self.due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    def orders(self, count):
+        return [("Нова Пошта", [f"Product_{i}"], f"order_{i}", self.due_date) for i in range(count)]
+
+    def test_bulk_create_writes_in_chunks_of_25(self):
+        shipping_ids = self.service.create_shippings_bulk(self.orders(60))
+        self.assertEqual(len(shipping_ids), 60)
+        chunks = [call.kwargs["RequestItems"][SHIPPING_TABLE_NAME]
+                  for call in self.dynamo_resource.batch_write_item.call_args_list]
+        self.assertEqual([len(chunk) for chunk in chunks], [25, 25, 10])
+        statuses = {request["PutRequest"]["Item"]["shipping_status"] for chunk in chunks for request in chunk}
+        self.assertEqual(statuses, {ShippingService.SHIPPING_IN_PROGRESS})
+        self.dynamo_resource.Table.return_value.update_item.assert_not_called()
+
+    def test_bulk_create_sends_messages_in_chunks_of_10(self):
+        shipping_ids = self.service.create_shippings_bulk(self.orders(23))
+        batches = [call.kwargs["Entries"] for call in self.sqs_client.send_message_batch.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 3])
+        self.assertEqual([entry["MessageBody"] for batch in batches for entry in batch], shipping_ids)
+
+    def test_bulk_create_retries_unprocessed_items(self):
+        unprocessed = {SHIPPING_TABLE_NAME: [{"PutRequest": {"Item": {"shipping_id": "x"}}}]}
+        self.dynamo_resource.batch_write_item.side_effect = [
+            {"UnprocessedItems": unprocessed},
+            {"UnprocessedItems": {}},
+        ]
+        self.repository.create_shippings([ShippingRequest(*order) for order in self.orders(3)],
+                                         ShippingService.SHIPPING_IN_PROGRESS)
+        retried = self.dynamo_resource.batch_write_item.call_args_list[1].kwargs["RequestItems"]
+        self.assertEqual(retried, unprocessed)
+
+    def test_bulk_create_retries_failed_messages(self):
+        self.sqs_client.send_message_batch.side_effect = [
+            {"Successful": [{"Id": "0", "MessageId": "m-0"}], "Failed": [{"Id": "1"}]},
+            {"Successful": [{"Id": "1", "MessageId": "m-1"}]},
+        ]
+        self.assertEqual(self.publisher.send_new_shippings(["a", "b"]), ["m-0", "m-1"])
+
+    def test_bulk_create_rejects_unavailable_shipping_type(self):
+        with self.assertRaises(ValueError):
+            self.service.create_shippings_bulk([("Новий тип доставки", [], "order", self.due_date)])
+        self.dynamo_resource.batch_write_item.assert_not_called()
+
+
+class TestBulkRead(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.dynamo_resource = MagicMock(wraps=dynamo_resource)
+        self.repository = ShippingRepository(self.dynamo_resource)
+        self.service = ShippingService(self.repository, ShippingPublisher(sqs_client))
+        due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+        self.shipping_ids = self.service.create_shippings_bulk(
+            [("Нова Пошта", [f"Product_{i}"], f"order_{i}", due_date) for i in range(250)])
+
+    def test_get_shippings_reads_in_chunks_of_100(self):
+        shippings = self.repository.get_shippings(self.shipping_ids + ["missing"])
+        self.assertEqual(set(shippings), set(self.shipping_ids))
+        chunks = [call.kwargs["RequestItems"][SHIPPING_TABLE_NAME]["Keys"]
+                  for call in self.dynamo_resource.batch_get_item.call_args_list]
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 51])
+
+    def test_get_shippings_retries_unprocessed_keys(self):
+        keys = {SHIPPING_TABLE_NAME: {"Keys": [{"shipping_id": self.shipping_ids[1]}]}}
+        first, second = (list(self.repository.get_shippings([shipping_id]).values())
+                         for shipping_id in self.shipping_ids[:2])
+        self.dynamo_resource.batch_get_item.side_effect = [
+            {"Responses": {SHIPPING_TABLE_NAME: first}, "UnprocessedKeys": keys},
+            {"Responses": {SHIPPING_TABLE_NAME: second}},
+        ]
+        shippings = self.repository.get_shippings(self.shipping_ids[:2])
+        self.assertEqual(set(shippings), set(self.shipping_ids[:2]))
+        self.assertEqual(self.dynamo_resource.batch_get_item.call_args_list[-1].kwargs["RequestItems"], keys)
+
+    def test_check_statuses(self):
+        self.service.complete_shipping(self.shipping_ids[0])
+        statuses = self.service.check_statuses(self.shipping_ids[:2])
+        self.assertEqual(statuses, {self.shipping_ids[0]: ShippingService.SHIPPING_COMPLETED,
+                                    self.shipping_ids[1]: ShippingService.SHIPPING_IN_PROGRESS})
+
+    def test_process_shipping_batch_reads_once_per_poll(self):
+        self.dynamo_resource.Table(SHIPPING_TABLE_NAME).get_item = MagicMock()
+        self.assertEqual(len(self.service.process_shipping_batch()), 10)
+        self.dynamo_resource.Table(SHIPPING_TABLE_NAME).get_item.assert_not_called()
+        self.assertEqual(self.dynamo_resource.batch_get_item.call_count, 1)
+
+
+class TestIndexQueries(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.table = MagicMock(wraps=dynamo_resource.Table(SHIPPING_TABLE_NAME))
+        self.repository = ShippingRepository(dynamo_resource)
+        self.repository.table = self.table
+        self.now = datetime.now(timezone.utc)
+        requests = [ShippingRequest("Нова Пошта", ["Product"], f"order_{i % 3}", self.now + timedelta(minutes=i - 5))
+                    for i in range(10)]
+        self.repository.create_shippings(requests, ShippingService.SHIPPING_IN_PROGRESS)
+
+    def test_by_order_pages_through_index(self):
+        shippings = list(self.repository.iter_shippings_by_order("order_1", page_size=2))
+        self.assertEqual(len(shippings), 3)
+        self.assertTrue(all(shipping["order_id"] == "order_1" for shipping in shippings))
+        self.assertEqual(self.table.query.call_count, 2)
+        self.table.scan.assert_not_called()
+
+    def test_by_status_due_before_in_due_date_order(self):
+        overdue = list(self.repository.iter_shippings_by_status(ShippingService.SHIPPING_IN_PROGRESS,
+                                                                due_before=self.now, page_size=3))
+        self.assertEqual(len(overdue), 5)
+        self.assertEqual([shipping["due_at"] for shipping in overdue],
+                         sorted(shipping["due_at"] for shipping in overdue))
+        self.assertEqual(list(self.repository.iter_shippings_by_status(ShippingService.SHIPPING_COMPLETED)), [])
+        self.table.scan.assert_not_called()
+
+    def test_shipping_table_definition_has_indexes(self):
+        definition = table_definition(SHIPPING_TABLE_NAME)
+        indexes = {index["IndexName"]: index["KeySchema"] for index in definition["GlobalSecondaryIndexes"]}
+        self.assertEqual(indexes[ORDER_INDEX], [{"AttributeName": "order_id", "KeyType": "HASH"}])
+        self.assertEqual([key["AttributeName"] for key in indexes[STATUS_DUE_INDEX]], ["shipping_status", "due_at"])
+        self.assertIn({"AttributeName": "due_at", "AttributeType": "N"}, definition["AttributeDefinitions"])
+        self.assertNotIn("GlobalSecondaryIndexes", table_definition(PRODUCT_TABLE_NAME))
+
+
+class TestTransactionalOrder(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.dynamo_resource = dynamo_resource
+        self.dynamo_client = MagicMock(wraps=dynamo_resource.meta.client)
+        dynamo_resource.meta.client = self.dynamo_client
+        self.repository = ShippingRepository(dynamo_resource)
+        self.service = ShippingService(self.repository, ShippingPublisher(sqs_client))
+        self.product = Product(name='Transactional', price=10.0, available_amount=5)
+        self.repository.set_product_stock({'Transactional': 5})
+        self.due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    def stock(self):
+        return self.dynamo_resource.Table(PRODUCT_TABLE_NAME).get_item(
+            Key={"product_id": "Transactional"})["Item"]["available_amount"]
+
+    def place(self, amount):
+        cart = ShoppingCart()
+        cart.add_product(self.product, amount)
+        order = Order(cart, self.service, transactional=True)
+        return order, order.place_order("Нова Пошта", self.due_date)
+
+    def test_order_is_placed_in_one_transaction(self):
+        order, shipping_id = self.place(2)
+        self.dynamo_client.transact_write_items.assert_called_once()
+        self.assertEqual(self.stock(), 3)
+        self.assertEqual(self.product.available_amount, 3)
+        shipping = self.repository.get_shipping(shipping_id)
+        self.assertEqual(shipping["order_id"], order.order_id)
+        self.assertEqual(shipping["shipping_status"], ShippingService.SHIPPING_IN_PROGRESS)
+
+    def test_retry_does_not_apply_twice(self):
+        order, shipping_id = self.place(2)
+        retried = self.service.place_order_transaction("Нова Пошта", {"Transactional": 2}, order.order_id,
+                                                       self.due_date)
+        self.assertEqual(retried, shipping_id)
+        self.assertEqual(self.stock(), 3)
+
+    def test_retry_of_the_same_order_reuses_its_created_at(self):
+        order, shipping_id = self.place(2)
+        retried = self.service.place_order_transaction("Нова Пошта", {"Transactional": 2}, order.order_id,
+                                                       self.due_date, order.created_at)
+        self.assertEqual(retried, shipping_id)
+        self.assertEqual(self.dynamo_client.transact_write_items.call_count, 2)
+        self.assertEqual(self.repository.get_shipping(shipping_id)["created_at"], order.created_at)
+        self.assertEqual(self.stock(), 3)
+
+    def test_different_products_under_a_placed_order_id_are_rejected(self):
+        order, _ = self.place(2)
+        for created_at in (order.created_at, None):
+            with self.assertRaises(OrderConflictError):
+                self.service.place_order_transaction("Нова Пошта", {"Transactional": 1}, order.order_id,
+                                                     self.due_date, created_at)
+        self.assertEqual(self.stock(), 3)
+        cart = ShoppingCart()
+        cart.add_product(self.product, 1)
+        with self.assertRaises(OrderConflictError):
+            Order(cart, self.service, order.order_id, transactional=True).place_order("Нова Пошта", self.due_date)
+        self.assertEqual(self.product.available_amount, 3)
+
+    def test_out_of_stock_cancels_everything(self):
+        self.repository.set_product_stock({'Transactional': 1})
+        with self.assertRaises(ValueError):
+            self.place(2)
+        self.assertEqual(self.stock(), 1)
+        self.assertEqual(self.product.available_amount, 5)
+        self.assertEqual(self.dynamo_resource.Table(SHIPPING_TABLE_NAME).items, {})
+
+    def test_orders_get_distinct_ids(self):
+        self.assertNotEqual(Order(ShoppingCart(), self.service).order_id, Order(ShoppingCart(), self.service).order_id)
+
+
+class TestShippingProcessor(unittest.TestCase):
+    def setUp(self):
+        self.pending = [{"Body": f"shipping_{i}", "ReceiptHandle": f"receipt_{i}"} for i in range(50)]
+        self.deleted = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        self.publisher = MagicMock()
+        self.publisher.receive_shipping_messages.side_effect = self.receive
+        self.publisher.delete_shippings.side_effect = self.deleted.extend
+        self.service = MagicMock(publisher=self.publisher)
+        self.service.process_shipping.side_effect = self.process
+
+    def receive(self, batch_size, wait_time, visibility_timeout):
+        with self.lock:
+            messages, self.pending[:batch_size] = self.pending[:batch_size], []
+        if not messages:
+            time.sleep(0.01)
+        return messages
+
+    def process(self, shipping_id, shipping=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+
+    def run_until_empty(self, processor):
+        thread = threading.Thread(target=processor.run)
+        thread.start()
+        deadline = time.monotonic() + 5
+        while len(self.deleted) < 50 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        processor.stop()
+        thread.join()
+
+    def test_processes_and_deletes_every_message_once(self):
+        processor = ShippingProcessor(self.service, workers=4)
+        self.run_until_empty(processor)
+        self.assertEqual(sorted(self.deleted), sorted(f"receipt_{i}" for i in range(50)))
+        self.assertEqual(processor.stats()["processed"], 50)
+        fetched = [call.args[0] for call in self.service.repository.get_shippings.call_args_list]
+        self.assertEqual(sorted(sum(fetched, [])), sorted(f"shipping_{i}" for i in range(50)))
+        self.assertLessEqual(self.max_active, 4)
+        self.assertGreater(self.max_active, 1)
+
+    def test_failed_message_is_not_deleted(self):
+        self.service.process_shipping.side_effect = lambda shipping_id, shipping: 1 / (shipping_id != "shipping_7")
+        processor = ShippingProcessor(self.service, workers=2)
+        self.pending = self.pending[:10]
+        thread = threading.Thread(target=processor.run)
+        thread.start()
+        deadline = time.monotonic() + 5
+        while len(self.deleted) < 9 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        processor.stop()
+        thread.join()
+        self.assertNotIn("receipt_7", self.deleted)
+        self.assertEqual(processor.stats()["failed"], 1)
+
+    def test_extends_visibility_of_slow_messages(self):
+        processor = ShippingProcessor(self.service, workers=1, visibility_timeout=3)
+        processor.in_flight["receipt_slow"] = time.monotonic() + 0.5
+        processor.heartbeat()
+        self.publisher.extend_visibility.assert_called_once_with(["receipt_slow"], 3)
+
+
+class TestIdempotentProcessing(unittest.TestCase):
+    def setUp(self):
+        dynamo_resource, sqs_client = fake_backend()
+        self.repository = ShippingRepository(dynamo_resource)
+        self.table = MagicMock(wraps=self.repository.table)
+        self.repository.table = self.table
+        self.service = ShippingService(self.repository, ShippingPublisher(sqs_client))
+        self.shipping_id = self.service.create_shipping("Нова Пошта", ["Product"], "order",
+                                                        datetime.now(timezone.utc) + timedelta(minutes=5))
+
+    def test_conditional_update_is_a_no_op_on_mismatch(self):
+        self.assertIsNone(self.repository.update_shipping_status(self.shipping_id, ShippingService.SHIPPING_FAILED,
+                                                                 expected_status=ShippingService.SHIPPING_CREATED))
+        self.assertEqual(self.service.check_status(self.shipping_id), ShippingService.SHIPPING_IN_PROGRESS)
+
+    def test_completed_shipping_is_never_failed(self):
+        stale = self.repository.get_shipping(self.shipping_id)
+        self.service.process_shipping(self.shipping_id)
+        stale["due_at"] = 0
+        self.assertIsNone(self.service.process_shipping(self.shipping_id, stale))
+        self.assertEqual(self.service.check_status(self.shipping_id), ShippingService.SHIPPING_COMPLETED)
+        calls = self.table.update_item.call_count
+        self.assertIsNone(self.service.process_shipping(self.shipping_id))
+        self.assertEqual(self.table.update_item.call_count, calls)
+
+    def test_cache_drops_entry_when_condition_fails(self):
+        cached = CachedShippingRepository(self.repository)
+        cached.get_shipping(self.shipping_id)
+        cached.update_shipping_status(self.shipping_id, ShippingService.SHIPPING_FAILED,
+                                      expected_status=ShippingService.SHIPPING_CREATED)
+        self.assertIsNone(cached.cache.get(self.shipping_id))
+
+    def test_processor_skips_recently_processed_ids(self):
+        publisher = MagicMock()
+        messages = [[{"Body": "a", "ReceiptHandle": "r1"}, {"Body": "b", "ReceiptHandle": "r2"}],
+                    [{"Body": "a", "ReceiptHandle": "r3"}]]
+        publisher.receive_shipping_messages.side_effect = lambda *args: messages.pop(0) if messages else []
+        service = MagicMock(publisher=publisher)
+        processor = ShippingProcessor(service, workers=2)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            processor.poll_once(executor)
+            processor.drain()
+            processor.poll_once(executor)
+        self.assertEqual(processor.stats()["duplicates"], 1)
+        self.assertEqual(service.process_shipping.call_count, 2)
+        deleted = sum((call.args[0] for call in publisher.delete_shippings.call_args_list), [])
+        self.assertEqual(sorted(deleted), ["r1", "r2", "r3"])
+
+    def test_missing_shipping_is_dropped(self):
+        self.service.publisher.send_new_shipping("unknown")
+        with self.assertRaises(ShippingNotFoundError):
+            self.service.process_shipping("unknown")
+        self.assertEqual(len(self.service.process_shipping_batch()), 2)
+        self.assertEqual(self.service.publisher.receive_shipping_messages(10, wait_time=0), [])
+
+    def test_processor_deletes_messages_for_missing_shippings(self):
+        publisher = MagicMock()
+        publisher.receive_shipping_messages.return_value = [{"Body": "unknown", "ReceiptHandle": "r1"}]
+        processor = ShippingProcessor(ShippingService(self.repository, publisher), workers=1)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            processor.poll_once(executor)
+        processor.acknowledge()
+        self.assertEqual((processor.stats()["missing"], processor.stats()["failed"]), (1, 0))
+        publisher.delete_shippings.assert_called_once_with(["r1"])
+
+    def test_recent_ids_evicts_least_recently_seen(self):
+        seen = RecentIds(max_entries=2)
+        for shipping_id in ("a", "b", "a", "c"):
+            seen.add(shipping_id)
+        self.assertEqual(("a" in seen, "b" in seen, "c" in seen, len(seen)), (True, False, True, 2))
+
+
+class TestClientRegistry(unittest.TestCase):
+    def setUp(self):
+        clients.reset_clients()
+        self.session_patch = patch("boto3.session.Session")
+        self.session_class = self.session_patch.start()
+        self.session = self.session_class.return_value
+        self.session.client.side_effect = lambda service_name, **kwargs: MagicMock(name=service_name)
+
+    def tearDown(self):
+        self.session_patch.stop()
+        clients.reset_clients()
+
+    def test_clients_are_shared_across_threads(self):
+        created = []
+        threads = [threading.Thread(target=lambda: created.append(clients.get_client("sqs"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(client) for client in created}), 1)
+        self.session_class.assert_called_once()
+        self.session.client.assert_called_once()
+        config = self.session.client.call_args.kwargs["config"]
+        self.assertEqual(config.max_pool_connections, AWS_MAX_POOL_CONNECTIONS)
+
+    def test_protected_clients_leave_retries_to_the_resilience_layer(self):
+        sqs_client = clients.get_client("sqs")
+        protected = clients.counterpart(sqs_client, protected=True)
+        self.assertIsNot(protected, sqs_client)
+        self.assertIs(clients.get_client("sqs", protected=True), protected)
+        self.assertIs(clients.counterpart(protected, protected=False), sqs_client)
+        configs = [call.kwargs["config"] for call in self.session.client.call_args_list]
+        self.assertEqual([config.retries for config in configs], [None, {"total_max_attempts": 1, "mode": "standard"}])
+
+    def test_publishers_share_client_and_cached_queue_url(self):
+        sqs_client = clients.get_client("sqs")
+        sqs_client.create_queue.return_value = {"QueueUrl": "queue-url"}
+        publishers = [ShippingPublisher() for _ in range(5)]
+        self.assertTrue(all(publisher.client is sqs_client for publisher in publishers))
+        self.assertEqual({publisher.queue_url for publisher in publishers}, {"queue-url"})
+        sqs_client.create_queue.assert_called_once_with(QueueName=SHIPPING_QUEUE)
+
+    def test_repositories_share_resource(self):
+        first, second = ShippingRepository(), ShippingRepository()
+        self.assertIs(first.dynamo_resource, second.dynamo_resource)
+        self.session.resource.assert_called_once()
+
+    def test_clients_and_queue_are_resolved_on_first_use(self):
+        publisher, repository = ShippingPublisher(), ShippingRepository()
+        self.session_class.assert_not_called()
+        sqs_client = clients.get_client("sqs")
+        sqs_client.create_queue.return_value = {"QueueUrl": "queue-url"}
+        self.assertEqual(publisher.warm_up(), "queue-url")
+        repository.warm_up()
+        self.session.resource.assert_called_once()
+
+    def test_importing_services_does_not_load_boto3(self):
+        code = "import sys, services, services.service, app.eshop; print('boto3' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+
+class TestShippingCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.cache = ShippingCache(ttl=5, terminal_ttl=100, max_entries=3, clock=lambda: self.now)
+        self.backend = MagicMock()
+        self.backend.get_shipping.side_effect = lambda shipping_id: {
+            "shipping_id": shipping_id, "shipping_status": ShippingService.SHIPPING_IN_PROGRESS}
+        self.backend.update_shipping_status.return_value = {"ResponseMetadata": {}}
+        self.repository = CachedShippingRepository(self.backend, self.cache)
+
+    def test_repeated_reads_hit_cache_until_ttl(self):
+        self.repository.get_shipping("a")
+        self.repository.get_shipping("a")
+        self.assertEqual(self.backend.get_shipping.call_count, 1)
+        self.now = 6
+        self.repository.get_shipping("a")
+        self.assertEqual(self.backend.get_shipping.call_count, 2)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_status_update_is_written_through_and_terminal_entries_live_longer(self):
+        service = ShippingService(self.repository, MagicMock())
+        self.repository.get_shipping("a")
+        service.complete_shipping("a")
+        self.now = 50
+        self.assertEqual(service.check_status("a"), ShippingService.SHIPPING_COMPLETED)
+        self.assertEqual(self.backend.get_shipping.call_count, 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for shipping_id in "abc":
+            self.repository.get_shipping(shipping_id)
+        self.repository.get_shipping("a")
+        self.repository.get_shipping("d")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertIsNotNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_memory_bound(self):
+        cache = ShippingCache(max_bytes=2000)
+        for i in range(100):
+            cache.put({"shipping_id": str(i), "shipping_status": ShippingService.SHIPPING_IN_PROGRESS})
+        self.assertLessEqual(cache.stats()["bytes"], 2000)
+        self.assertLess(cache.stats()["entries"], 100)
+
+    def test_bulk_read_fetches_only_misses(self):
+        self.backend.get_shippings.side_effect = lambda shipping_ids: {
+            shipping_id: {"shipping_id": shipping_id, "shipping_status": "in progress"} for shipping_id in shipping_ids}
+        self.repository.get_shipping("a")
+        self.assertEqual(set(self.repository.get_shippings(["a", "b"])), {"a", "b"})
+        self.backend.get_shippings.assert_called_once_with(["b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from app.eshop import Order, Product, ShoppingCart
+from services.fake import fake_backend
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.service import ShippingService
+from services.wal import ENTRY, HEADER, BufferedShippingService, WalFullError, WriteAheadLog
+
+
+class TestWriteAheadLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "shipping.wal")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_recovers_only_unflushed_entries(self):
+        log = WriteAheadLog(self.path, size=4096)
+        ends = [log.append(f"entry {i}".encode()) for i in range(5)]
+        log.checkpoint(ends[1])
+        log.close()
+        reopened = WriteAheadLog(self.path, size=4096)
+        self.assertEqual([payload for _, payload in reopened.pending()], [b"entry 2", b"entry 3", b"entry 4"])
+        reopened.close()
+
+    def test_torn_tail_is_ignored(self):
+        log = WriteAheadLog(self.path, size=4096)
+        log.append(b"complete")
+        end = log.append(b"torn")
+        log.mm[end - 2:end] = b"\x00\x00"
+        log.close()
+        reopened = WriteAheadLog(self.path, size=4096)
+        self.assertEqual([payload for _, payload in reopened.pending()], [b"complete"])
+        reopened.append(b"next")
+        self.assertEqual([payload for _, payload in reopened.pending()], [b"complete", b"next"])
+        reopened.close()
+
+    def test_fully_flushed_log_starts_over_without_replaying_old_entries(self):
+        log = WriteAheadLog(self.path, size=4096)
+        log.append(b"old entry one")
+        end = log.append(b"old entry two")
+        log.checkpoint(end)
+        self.assertEqual(log.write_offset, HEADER.size)
+        log.append(b"new")
+        log.close()
+        reopened = WriteAheadLog(self.path, size=4096)
+        self.assertEqual([payload for _, payload in reopened.pending()], [b"new"])
+        reopened.close()
+
+    def test_trickle_of_writes_reclaims_space(self):
+        log = WriteAheadLog(self.path, size=HEADER.size + 4 * (ENTRY.size + 8))
+        for i in range(20):
+            log.append(b"entry %02d" % i)
+            pending = log.pending()
+            # The newest entry stays unflushed at every checkpoint, as with a steady stream of orders.
+            if len(pending) > 1:
+                log.checkpoint(pending[-2][0])
+        log.close()
+        reopened = WriteAheadLog(self.path, size=HEADER.size + 4 * (ENTRY.size + 8))
+        self.assertEqual([payload for _, payload in reopened.pending()], [b"entry 19"])
+        reopened.close()
+
+    def test_full_log_raises(self):
+        log = WriteAheadLog(self.path, size=HEADER.size + ENTRY.size + 8)
+        log.append(b"12345678")
+        with self.assertRaises(WalFullError):
+            log.append(b"x")
+        log.close()
+
+    def test_concurrent_appends_share_fsyncs(self):
+        log = WriteAheadLog(self.path, size=1 << 20)
+        threads = [threading.Thread(target=lambda: [log.append(b"entry") for _ in range(50)]) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(log.pending()), 400)
+        self.assertEqual(log.appends, 400)
+        self.assertLessEqual(log.syncs, 400)
+        log.close()
+
+
+class TestBufferedShippingService(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "shipping.wal")
+        dynamo_resource, sqs_client = fake_backend()
+        self.repository = ShippingRepository(dynamo_resource)
+        self.publisher = ShippingPublisher(sqs_client)
+        self.service = ShippingService(self.repository, self.publisher)
+        self.due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_place_order_returns_before_backend_write(self):
+        buffered = BufferedShippingService(self.service, WriteAheadLog(self.path, size=1 << 20))
+        cart = ShoppingCart()
+        cart.add_product(Product(name="Product", price=10.0, available_amount=5), 1)
+        shipping_id = Order(cart, buffered).place_order("Нова Пошта", self.due_date)
+        self.assertIsNone(self.repository.get_shipping(shipping_id))
+        self.assertEqual(buffered.flush(), 1)
+        self.assertEqual(self.service.check_status(shipping_id), ShippingService.SHIPPING_IN_PROGRESS)
+        self.assertEqual(self.repository.get_shipping(shipping_id)["product_ids"], ["Product"])
+        self.assertEqual(len(buffered.log), 0)
+        buffered.log.close()
+
+    def test_invalid_request_is_rejected_up_front(self):
+        buffered = BufferedShippingService(self.service, WriteAheadLog(self.path, size=1 << 20))
+        with self.assertRaises(ValueError):
+            buffered.create_shipping("Новий тип доставки", [], "order", self.due_date)
+        self.assertEqual(len(buffered.log), 0)
+        buffered.log.close()
+
+    def test_crash_recovery_replays_only_unflushed_entries(self):
+        buffered = BufferedShippingService(self.service, WriteAheadLog(self.path, size=1 << 20), batch_size=2)
+        shipping_ids = [buffered.create_shipping("Нова Пошта", ["Product"], f"order_{i}", self.due_date)
+                        for i in range(5)]
+        entries = buffered.log.pending(2)
+        self.service.create_shippings_bulk([("Нова Пошта", ["Product"], f"order_{i}", self.due_date, shipping_ids[i])
+                                            for i in range(2)])
+        buffered.log.checkpoint(entries[-1][0])
+        # Crash after the third entry reached DynamoDB but before its checkpoint.
+        self.service.create_shippings_bulk([("Нова Пошта", ["Product"], "order_2", self.due_date, shipping_ids[2])])
+        buffered.log.close()
+
+        self.service.create_shippings_bulk = MagicMock(wraps=self.service.create_shippings_bulk)
+        recovered = BufferedShippingService(self.service, WriteAheadLog(self.path, size=1 << 20))
+        self.assertEqual(recovered.recover(), 3)
+        replayed = self.service.create_shippings_bulk.call_args.args[0]
+        self.assertEqual([request.shipping_id for request in replayed], shipping_ids[3:])
+        self.assertEqual(set(self.repository.get_shippings(shipping_ids)), set(shipping_ids))
+        self.assertEqual(len(recovered.log), 0)
+        recovered.log.close()
+
+    def test_retry_after_partial_failure_does_not_overwrite_processed_shipping(self):
+        buffered = BufferedShippingService(self.service, WriteAheadLog(self.path, size=1 << 20))
+        shipping_id = buffered.create_shipping("Нова Пошта", ["Product"], "order", self.due_date)
+        send = self.publisher.send_new_shippings
+
+        def sent_then_timed_out(shipping_ids):
+            send(shipping_ids)
+            raise TimeoutError("SendMessageBatch timed out")
+
+        self.publisher.send_new_shippings = sent_then_timed_out
+        with self.assertRaises(TimeoutError):
+            buffered.flush()
+        del self.publisher.send_new_shippings
+        self.service.process_shipping_batch()
+        self.assertEqual(self.service.check_status(shipping_id), ShippingService.SHIPPING_COMPLETED)
+        self.assertEqual(buffered.flush(), 1)
+        self.assertEqual(self.service.check_status(shipping_id), ShippingService.SHIPPING_COMPLETED)
+        self.assertEqual(len(buffered.log), 0)
+        buffered.log.close()
+
+    def test_entries_that_expired_while_buffered_are_still_written(self):
+        buffered = BufferedShippingService(self.service, WriteAheadLog(self.path, size=1 << 20))
+        shipping_id = buffered.create_shipping("Нова Пошта", ["Product"], "order",
+                                               datetime.now(timezone.utc) + timedelta(milliseconds=1))
+        time.sleep(0.01)
+        self.assertEqual(buffered.flush(), 1)
+        self.assertEqual(self.service.process_shipping_batch(), [{"HTTPStatusCode": 200}])
+        self.assertEqual(self.service.check_status(shipping_id), ShippingService.SHIPPING_FAILED)
+        buffered.log.close()
+
+    def test_background_flusher(self):
+        buffered = BufferedShippingService(self.service, WriteAheadLog(self.path, size=1 << 20), interval=0.01).start()
+        shipping_ids = [buffered.create_shipping("Нова Пошта", ["Product"], f"order_{i}", self.due_date)
+                        for i in range(30)]
+        buffered.stop()
+        self.assertEqual(set(self.repository.get_shippings(shipping_ids)), set(shipping_ids))
+        self.assertEqual(buffered.flushed, 30)
+        buffered.log.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
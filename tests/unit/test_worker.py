@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from services.fake import fake_backend
+from services.publisher import ShippingPublisher
+from services.repository import ShippingRepository
+from services.service import ShippingService
+from services.worker import WorkerSupervisor, run_worker
+
+
+def crash(index):
+    sys.exit(3)
+
+
+def sleep_forever(index):
+    time.sleep(60)
+
+
+def fake_service():
+    dynamo_resource, sqs_client = fake_backend()
+    service = ShippingService(ShippingRepository(dynamo_resource), ShippingPublisher(sqs_client))
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=5)
+    for i in range(20):
+        service.create_shipping("Нова Пошта", ["Product"], f"order_{i}", due_date)
+    return service
+
+
+def drain_worker(index, results, started):
+    started.set()
+    stats = run_worker(index, workers=2, pollers=1, service_factory=fake_service)
+    results.put(stats)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "relies on fork and POSIX signals")
+class TestWorkerSupervisor(unittest.TestCase):
+    def test_crashed_children_are_restarted_with_backoff(self):
+        supervisor = WorkerSupervisor(processes=2, target=crash, restart_backoff=0.05, max_backoff=0.2)
+        deadline = time.monotonic() + 5
+        while supervisor.restarts < 4 and time.monotonic() < deadline:
+            supervisor.check_children()
+            time.sleep(0.01)
+        supervisor.shutdown()
+        self.assertGreaterEqual(supervisor.restarts, 4)
+        self.assertGreaterEqual(max(supervisor.failures.values()), 2)
+
+    def test_shutdown_kills_children_that_do_not_drain(self):
+        supervisor = WorkerSupervisor(processes=2, target=sleep_forever, shutdown_timeout=0.2)
+        supervisor.check_children()
+        processes = list(supervisor.children.values())
+        supervisor.shutdown()
+        self.assertFalse(any(process.is_alive() for process in processes))
+        self.assertEqual(supervisor.children, {})
+
+    def test_worker_transitions_reach_other_processes(self):
+        supervisor = WorkerSupervisor(processes=1, kwargs={"workers": 2, "pollers": 1, "service_factory": fake_service},
+                                      event_broker=("127.0.0.1", 0), shutdown_timeout=10)
+        broker = supervisor.start_broker()
+        dynamo_resource, sqs_client = fake_backend()
+        api = ShippingService(ShippingRepository(dynamo_resource), ShippingPublisher(sqs_client))
+        bridge = api.connect_event_broker(broker.server_address)
+        completed = []
+        done = threading.Event()
+
+        def on_event(event):
+            if event.status == ShippingService.SHIPPING_COMPLETED:
+                completed.append(event.shipping_id)
+                if len(completed) == 20:
+                    done.set()
+
+        api.subscribe(None, on_event)
+        deadline = time.monotonic() + 5
+        while not broker.clients and time.monotonic() < deadline:
+            time.sleep(0.01)
+        supervisor.check_children()
+        self.assertTrue(done.wait(10))
+        bridge.close()
+        supervisor.shutdown()
+        self.assertIsNone(supervisor.broker)
+
+    def test_sigterm_drains_worker(self):
+        results = multiprocessing.Queue()
+        started = multiprocessing.Event()
+        process = multiprocessing.Process(target=drain_worker, args=(0, results, started))
+        process.start()
+        started.wait(5)
+        time.sleep(1)
+        os.kill(process.pid, signal.SIGTERM)
+        stats = results.get(timeout=10)
+        process.join(10)
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(stats["processed"], 20)
+        self.assertEqual(stats["in_flight"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()